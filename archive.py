@@ -0,0 +1,191 @@
+"""
+Raw response archive for offline re-extraction
+
+Every 200 response body is stored compressed in a content-addressed, sharded
+directory (objects/ab/abcdef...), with a SQLite index from URL to content
+hash. `reextract` reruns the field extraction over the archive on all cores
+without touching the network, so a selector change no longer needs a re-crawl.
+
+    python archive.py reextract --archive archive --output reextracted.csv
+    python archive.py reextract --fields 'title,date,artist_*' --output artists.csv
+"""
+import argparse
+import gzip
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import extractor
+from sinks import CSVSink
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    page_type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_page ON responses (page_type, id);
+"""
+
+CODEC_EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+
+
+def compress(content: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(content)
+    return gzip.compress(content, compresslevel=6)
+
+
+def decompress(blob: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+class HTMLArchive:
+    """Content-addressed store of compressed response bodies, indexed by URL"""
+
+    def __init__(self, root: str = 'archive', codec: Optional[str] = None):
+        self.root = root
+        # zstd when the optional dependency is installed, gzip otherwise
+        self.codec = codec or ('zstd' if zstandard is not None else 'gzip')
+        if self.codec == 'zstd' and zstandard is None:
+            raise ValueError("zstd archives need the 'zstandard' package")
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, 'index.sqlite'))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def blob_path(self, content_hash: str, codec: str) -> str:
+        return os.path.join(self.root, 'objects', content_hash[:2],
+                            content_hash + CODEC_EXTENSIONS[codec])
+
+    def put(self, url: str, page_type: str, page_id: int, content: bytes,
+            fetched_at: Optional[float] = None) -> str:
+        """Store a response body (deduplicated by hash) and index it under `url`"""
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(content_hash, self.codec)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so a crash never leaves a torn blob behind
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(compress(content, self.codec))
+            os.replace(tmp_path, path)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO responses '
+            '(url, page_type, id, content_hash, codec, size, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (url, page_type, page_id, content_hash, self.codec, len(content),
+             time.time() if fetched_at is None else fetched_at)
+        )
+        return content_hash
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Return the archived body for `url`, or None if it was never stored"""
+        row = self.conn.execute(
+            'SELECT content_hash, codec FROM responses WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return read_blob(self.root, *row)
+
+    def entries(self, page_types: Optional[List[str]] = None) -> Iterator[Tuple[str, str, int, str, str]]:
+        """Yield (url, page_type, id, content_hash, codec) in crawl order
+
+        That is by ID, then by the category's position in `page_types` (all
+        categories, in scrape_all's order, by default), as CrawlState.pending
+        orders the work.
+        """
+        if not page_types:
+            # Imported here: moma_scraper imports this module
+            from moma_scraper import PAGE_TYPES
+            page_types = PAGE_TYPES
+        positions = ' '.join('WHEN ? THEN %d' % pos for pos in range(len(page_types)))
+        query = ('SELECT url, page_type, id, content_hash, codec FROM responses '
+                 'WHERE page_type IN (%s) ORDER BY id, CASE page_type %s END'
+                 % (','.join('?' * len(page_types)), positions))
+        yield from self.conn.execute(query, (*page_types, *page_types)).fetchall()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def read_blob(root: str, content_hash: str, codec: str) -> bytes:
+    path = os.path.join(root, 'objects', content_hash[:2], content_hash + CODEC_EXTENSIONS[codec])
+    with open(path, 'rb') as f:
+        return decompress(f.read(), codec)
+
+
+def _reextract_entry(args) -> Dict:
+    """Worker: load one archived body and run the extraction on it"""
+    root, url, page_type, content_hash, codec, groups = args
+    return extractor.extract(read_blob(root, content_hash, codec), url, page_type, groups)
+
+
+def reextract(archive_dir: str = 'archive', output: str = 'reextracted.csv',
+              workers: Optional[int] = None, page_types: Optional[List[str]] = None,
+              fields: Optional[List[str]] = None) -> int:
+    """Rerun field extraction over every archived page and write a fresh CSV
+
+    Blobs are read inside the worker processes, so only small tuples cross
+    the process boundary. With `fields`, only those columns are extracted
+    and written (see extractor.select_fields). Returns the number of rows
+    written.
+    """
+    archive = HTMLArchive(archive_dir)
+    groups = extractor.field_groups(fields)
+    jobs = [(archive_dir, url, page_type, content_hash, codec, groups)
+            for url, page_type, _, content_hash, codec in archive.entries(page_types)]
+    archive.close()
+
+    if os.path.exists(output):
+        os.remove(output)
+
+    print(f"Re-extracting {len(jobs)} archived pages...")
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers or multiprocessing.cpu_count()) as pool, \
+            CSVSink(output, extractor.select_fields(fields) if fields else None,
+                    checkpoint_every=1000) as sink:
+        for data in pool.map(_reextract_entry, jobs, chunksize=32):
+            sink.write(data)
+
+    elapsed = time.time() - started
+    print(f"Wrote {sink.rows_written} rows to {output} in {elapsed:.1f}s "
+          f"({sink.rows_written / elapsed if elapsed else 0:.0f} pages/sec)")
+    return sink.rows_written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Raw HTML archive tools')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    reextract_parser = subcommands.add_parser('reextract', help='Re-run extraction over the archive')
+    reextract_parser.add_argument('--archive', default='archive', help='Archive directory')
+    reextract_parser.add_argument('--output', default='reextracted.csv', help='CSV file to write')
+    reextract_parser.add_argument('--workers', type=int, default=None, help='Parser processes')
+    reextract_parser.add_argument('--types', nargs='*', default=None,
+                                  help='Only these page types (film, galleries, exhibitions)')
+    reextract_parser.add_argument('--fields', default=None,
+                                  help='Comma-separated output fields, wildcards allowed (e.g. title,artist_*)')
+    args = parser.parse_args()
+
+    if args.command == 'reextract':
+        reextract(args.archive, args.output, args.workers, args.types,
+                  args.fields.split(',') if args.fields else None)
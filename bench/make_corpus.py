@@ -0,0 +1,98 @@
+"""
+Regenerate the synthetic benchmark corpus in bench/corpus
+
+The pages reproduce the markup the extractor looks for on moma.org calendar
+pages (artist-term links, promo blocks, sponsors, works online, ...) at a
+range of sizes, from a bare film screening to an exhibition with hundreds of
+artists and promos. Output is deterministic, so benchmark results stay
+comparable. Saved real pages can be dropped into the same directory as
+<page_type>_<id>.html.
+
+    python bench/make_corpus.py
+"""
+import os
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def artist(i: int) -> str:
+    if i % 4 == 0:
+        return f'<a href="/artists/{1000 + i}">Plain Artist {i}</a>'
+    return (f'<a class="artist-term" href="/artists/{1000 + i}">'
+            f'<span class="artist-term--in-list__title__text">Artist &amp; Name {i}</span>'
+            f'<span class="artist-term--in-list__info__text">American, 19{i % 90:02d}–20{i % 20:02d}</span>'
+            f'<span class="artist-term--in-list__count__text">{i} works online</span></a>')
+
+
+def promo(i: int) -> str:
+    return (f'<div class="promo promo--{i % 3}"><a href="/magazine/articles/{i}"><img src="/i/{i}.jpg" alt="">'
+            f'<p class="promo__category">Magazine</p><h3 class="promo__title">Promo <em>title</em> {i}</h3>'
+            f'<p class="promo__description">Desc "quoted" {i}, with comma</p>'
+            f'<p class="promo__date">Jan {i % 28 + 1}, 2020</p>'
+            f'<span class="promo__author">Author {i}</span></a></div>')
+
+
+def page(page_type: str, page_id: int, artists: int, promos: int, extra: str = '',
+         filler: int = 0) -> str:
+    """One calendar page; `filler` adds unrelated paragraphs to model long pages"""
+    artist_links = ''.join(artist(i) for i in range(artists)) + \
+        '<a href="/artists/">Artists</a><a href="/artists/1000">Plain Artist 0</a>' \
+        '<a href="/artists/55">View all artists</a>'
+    promo_blocks = ''.join(promo(i) for i in range(promos))
+    works = ''.join(f'<a href="/collection/works/{i}">Work {i}<span> detail</span></a>'
+                    for i in range(artists * 2))
+    related = ''.join(f'<a href="/calendar/{("film", "exhibitions")[i % 2]}/{page_id + i + 1}">Related {i}</a>'
+                      for i in range(min(promos, 10)))
+    paragraphs = ''.join(f'<div class="text-block"><p>Filler paragraph {i} with <a href="/learn/{i}">a link</a> '
+                         f'and some <strong>emphasis</strong>.</p></div>' for i in range(filler))
+    return f'''<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{page_type} {page_id} | MoMA</title>
+<meta name="description" content="{page_type.title()}. Nov 15, 2006–Mar 26, 2007. A description with ünïcode.">
+<meta property="og:image" content="https://www.moma.org/og/{page_id}.jpg"><script>var x = "<p class='balance-text'>Jan</p>";</script>
+<style>.x{{}}</style></head><body><header><nav><a href="/calendar">Calendar</a></nav></header>
+<main><h1 class="balance-text">  {page_type.title()} <i>number</i> {page_id} </h1>
+<p class="balance-text typography">Subtitle here</p><p class="balance-text typography">Oct 3, 2019–Feb 1, 2020</p>
+<p class="typography">MoMA, Floor 2, The David Geffen Wing</p>
+<section class="artists">{artist_links}</section>
+<div class="credits">Organized by <b>Curator</b>.</div><p class="sponsor">Sponsor one</p><p class="sponsor">Sponsor <!-- c -->two</p>
+{promo_blocks}
+<iframe src="https://www.youtube.com/embed/{page_id}"></iframe><iframe src="https://player.vimeo.com/{page_id}"></iframe>
+<a href="/publications/{page_id}">Pub</a><div class="event">Event A</div><div class="related-event">Related</div>
+<span class="location-tag">Floor 2</span><span class="location-tag">Floor 3</span><p class="location-donor">Donor gallery</p>
+{works}{related}{extra}{paragraphs}
+<article><p>Para one.</p><p></p><p>Para  two</p></article></main></body></html>'''
+
+
+# (page_type, id, artists, promos, extra markup, filler paragraphs)
+SPECS = [
+    ('film', 1, 0, 0, '', 0),
+    ('film', 100, 3, 2, '<video src="/v.mp4"></video>', 20),
+    ('film', 4512, 1, 4, '', 60),
+    ('galleries', 7, 0, 0, '', 0),
+    ('galleries', 50, 12, 8, '<div class="artist-bio">Long bio</div>', 40),
+    ('galleries', 2210, 40, 12, '<div class="work-online"><a href="/collection/works/9">W</a></div>', 80),
+    ('exhibitions', 75, 60, 25, '<div class="bio">Bio2</div>', 100),
+    ('exhibitions', 3000, 150, 40, '<div class="publication">P</div>', 150),
+    # Heavy pages: large group shows with long promo rails
+    ('exhibitions', 5123, 400, 80, '<div class="artist-bio">Long bio</div>', 300),
+    ('exhibitions', 5216, 800, 120, '<div class="publication">P</div>', 400),
+]
+
+# A page with no meta description or h1, falling back to og:description,
+# <title> and related-content promos
+MINIMAL_PAGE = ('<html><head><title>Only title</title>'
+                '<meta property="og:description" content="OG desc"></head><body>'
+                '<div class="related-content"><a href=" /x ">x</a></div>'
+                '<article><p>A</p><p>B</p></article></body></html>')
+
+
+def make_corpus(directory: str = CORPUS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    for page_type, page_id, artists, promos, extra, filler in SPECS:
+        with open(os.path.join(directory, f'{page_type}_{page_id}.html'), 'w', encoding='utf-8') as f:
+            f.write(page(page_type, page_id, artists, promos, extra, filler))
+    with open(os.path.join(directory, 'film_2.html'), 'w', encoding='utf-8') as f:
+        f.write(MINIMAL_PAGE)
+
+
+if __name__ == '__main__':
+    make_corpus()
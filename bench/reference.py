@@ -0,0 +1,265 @@
+"""
+BeautifulSoup reference extractor
+
+The original field extraction, kept out of the crawler as the reference the
+lxml engine in extractor.py is checked against (tests/test_extractor.py)
+and timed against (the `reference` stage of benchmark.py).
+
+    from bs4 import BeautifulSoup
+    from bench.reference import extract_fields
+    data = extract_fields(BeautifulSoup(content, 'lxml'), url, page_type)
+"""
+import json
+from typing import Dict
+
+import extractor
+
+
+def extract_text_safe(soup, selector: str, attribute: str = None) -> str:
+    """Safely extract text from a selector"""
+    try:
+        element = soup.select_one(selector)
+        if element:
+            if attribute:
+                return element.get(attribute, '').strip()
+            return element.get_text(strip=True)
+        return ''
+    except:
+        return ''
+
+
+def extract_multiple(soup, selector: str) -> list:
+    """Extract multiple elements matching selector"""
+    try:
+        elements = soup.select(selector)
+        return [elem.get_text(strip=True) for elem in elements]
+    except:
+        return []
+
+
+def count_elements(soup, selector: str) -> int:
+    """Count elements matching selector"""
+    try:
+        return len(soup.select(selector))
+    except:
+        return 0
+
+
+def extract_fields(soup, url: str, page_type: str) -> Dict:
+    """Extract all output fields from a BeautifulSoup tree
+
+    This is the reference implementation; the crawler uses the faster
+    lxml engine in extractor.py, which tests/test_extractor.py checks
+    against it on every corpus page.
+    """
+    data = extractor.empty_record(url, page_type)
+
+    # Extract title
+    h1_tag = soup.find('h1')
+    if h1_tag:
+        data['title'] = h1_tag.get_text(strip=True)
+    else:
+        title_tag = soup.find('title')
+        data['title'] = title_tag.get_text(strip=True) if title_tag else ''
+
+    # Extract date - look for p.balance-text.typography with date format
+    date_found = False
+    for p in soup.find_all('p', class_='balance-text'):
+        text = p.get_text(strip=True)
+        # Check if it looks like a date (contains month names or numbers with commas/dashes)
+        if any(month in text for month in ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                             'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']) or \
+           (',' in text and any(char.isdigit() for char in text)):
+            data['date'] = text
+            date_found = True
+            break
+
+    if not date_found:
+        # Fallback to meta tag
+        meta_desc = soup.find('meta', attrs={'name': 'description'})
+        if meta_desc:
+            content = meta_desc.get('content', '')
+            # Try to extract date from description (format: "Exhibition. Nov 15, 2006–Mar 26, 2007.")
+            if '.' in content:
+                parts = content.split('.')
+                if len(parts) > 1:
+                    date_part = parts[1].strip()
+                    if any(month in date_part for month in ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                                              'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']):
+                        data['date'] = date_part
+
+    # Extract location - look for short p.typography elements containing location words
+    for p in soup.find_all('p', class_='typography'):
+        text = p.get_text(strip=True)
+        if len(text) < 50 and ('MoMA' in text or 'Museum' in text or 'Gallery' in text or 'Floor' in text):
+            data['location'] = text
+            break
+
+    # Extract artists - look for artist links with proper structure
+    artist_links = []
+    artist_names = []
+    artist_bios = []
+    artist_works_info = []
+
+    for link in soup.find_all('a', href=True):
+        href = link.get('href', '')
+        if '/artists/' in href and href != '/artists/':
+            # Try to find artist name in the structured span
+            name_span = link.find('span', class_='artist-term--in-list__title__text')
+            if name_span:
+                artist_name = name_span.get_text(strip=True)
+
+                # Get bio info
+                bio_span = link.find('span', class_='artist-term--in-list__info__text')
+                bio = bio_span.get_text(strip=True) if bio_span else ''
+
+                # Get works count info
+                count_span = link.find('span', class_='artist-term--in-list__count__text')
+                works_info = count_span.get_text(strip=True) if count_span else ''
+
+                artist_names.append(artist_name)
+                artist_links.append(href)
+                artist_bios.append(bio)
+                artist_works_info.append(works_info)
+            else:
+                # Fallback: just get the text if no structured span found
+                text = link.get_text(strip=True)
+                # Exclude generic "Artists" links and very long descriptions
+                if text and text.lower() != 'artists' and len(text) < 200:
+                    # Try to be smart about what looks like an artist name vs description
+                    # If it doesn't have common non-name phrases, include it
+                    if not any(phrase in text.lower() for phrase in
+                             ['view all', 'see more', 'back to', 'learn more', 'read more']):
+                        artist_names.append(text)
+                        artist_links.append(href)
+                        artist_bios.append('')
+                        artist_works_info.append('')
+
+    # Remove duplicates while preserving order
+    seen = set()
+    unique_artists = []
+    unique_links = []
+    unique_bios = []
+    unique_works = []
+
+    for name, link, bio, works in zip(artist_names, artist_links, artist_bios, artist_works_info):
+        if name not in seen:
+            seen.add(name)
+            unique_artists.append(name)
+            unique_links.append(link)
+            unique_bios.append(bio)
+            unique_works.append(works)
+
+    data['artist_name'] = '|'.join(unique_artists) if unique_artists else ''
+    data['artist_link'] = '|'.join(unique_links) if unique_links else ''
+    data['no_artists'] = len(unique_artists)
+
+    # Store bio and works info
+    if unique_bios and any(unique_bios):
+        data['artist_bio'] = '|'.join(unique_bios)
+    if unique_works and any(unique_works):
+        data['artist_no_works'] = '|'.join(unique_works)
+
+    # Extract description - prefer meta tags as they have clean text
+    meta_desc = soup.find('meta', attrs={'name': 'description'}) or \
+               soup.find('meta', attrs={'property': 'og:description'})
+    if meta_desc:
+        data['description'] = meta_desc.get('content', '')
+    else:
+        # Fallback to article content
+        article = soup.find('article')
+        if article:
+            paragraphs = article.find_all('p')
+            data['description'] = ' '.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
+
+    # Extract additional artist bio if available (more detailed than the list bio)
+    bio_elem = soup.find(class_='artist-bio') or soup.find(class_='bio')
+    if bio_elem:
+        detailed_bio = bio_elem.get_text(strip=True)
+        # If we already have bio from artist list, append; otherwise use this
+        if data['artist_bio']:
+            data['artist_bio'] = data['artist_bio'] + ' | ' + detailed_bio
+        else:
+            data['artist_bio'] = detailed_bio
+
+    # Extract artist image
+    og_image = soup.find('meta', property='og:image')
+    if og_image:
+        data['artist_image'] = og_image.get('content', '')
+
+    # Extract credits
+    data['credits'] = extract_text_safe(soup, '.credits') or \
+                     extract_text_safe(soup, '.event-detail__credits')
+
+    # Extract sponsor information
+    sponsors = extract_multiple(soup, '.sponsor') or \
+              extract_multiple(soup, '.event-detail__sponsor')
+    data['sponsor_text'] = '|'.join(sponsors) if sponsors else ''
+    data['no_sponsor_paragraphs'] = len(sponsors)
+
+    # Extract promos
+    promos = soup.select('.promo') or soup.select('.related-content')
+    data['no_promos'] = len(promos)
+
+    if promos:
+        promo_data = []
+        for promo in promos:
+            promo_dict = {
+                'title': extract_text_safe(promo, '.promo__title'),
+                'description': extract_text_safe(promo, '.promo__description'),
+                'link': extract_text_safe(promo, 'a', 'href'),
+                'category': extract_text_safe(promo, '.promo__category'),
+                'date': extract_text_safe(promo, '.promo__date'),
+                'author': extract_text_safe(promo, '.promo__author'),
+                'image': extract_text_safe(promo, 'img', 'src')
+            }
+            promo_data.append(promo_dict)
+
+        if promo_data:
+            data['promo_title'] = '|'.join([p['title'] for p in promo_data])
+            data['promo_description'] = '|'.join([p['description'] for p in promo_data])
+            data['promo_link'] = '|'.join([p['link'] for p in promo_data])
+            data['promo_category'] = '|'.join([p['category'] for p in promo_data])
+            data['promo_date'] = '|'.join([p['date'] for p in promo_data])
+            data['promo_author'] = '|'.join([p['author'] for p in promo_data])
+            data['promo_image'] = '|'.join([p['image'] for p in promo_data])
+            data['promo_link_data'] = json.dumps(promo_data)
+
+    # Extract videos
+    videos = soup.select('video') or soup.select('iframe[src*="youtube"]') or \
+            soup.select('iframe[src*="vimeo"]')
+    data['no_videos'] = len(videos)
+    video_urls = []
+    for video in videos:
+        src = video.get('src', '')
+        if src:
+            video_urls.append(src)
+    data['video'] = '|'.join(video_urls)
+
+    # Extract publications
+    data['no_pubs'] = count_elements(soup, '.publication') or \
+                     count_elements(soup, 'a[href*="/publications/"]')
+
+    # Extract events
+    events = extract_multiple(soup, '.event') or \
+            extract_multiple(soup, '.related-event')
+    data['event_catch_all'] = '|'.join(events) if events else ''
+    data['no_events'] = len(events)
+
+    # Extract location details
+    location_tags = extract_multiple(soup, '.location-tag')
+    data['location_tag'] = '|'.join(location_tags) if location_tags else ''
+    data['no_locations'] = len(location_tags)
+
+    data['location_donor'] = extract_text_safe(soup, '.location-donor')
+    data['location_selbst'] = extract_text_safe(soup, '.location-selbst')
+
+    # Extract works online (for galleries/exhibitions)
+    works_online = soup.select('.work-online') or soup.select('a[href*="/collection/works/"]')
+    data['no_works_online'] = len(works_online)
+    works_online_links = [w.get('href', '') for w in works_online if w.get('href')]
+    data['works_online_links'] = '|'.join(works_online_links)
+    works_online_texts = [w.get_text(strip=True) for w in works_online]
+    data['works_online_text'] = '|'.join(works_online_texts)
+
+    return data
@@ -0,0 +1,237 @@
+"""
+Offline extraction benchmark
+
+Runs the parse and extraction hot paths over the saved pages in bench/corpus
+(no network) and reports throughput, per-field-group extraction time and
+memory. Results are written as JSON so a later run can be compared against
+them to catch regressions from parser or selector changes.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+    python benchmark.py --fields 'title,date,artist_*'
+
+Stages:
+    parse_bs4       BeautifulSoup(content, 'lxml'), the parse step of fetch_page
+    parse_lxml      parse_html + PageIndex, the parse step of the crawler
+    scrape_page     extractor.extract_page, what scrape_page runs after the fetch
+                    (only the field groups for --fields, when given)
+    reference       fetch_page's parse + bench/reference.py's extract_fields (BeautifulSoup)
+
+Each stage runs in a fresh process so its peak RSS is its own.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench', 'corpus')
+STAGES = ['parse_bs4', 'parse_lxml', 'scrape_page', 'reference']
+URL_TEMPLATE = 'https://www.moma.org/calendar/{}/{}'
+
+
+def load_corpus(directory: str = CORPUS_DIR) -> List[Tuple[str, str, bytes]]:
+    """Return (page_type, url, content) for every <page_type>_<id>.html in `directory`"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        page_type, page_id = os.path.basename(path)[:-len('.html')].rsplit('_', 1)
+        with open(path, 'rb') as f:
+            pages.append((page_type, URL_TEMPLATE.format(page_type, page_id), f.read()))
+    if not pages:
+        raise FileNotFoundError(f"No corpus pages in {directory} (run bench/make_corpus.py)")
+    return pages
+
+
+def stage_function(stage: str, fields: Optional[List[str]] = None):
+    """The callable a stage times, taking (page_type, url, content)"""
+    if stage == 'parse_bs4':
+        from bs4 import BeautifulSoup
+        return lambda page_type, url, content: BeautifulSoup(content, 'lxml')
+    if stage == 'parse_lxml':
+        import extractor
+        return lambda page_type, url, content: extractor.PageIndex(extractor.parse_html(content))
+    if stage == 'scrape_page':
+        import extractor
+        groups = extractor.field_groups(fields)
+        return lambda page_type, url, content: extractor.extract_page(content, url, page_type,
+                                                                      groups=groups)
+    if stage == 'reference':
+        from bs4 import BeautifulSoup
+        from bench.reference import extract_fields
+        return lambda page_type, url, content: extract_fields(BeautifulSoup(content, 'lxml'), url, page_type)
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def max_rss_kb() -> int:
+    """Peak resident set size of this process so far, in KiB"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def run_stage(stage: str, corpus_dir: str, repeat: int, fields: Optional[List[str]] = None) -> Dict:
+    """Time one stage over the corpus (runs inside a worker process)"""
+    pages = load_corpus(corpus_dir)
+    function = stage_function(stage, fields)
+    for page in pages:
+        function(*page)
+    baseline_rss = max_rss_kb()
+
+    per_page = {url: [] for _, url, _ in pages}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page_type, url, content in pages:
+            page_started = time.perf_counter()
+            function(page_type, url, content)
+            per_page[url].append(time.perf_counter() - page_started)
+    elapsed = time.perf_counter() - started
+
+    # Allocation profile on a separate pass: tracemalloc slows everything down
+    tracemalloc.start()
+    peak_alloc = 0
+    for page in pages:
+        tracemalloc.reset_peak()
+        function(*page)
+        peak_alloc = max(peak_alloc, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    page_ms = {url: statistics.median(times) * 1000 for url, times in per_page.items()}
+    return {
+        'pages_per_sec': len(pages) * repeat / elapsed,
+        'mean_ms': elapsed / (len(pages) * repeat) * 1000,
+        'slowest_page_ms': max(page_ms.values()),
+        'page_ms': page_ms,
+        'peak_alloc_bytes': peak_alloc,
+        'peak_rss_kb': max_rss_kb(),
+        'rss_growth_kb': max_rss_kb() - baseline_rss,
+    }
+
+
+def field_timings(corpus_dir: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Time parsing, indexing and each extractor field group separately"""
+    import extractor
+
+    pages = load_corpus(corpus_dir)
+    totals = {'parse_html': 0.0, 'page_index': 0.0}
+    totals.update((group.name, 0.0) for group in extractor.FIELD_GROUPS)
+    for _ in range(repeat):
+        for page_type, url, content in pages:
+            started = time.perf_counter()
+            root = extractor.parse_html(content)
+            parsed = time.perf_counter()
+            page = extractor.PageIndex(root)
+            totals['parse_html'] += parsed - started
+            totals['page_index'] += time.perf_counter() - parsed
+            data = extractor.empty_record(url, page_type)
+            for group in extractor.FIELD_GROUPS:
+                started = time.perf_counter()
+                if group.applies_to(page):
+                    group.extract(page, data)
+                totals[group.name] += time.perf_counter() - started
+
+    grand_total = sum(totals.values())
+    runs = len(pages) * repeat
+    return {name: {'us_per_page': total / runs * 1e6, 'share': total / grand_total}
+            for name, total in totals.items()}
+
+
+def run_benchmark(corpus_dir: str = CORPUS_DIR, repeat: int = 5,
+                  stages: Optional[List[str]] = None, fields: Optional[List[str]] = None) -> Dict:
+    """Run every stage in its own spawned process and collect the results
+
+    `fields` narrows the scrape_page stage to the groups filling those columns.
+    """
+    pages = load_corpus(corpus_dir)
+    stages = stages or STAGES
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {
+            'directory': corpus_dir,
+            'pages': len(pages),
+            'bytes': sum(len(content) for _, _, content in pages),
+        },
+        'repeat': repeat,
+        'selected_fields': fields,
+        'stages': {},
+    }
+    context = multiprocessing.get_context('spawn')
+    for stage in stages:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results['stages'][stage] = pool.submit(run_stage, stage, corpus_dir, repeat, fields).result()
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        results['fields'] = pool.submit(field_timings, corpus_dir, repeat).result()
+    return results
+
+
+def print_results(results: Dict):
+    corpus = results['corpus']
+    print(f"Corpus: {corpus['pages']} pages, {corpus['bytes'] / 1024:.0f} KiB, "
+          f"{results['repeat']} passes")
+    if results.get('selected_fields'):
+        print(f"Fields: {', '.join(results['selected_fields'])}")
+    print(f"\n{'stage':<14}{'pages/s':>10}{'mean ms':>10}{'max ms':>10}"
+          f"{'peak alloc':>13}{'peak RSS':>11}")
+    for stage, stats in results['stages'].items():
+        print(f"{stage:<14}{stats['pages_per_sec']:>10.1f}{stats['mean_ms']:>10.2f}"
+              f"{stats['slowest_page_ms']:>10.2f}{stats['peak_alloc_bytes'] / 1024:>10.0f} KiB"
+              f"{stats['peak_rss_kb'] / 1024:>7.1f} MiB")
+    if 'fields' in results:
+        print(f"\n{'field group':<14}{'us/page':>10}{'share':>8}")
+        for name, stats in sorted(results['fields'].items(), key=lambda item: -item[1]['share']):
+            print(f"{name:<14}{stats['us_per_page']:>10.1f}{stats['share']:>8.1%}")
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float = 0.15) -> List[str]:
+    """Print changes against a baseline run; return the regressions beyond `tolerance`"""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline.get('created_at', '?')}:")
+    for stage, stats in results['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if not old:
+            continue
+        speed = stats['pages_per_sec'] / old['pages_per_sec'] - 1
+        memory = stats['peak_alloc_bytes'] / old['peak_alloc_bytes'] - 1 if old['peak_alloc_bytes'] else 0.0
+        print(f"  {stage:<14} throughput {speed:+7.1%}   peak alloc {memory:+7.1%}")
+        if speed < -tolerance:
+            regressions.append(f"{stage}: throughput {speed:+.1%}")
+        if memory > tolerance:
+            regressions.append(f"{stage}: peak allocations {memory:+.1%}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline extraction benchmark')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='Directory of saved pages')
+    parser.add_argument('--repeat', type=int, default=5, help='Passes over the corpus per stage')
+    parser.add_argument('--stages', nargs='*', choices=STAGES, default=None, help='Stages to run')
+    parser.add_argument('--output', default='bench_results.json', help='JSON file to write results to')
+    parser.add_argument('--compare', default=None, help='Baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed slowdown / memory growth before failing (fraction)')
+    parser.add_argument('--fields', default=None,
+                        help='Comma-separated output fields (wildcards allowed) for scrape_page')
+    args = parser.parse_args()
+
+    fields = args.fields.split(',') if args.fields else None
+    results = run_benchmark(args.corpus, args.repeat, args.stages, fields)
+    print_results(results)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions: " + '; '.join(regressions))
+            sys.exit(1)
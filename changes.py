@@ -0,0 +1,144 @@
+"""
+Change detection for refresh crawls
+
+A scheduled refresh (scrape_all(refresh_due=True)) re-checks scraped pages
+on a schedule weighted by when their event runs: current and upcoming events
+are checked daily, events that ended long ago only every couple of years.
+Each re-fetched body is reduced to a normalized fingerprint (scripts, styles,
+comments, per-request tokens and whitespace removed), and only pages whose
+fingerprint changed are parsed again. Rows whose extracted fields actually
+differ are appended to the CSV, and a per-row changelog records which fields
+changed, from what, to what.
+"""
+import csv
+import datetime
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from normalize import date_range
+from records import PageRecord
+from sinks import FIELDNAMES
+
+DAY = 24 * 3600
+
+# (how long ago the event ended, re-check interval), first match wins
+REFRESH_INTERVALS = [
+    (0, DAY),                     # running or upcoming
+    (30 * DAY, 7 * DAY),
+    (365 * DAY, 30 * DAY),
+    (5 * 365 * DAY, 180 * DAY),
+    (float('inf'), 730 * DAY),
+]
+# Pages whose date cannot be parsed, e.g. permanent galleries
+UNDATED_INTERVAL = 30 * DAY
+
+# Markup that changes between requests without the page changing
+_VOLATILE = [
+    re.compile(rb'<script\b.*?</script\s*>', re.IGNORECASE | re.DOTALL),
+    re.compile(rb'<style\b.*?</style\s*>', re.IGNORECASE | re.DOTALL),
+    re.compile(rb'<noscript\b.*?</noscript\s*>', re.IGNORECASE | re.DOTALL),
+    re.compile(rb'<!--.*?-->', re.DOTALL),
+    re.compile(rb'<meta\s[^>]*name="csrf[^>]*>', re.IGNORECASE),
+    re.compile(rb'<input\s[^>]*type="hidden"[^>]*>', re.IGNORECASE),
+    re.compile(rb'\s(?:nonce|data-csrf[\w-]*|data-request-id)="[^"]*"', re.IGNORECASE),
+]
+_WHITESPACE = re.compile(rb'\s+')
+
+def fingerprint(content: bytes) -> str:
+    """Hash of a page body with volatile markup and whitespace normalized away"""
+    for pattern in _VOLATILE:
+        content = pattern.sub(b'', content)
+    return hashlib.sha256(_WHITESPACE.sub(b' ', content).strip()).hexdigest()
+
+
+def event_end(date_text: str) -> Optional[float]:
+    """Timestamp of the last day an event runs, from the scraped `date` field
+
+    None if no date parses (see normalize.date_range for the formats handled).
+    """
+    end = date_range(date_text)[1]
+    if end is None:
+        return None
+    return datetime.datetime(end.year, end.month, end.day, 23, 59, 59).timestamp()
+
+
+def refresh_interval(end: Optional[float], now: Optional[float] = None) -> float:
+    """Seconds between re-checks of a page whose event ends at `end`"""
+    if end is None:
+        return UNDATED_INTERVAL
+    ended_ago = (now or time.time()) - end
+    for limit, interval in REFRESH_INTERVALS:
+        if ended_ago <= limit:
+            return interval
+    return REFRESH_INTERVALS[-1][1]
+
+
+def due_pages(pages: Iterable[Tuple[Any, Optional[float], Optional[float]]],
+              now: Optional[float] = None) -> List[Any]:
+    """The keys of the pages due a re-check, most overdue first
+
+    `pages` yields (key, fetched_at, event_end) per scraped page, as kept in
+    the crawl state, so the schedule needs no pass over the CSV. Pages with
+    no recorded check are always due.
+    """
+    now = now or time.time()
+    due = []
+    for key, fetched_at, end in pages:
+        overdue = (now - (fetched_at or 0.0)) / refresh_interval(end, now)
+        if overdue >= 1:
+            due.append((overdue, key))
+    due.sort(key=lambda item: -item[0])
+    return [key for _, key in due]
+
+
+def current_rows(csv_path: str, urls: Iterable[str]) -> Dict[str, PageRecord]:
+    """{url: current row} for `urls`; rows of other pages are read past, not kept"""
+    urls = set(urls)
+    current = {}
+    if not urls:
+        return current
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row['url'] in urls:
+                # The last row for a URL is its current one
+                current[row['url']] = PageRecord.from_row(row)
+    return current
+
+
+def changed_fields(old: Dict, new: Dict, fields: Iterable[str] = FIELDNAMES) -> Dict[str, Dict]:
+    """{field: {'old': ..., 'new': ...}} for fields whose CSV value differs (`old` may be a PageRecord)"""
+    def cell(value):
+        return '' if value is None else str(value)
+
+    return {field: {'old': cell(old.get(field)), 'new': cell(new.get(field))}
+            for field in fields if cell(old.get(field)) != cell(new.get(field))}
+
+
+class ChangeLog:
+    """JSON-lines record of the pages a refresh found changed or gone"""
+
+    def __init__(self, path: str = 'changes.jsonl'):
+        self.path = path
+        self.entries = 0
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, page_type: str, page_id: int, url: str, change: str,
+              fields: Optional[Dict[str, Dict]] = None):
+        """Append one entry; `change` is 'modified' or 'removed'"""
+        entry = {'ts': round(time.time(), 3), 'type': page_type, 'id': page_id, 'url': url,
+                 'change': change}
+        if fields:
+            entry['fields'] = fields
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.entries += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
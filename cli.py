@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Command-line entry point for crawling, progress checks and exports
+
+    python cli.py crawl --start 1 --end 8000 --concurrency 4
+    python cli.py resume
+    python cli.py status --json
+    python cli.py export parquet
+    python cli.py reextract --archive archive --output reextracted.csv
+
+Each command imports only what it uses, and the HTTP session is only created
+when a command fetches pages. `status` reads the counts from the SQLite crawl
+state, without loading main.csv or the scraper, so it is cheap enough to run
+from cron or monitoring every minute.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# (flags, argparse options) shared by crawl and resume; dests match the
+# MoMAScraper / scrape_all keyword arguments
+CRAWL_OPTIONS = [
+    (('--start',), dict(type=int, default=1, help='First ID')),
+    (('--end',), dict(type=int, default=8000, help='Last ID')),
+    (('--delay',), dict(type=float, default=0.5, help='Seconds between requests')),
+    (('--rate',), dict(type=float, default=None, help='Max requests per second (default: 1 / delay)')),
+    (('--concurrency',), dict(type=int, default=1, help='Concurrent requests')),
+    (('--parse-workers',), dict(type=int, default=0, help='Parser processes (0: parse on the fetch threads)')),
+    (('--max-retries',), dict(type=int, default=3, help='In-run retries per page')),
+    (('--adaptive-rate',), dict(action='store_true', default=False, help='Tune the rate while crawling')),
+    (('--max-rate',), dict(type=float, default=20.0, help='Upper bound for --adaptive-rate')),
+    (('--discover',), dict(action='store_true', default=False, help='Estimate live ID ranges first')),
+    (('--no-follow-links',), dict(dest='follow_links', action='store_false', default=True,
+                                  help='Do not fetch linked calendar pages first')),
+    (('--follow-beyond-end',), dict(action='store_true', default=False, help='Let links reach IDs above --end')),
+    (('--recheck-missing',), dict(action='store_true', default=False, help='Probe known 404s again')),
+    (('--refresh',), dict(action='store_true', default=False, help='Fetch scraped pages again')),
+    (('--refresh-due',), dict(action='store_true', default=False, help='Re-check pages due under the schedule')),
+    (('--fields',), dict(default=None, help='Comma-separated output fields, wildcards allowed')),
+    (('--csv',), dict(dest='csv_path', default='main.csv', help='CSV file rows are appended to')),
+    (('--state',), dict(dest='state_path', default='crawl_state.sqlite', help='Crawl state database')),
+    (('--archive',), dict(dest='archive_dir', default=None, help='Keep compressed page bodies here')),
+    (('--parquet',), dict(dest='parquet_dir', default=None, help='Also write Parquet output here')),
+    (('--index',), dict(dest='index_path', default=None, help='Also index dates and artists here')),
+    (('--changelog',), dict(dest='changelog_path', default='changes.jsonl', help='Changelog of --refresh-due')),
+    (('--metrics',), dict(dest='metrics_path', default=None, help='Append per-page metrics here')),
+    (('--prometheus',), dict(dest='prometheus_path', default=None, help='Prometheus text file')),
+    (('--metrics-port',), dict(type=int, default=None, help='Serve Prometheus metrics on this port')),
+    (('--verbose',), dict(action='store_true', default=False, help='Log every page')),
+    (('--http-cache',), dict(default=None, help='HTTP cache database for conditional requests')),
+    (('--cookies',), dict(dest='cookie_path', default=None, help='Keep Cloudflare cookies in this file')),
+    (('--base-url',), dict(default=None, help='Site to crawl (e.g. a mock server)')),
+]
+SCRAPER_OPTIONS = ('http_cache', 'cookie_path', 'base_url')
+# Not carried over by resume: a resumed refresh would start over
+ONE_OFF_OPTIONS = ('refresh',)
+CRAWL_ARGS_KEY = 'cli_crawl_args'
+
+
+def add_crawl_options(parser: argparse.ArgumentParser, defaults: bool = True):
+    """Add the crawl options; without `defaults`, only options given on the command line are set"""
+    for flags, options in CRAWL_OPTIONS:
+        options = dict(options)
+        if not defaults:
+            options['default'] = argparse.SUPPRESS
+        parser.add_argument(*flags, **options)
+
+
+def run_crawl(options: dict):
+    """Run scrape_all with parsed crawl options"""
+    from moma_scraper import MoMAScraper
+
+    options = dict(options)
+    if isinstance(options.get('fields'), str):
+        options['fields'] = options['fields'].split(',')
+    scraper_options = {key: options.pop(key) for key in SCRAPER_OPTIONS if key in options}
+    scraper_options = {key: value for key, value in scraper_options.items() if value is not None}
+    MoMAScraper(**scraper_options).scrape_all(**options)
+
+
+def save_crawl_args(state_path: str, options: dict):
+    """Remember a crawl's options in its crawl state for `resume`"""
+    from crawl_state import CrawlState
+
+    state = CrawlState(state_path)
+    state.set_meta(CRAWL_ARGS_KEY, json.dumps(
+        {key: value for key, value in options.items() if key not in ONE_OFF_OPTIONS}))
+    state.commit()
+    state.close()
+
+
+def load_crawl_args(state_path: str) -> dict:
+    """Options of the last `crawl` run on a crawl state, {} if none is recorded"""
+    from crawl_state import CrawlState
+
+    if not os.path.exists(state_path):
+        return {}
+    state = CrawlState(state_path, readonly=True)
+    try:
+        saved = state.get_meta(CRAWL_ARGS_KEY)
+    finally:
+        state.close()
+    return json.loads(saved) if saved else {}
+
+
+def crawl_status(state_path: str) -> dict:
+    """Progress of a crawl, read from its crawl state alone"""
+    from crawl_state import STATUS_NOT_FOUND, STATUS_OK, CrawlState
+
+    state = CrawlState(state_path, readonly=True)
+    try:
+        counts = state.counts()
+        csv_offset = state.get_meta('csv_offset')
+        last_fetched = state.last_fetched()
+    finally:
+        state.close()
+    return {
+        'state': state_path,
+        'pages': counts,
+        'scraped': sum(c.get(STATUS_OK, 0) for c in counts.values()),
+        'not_found': sum(c.get(STATUS_NOT_FOUND, 0) for c in counts.values()),
+        'other': sum(n for c in counts.values() for status, n in c.items()
+                     if status not in (STATUS_OK, STATUS_NOT_FOUND)),
+        'csv_bytes': int(csv_offset) if csv_offset is not None else None,
+        'last_fetched': last_fetched,
+    }
+
+
+def print_status(status: dict):
+    print(f"{status['state']}: {status['scraped']} pages scraped, {status['not_found']} known 404s, "
+          f"{status['other']} pending retry or skipped")
+    for page_type, counts in sorted(status['pages'].items()):
+        print(f"  {page_type}: " + ', '.join(f'{status_name} {n}' for status_name, n in sorted(counts.items())))
+    if status['csv_bytes'] is not None:
+        print(f"  CSV at last checkpoint: {status['csv_bytes'] / 1e6:.1f} MB")
+    if status['last_fetched']:
+        age = time.time() - status['last_fetched']
+        print(f"  Last fetch: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(status['last_fetched']))} "
+              f"({age / 60:.0f} min ago)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='MoMA calendar scraper')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = subcommands.add_parser('crawl', help='Scrape an ID range, skipping pages already done')
+    add_crawl_options(crawl_parser)
+
+    resume_parser = subcommands.add_parser(
+        'resume', help='Continue the last crawl with its options (any given here override them)')
+    add_crawl_options(resume_parser, defaults=False)
+
+    status_parser = subcommands.add_parser('status', help='Show crawl progress from the crawl state')
+    status_parser.add_argument('--state', default='crawl_state.sqlite', help='Crawl state database')
+    status_parser.add_argument('--json', action='store_true', help='Print one JSON object')
+
+    export_parser = subcommands.add_parser('export', help='Rebuild a derived output from the CSV')
+    export_parser.add_argument('format', choices=['parquet', 'index'],
+                               help='parquet: typed Parquet copy; index: date and artist index')
+    export_parser.add_argument('--csv', default='main.csv', help='CSV file to read')
+    export_parser.add_argument('--output', default=None,
+                               help='Output path (default: main.parquet or main_index.sqlite)')
+
+    reextract_parser = subcommands.add_parser('reextract', help='Re-run extraction over the archive')
+    reextract_parser.add_argument('--archive', default='archive', help='Archive directory')
+    reextract_parser.add_argument('--output', default='reextracted.csv', help='CSV file to write')
+    reextract_parser.add_argument('--workers', type=int, default=None, help='Parser processes')
+    reextract_parser.add_argument('--types', nargs='*', default=None,
+                                  help='Only these page types (film, galleries, exhibitions)')
+    reextract_parser.add_argument('--fields', default=None,
+                                  help='Comma-separated output fields, wildcards allowed (e.g. title,artist_*)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'crawl':
+        options = vars(args)
+        del options['command']
+        save_crawl_args(args.state_path, options)
+        run_crawl(options)
+    elif args.command == 'resume':
+        overrides = vars(args)
+        del overrides['command']
+        state_path = overrides.get('state_path', 'crawl_state.sqlite')
+        defaults = argparse.ArgumentParser()
+        add_crawl_options(defaults)
+        options = vars(defaults.parse_args([]))
+        saved = load_crawl_args(state_path)
+        if saved:
+            print(f"Resuming the crawl recorded in {state_path}")
+        else:
+            print(f"No crawl recorded in {state_path}, using the default options")
+        options.update(saved)
+        options.update(overrides)
+        save_crawl_args(state_path, options)
+        run_crawl(options)
+    elif args.command == 'status':
+        if not os.path.exists(args.state):
+            print(f"{args.state} not found", file=sys.stderr)
+            return 1
+        status = crawl_status(args.state)
+        if args.json:
+            print(json.dumps(status))
+        else:
+            print_status(status)
+    elif args.command == 'export':
+        started = time.time()
+        if args.format == 'parquet':
+            from sinks import export_parquet
+
+            output = args.output or 'main.parquet'
+            rows = export_parquet(args.csv, output)
+            print(f"Wrote {rows} rows to {output}")
+        else:
+            from normalize import build_index
+
+            output = args.output or 'main_index.sqlite'
+            counts = build_index(args.csv, output)
+            print(f"Indexed {counts['events']} pages, {counts['artists']} artists and "
+                  f"{counts['event_artists']} page-artist links into {output}")
+        print(f"Done in {time.time() - started:.1f}s")
+    elif args.command == 'reextract':
+        from archive import reextract
+
+        reextract(args.archive, args.output, args.workers, args.types,
+                  args.fields.split(',') if args.fields else None)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Persistent crawl-state index backed by SQLite
+
+Every (page_type, id) the crawler has touched gets one row recording how the
+last fetch went, so a resume is a single indexed query instead of a re-parse
+of main.csv, and known 404s are not probed again.
+"""
+import sqlite3
+import time
+import urllib.parse
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+STATUS_OK = 'ok'
+STATUS_NOT_FOUND = '404'
+STATUS_ERROR = 'error'
+STATUS_RETRY_AFTER = 'retry-after'
+STATUS_SKIPPED = 'skipped'
+
+# Skipped IDs (see discovery.py) are probed again once they are this old
+REPROBE_SKIPPED_AFTER = 7 * 24 * 3600
+# Set while scraped pages from before event_end was recorded lack it
+EVENT_ENDS_MISSING_KEY = 'event_ends_missing'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    page_type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    http_status INTEGER,
+    fetched_at REAL,
+    content_hash TEXT,
+    retry_after REAL,
+    event_end REAL,
+    PRIMARY KEY (page_type, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pages_status ON pages (status, page_type);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def done_statuses(recheck_missing: bool = False, refresh: bool = False) -> List[str]:
+    """Statuses a run treats as finished and does not fetch again"""
+    done = []
+    if not refresh:
+        done.append(STATUS_OK)
+    if not recheck_missing:
+        done.append(STATUS_NOT_FOUND)
+    return done
+
+
+class CrawlState:
+    """SQLite store of per-page crawl status keyed by (page_type, id)"""
+
+    def __init__(self, path: str = 'crawl_state.sqlite', readonly: bool = False):
+        """Open (or create) the state at `path`
+
+        With `readonly`, the file must already exist and is never written,
+        so status checks can read it while a crawl is running.
+        """
+        self.path = path
+        if readonly:
+            self.conn = sqlite3.connect(f'file:{urllib.parse.quote(path)}?mode=ro', uri=True)
+            return
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        if 'event_end' not in self._columns('main'):
+            # Added for refresh scheduling; filled in from the CSV when first needed
+            self.conn.execute('ALTER TABLE pages ADD COLUMN event_end REAL')
+            self.set_meta(EVENT_ENDS_MISSING_KEY, 1)
+        self.conn.commit()
+
+    def _columns(self, schema: str) -> List[str]:
+        return [row[1] for row in self.conn.execute(f'PRAGMA {schema}.table_info(pages)')]
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def csv_checkpoint(self) -> Tuple[Optional[int], Optional[str]]:
+        """(offset, digest) of the CSV as of the last commit (see sinks.checkpoint_digest)"""
+        offset = self.get_meta('csv_offset')
+        return (int(offset) if offset is not None else None), self.get_meta('csv_digest')
+
+    def set_csv_checkpoint(self, offset: int, digest: str):
+        """Record how far the CSV the committed pages refer to goes, and what it ends with"""
+        self.set_meta('csv_offset', offset)
+        self.set_meta('csv_digest', digest)
+
+    def discovery_bound(self, page_type: str) -> Optional[int]:
+        """The end of a category's live IDs as last estimated by discovery"""
+        bound = self.get_meta(f'discovery_bound:{page_type}')
+        return int(bound) if bound is not None else None
+
+    def set_discovery_bound(self, page_type: str, bound: int):
+        self.set_meta(f'discovery_bound:{page_type}', bound)
+
+    def record(self, page_type: str, page_id: int, url: str, status: str,
+               http_status: Optional[int] = None, content_hash: Optional[str] = None,
+               retry_after: Optional[float] = None, fetched_at: Optional[float] = None,
+               event_end: Optional[float] = None):
+        """Record the outcome of one fetch (not committed until commit())
+
+        `event_end` is when the page's event ends (see changes.event_end);
+        without one, a value recorded earlier is kept.
+        """
+        self.conn.execute(
+            'INSERT INTO pages '
+            '(page_type, id, url, status, http_status, fetched_at, content_hash, retry_after, event_end) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (page_type, id) DO UPDATE SET url = excluded.url, status = excluded.status, '
+            'http_status = excluded.http_status, fetched_at = excluded.fetched_at, '
+            'content_hash = excluded.content_hash, retry_after = excluded.retry_after, '
+            'event_end = COALESCE(excluded.event_end, pages.event_end)',
+            (page_type, page_id, url, status, http_status,
+             time.time() if fetched_at is None else fetched_at, content_hash, retry_after, event_end)
+        )
+
+    def import_scraped(self, pages: Iterable[Tuple[str, int, str, Optional[float]]],
+                       keep_fetched: bool = False):
+        """Mark (page_type, id, url, event_end) entries as already scraped, e.g. rows found in main.csv
+
+        With `keep_fetched`, pages already known keep their fetch time and
+        content hash (rows re-written by a refresh) instead of being reset.
+        """
+        if keep_fetched:
+            sql = ('INSERT INTO pages (page_type, id, url, status, http_status, event_end) '
+                   'VALUES (?, ?, ?, ?, 200, ?) '
+                   'ON CONFLICT (page_type, id) DO UPDATE SET url = excluded.url, status = excluded.status, '
+                   'http_status = excluded.http_status, retry_after = NULL, event_end = excluded.event_end')
+        else:
+            sql = ('INSERT OR REPLACE INTO pages (page_type, id, url, status, http_status, event_end) '
+                   'VALUES (?, ?, ?, ?, 200, ?)')
+        self.conn.executemany(
+            sql,
+            ((page_type, page_id, url, STATUS_OK, end) for page_type, page_id, url, end in pages)
+        )
+
+    def set_event_ends(self, pages: Iterable[Tuple[str, int, Optional[float]]]):
+        """Fill in (page_type, id, event_end) of scraped pages, e.g. from main.csv"""
+        self.conn.executemany(
+            'UPDATE pages SET event_end = ? WHERE page_type = ? AND id = ?',
+            ((end, page_type, page_id) for page_type, page_id, end in pages)
+        )
+        self.set_meta(EVENT_ENDS_MISSING_KEY, 0)
+
+    def forget_scraped(self):
+        """Drop all 'ok' entries, keeping 404/error history"""
+        self.conn.execute('DELETE FROM pages WHERE status = ?', (STATUS_OK,))
+
+    def merge(self, path: str):
+        """Take in pages from another crawl state, keeping whichever was fetched last"""
+        self.conn.commit()
+        self.conn.execute('ATTACH DATABASE ? AS other', (path,))
+        try:
+            # States that were never opened since event_end was added lack it
+            event_end = 'o.event_end' if 'event_end' in self._columns('other') else 'NULL'
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pages '
+                'SELECT o.page_type, o.id, o.url, o.status, o.http_status, o.fetched_at, '
+                f'       o.content_hash, o.retry_after, {event_end} '
+                'FROM other.pages o LEFT JOIN pages p ON p.page_type = o.page_type AND p.id = o.id '
+                'WHERE p.id IS NULL OR COALESCE(o.fetched_at, 0) >= COALESCE(p.fetched_at, 0)'
+            )
+            self.conn.commit()
+        finally:
+            self.conn.execute('DETACH DATABASE other')
+
+    def commit(self):
+        self.conn.commit()
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Return {page_type: {status: count}}"""
+        counts = {}
+        for page_type, status, count in self.conn.execute(
+                'SELECT page_type, status, COUNT(*) FROM pages GROUP BY page_type, status'):
+            counts.setdefault(page_type, {})[status] = count
+        return counts
+
+    def statuses(self, page_type: str, ids: List[int]) -> Dict[int, str]:
+        """Return {id: status} for those of `ids` the state knows about"""
+        statuses = {}
+        for offset in range(0, len(ids), 500):
+            chunk = ids[offset:offset + 500]
+            statuses.update(self.conn.execute(
+                'SELECT id, status FROM pages WHERE page_type = ? AND id IN (%s)'
+                % ','.join('?' * len(chunk)),
+                (page_type, *chunk)
+            ))
+        return statuses
+
+    def scraped(self) -> Dict[str, Tuple[Optional[float], Optional[str]]]:
+        """{url: (fetched_at, content_hash)} of every scraped page"""
+        return {url: (fetched_at, content_hash) for url, fetched_at, content_hash in self.conn.execute(
+            'SELECT url, fetched_at, content_hash FROM pages WHERE status = ?', (STATUS_OK,))}
+
+    def scraped_pages(self) -> Iterator[Tuple[str, int, str, Optional[float], Optional[str], Optional[float]]]:
+        """Yield (page_type, id, url, fetched_at, content_hash, event_end) of every scraped page"""
+        yield from self.conn.execute(
+            'SELECT page_type, id, url, fetched_at, content_hash, event_end FROM pages WHERE status = ?',
+            (STATUS_OK,))
+
+    def event_ends_missing(self) -> bool:
+        """Whether scraped pages recorded before event_end was kept still need it filled in"""
+        return self.get_meta(EVENT_ENDS_MISSING_KEY) == '1'
+
+    def last_fetched(self) -> Optional[float]:
+        """When the most recent fetch of any page happened"""
+        return self.conn.execute('SELECT MAX(fetched_at) FROM pages').fetchone()[0]
+
+    def max_id(self, page_type: str, status: str = STATUS_OK) -> Optional[int]:
+        """Highest ID recorded with `status` for a category"""
+        return self.conn.execute(
+            'SELECT MAX(id) FROM pages WHERE page_type = ? AND status = ?', (page_type, status)
+        ).fetchone()[0]
+
+    def pending(self, page_types: List[str], start: int, end: int,
+                recheck_missing: bool = False, refresh: bool = False,
+                reprobe_skipped_after: float = REPROBE_SKIPPED_AFTER) -> Iterator[Tuple[int, str]]:
+        """Yield (id, page_type) pairs in [start, end] still to fetch, in crawl order
+
+        Pages already scraped are skipped unless `refresh` is set, as are
+        known 404s unless `recheck_missing` is set, pages whose Retry-After
+        has not yet elapsed, and IDs discovery skipped less than
+        `reprobe_skipped_after` seconds ago. Errors are always retried.
+        """
+        types_cte = ' UNION ALL '.join('SELECT ? AS pos, ? AS page_type' for _ in page_types)
+        params = [v for pos, page_type in enumerate(page_types) for v in (pos, page_type)]
+        # An impossible status keeps the IN () list valid when nothing is done
+        done = done_statuses(recheck_missing, refresh) or ['']
+        query = (
+            'WITH RECURSIVE ids(id) AS (SELECT ? UNION ALL SELECT id + 1 FROM ids WHERE id < ?), '
+            'types(pos, page_type) AS (%s) '
+            'SELECT ids.id, types.page_type FROM ids CROSS JOIN types '
+            'WHERE NOT EXISTS ('
+            '    SELECT 1 FROM pages p WHERE p.page_type = types.page_type AND p.id = ids.id '
+            '    AND (p.status IN (%s) OR (p.status = ? AND p.retry_after > ?)'
+            '         OR (p.status = ? AND p.fetched_at > ?))'
+            ') ORDER BY ids.id, types.pos'
+        ) % (types_cte, ','.join('?' * len(done)))
+        cursor = self.conn.execute(
+            query, (start, end, *params, *done, STATUS_RETRY_AFTER, time.time(),
+                    STATUS_SKIPPED, time.time() - reprobe_skipped_after)
+        )
+        yield from cursor.fetchall()
@@ -0,0 +1,233 @@
+"""
+Adaptive ID-range discovery
+
+Each category's live IDs are sparse and end at a different point, so probing
+every integer up to `end` wastes most requests on guaranteed 404s. Discovery
+works in two steps:
+
+1. estimate_upper_bound() finds where a category's live IDs stop, using a
+   round of exponentially spaced probe windows followed by a binary search.
+2. DiscoveryScheduler walks the IDs below that bound, switching to sparse
+   probing after a long run of 404s. When a sparse probe hits a live page,
+   it backfills the IDs it passed over. IDs passed over between two dead
+   probes are reported as skipped, and the crawl state re-probes them later.
+
+The bound is an estimate: a live range between two probe windows can be
+missed. IDs past it are recorded as skipped too, and when they come due again
+the scheduler walks them sparsely instead of dropping them.
+
+Independently, a Frontier collects links to other calendar pages found while
+extracting and schedules them ahead of sequential probing.
+"""
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# probe(ids) -> {id: is_live}
+Probe = Callable[[List[int]], Dict[int, bool]]
+
+
+def estimate_upper_bound(probe: Probe, low: int, high: int, window: int = 5,
+                         margin: int = 50, spread: int = 64) -> int:
+    """Estimate the highest live ID in [low, high]
+
+    Windows are probed at low + 1, 2, 4, 8, ... in a single batch. The last
+    live window and the next dead one bracket the boundary, which is then
+    narrowed by binary search. A window counts as live if any ID in it is,
+    which tolerates sparse ID spaces. Each window covers `window` consecutive
+    IDs, or 1/`spread` of its distance from `low` when that is more, so the
+    far-out windows that decide the bound are less likely to land in a gap.
+    `margin` IDs past the estimate are kept in case the boundary is ragged.
+    """
+    def width(start: int) -> int:
+        return max(window, (start - low) // spread)
+
+    def windows_live(starts: List[int]) -> Dict[int, bool]:
+        spans = {s: range(s, min(s + width(s), high + 1)) for s in starts}
+        live = probe(sorted({i for span in spans.values() for i in span}))
+        return {s: any(live.get(i) for i in span) for s, span in spans.items()}
+
+    offsets = []
+    step = 1
+    while low + step <= high:
+        offsets.append(low + step)
+        step *= 2
+    if not offsets:
+        return high
+
+    live = windows_live(offsets)
+    live_starts = [s for s in offsets if live[s]]
+    if not live_starts:
+        return min(high, low + margin)
+
+    last_live = max(live_starts)
+    dead_after = [s for s in offsets if s > last_live]
+    if not dead_after:
+        return high
+    lo, hi = last_live, dead_after[0]
+
+    # Binary search between the last live window and the first dead one
+    while hi - lo > width(lo):
+        mid = (lo + hi) // 2
+        if windows_live([mid])[mid]:
+            lo = mid
+        else:
+            hi = mid
+
+    return min(high, lo + width(lo) + margin)
+
+
+class DiscoveryScheduler:
+    """Prioritized, feedback-driven work list over (page_type, id)
+
+    Iterating yields (page_type, id) round-robin across categories, with
+    backfill IDs ahead of the forward scan. The caller reports every outcome
+    through report(). Outcomes can arrive late (up to the concurrency limit),
+    which only delays the switch between dense and sparse scanning.
+
+    Iteration can end while backfill work created by late reports is still
+    queued, so callers loop while has_work() is true. Call finish() after
+    the last report to collect the IDs that were skipped.
+
+    IDs past a category's entry in `bounds` (an estimated end of its live
+    range) are scanned sparsely from the first one on, as if a dead run had
+    just ended there.
+    """
+
+    def __init__(self, pending: Dict[str, Iterable[int]], dead_run: int = 50, stride: int = 10,
+                 bounds: Optional[Dict[str, int]] = None):
+        self.dead_run = dead_run
+        self.stride = stride
+        self._bounds = dict(bounds or {})
+        self._cursors = {page_type: deque(sorted(ids)) for page_type, ids in pending.items()}
+        self._backfill = {page_type: deque() for page_type in pending}
+        self._gap = {page_type: [] for page_type in pending}
+        self._misses = {page_type: 0 for page_type in pending}
+        self._since_probe = {page_type: 0 for page_type in pending}
+        self.skipped = {page_type: [] for page_type in pending}
+
+    def sparse(self, page_type: str) -> bool:
+        return self._misses[page_type] >= self.dead_run
+
+    def has_work(self) -> bool:
+        return any(self._cursors.values()) or any(self._backfill.values())
+
+    def _next(self, page_type: str):
+        """Next ID to fetch for one category, or None if it has nothing ready"""
+        backfill = self._backfill[page_type]
+        if backfill:
+            return backfill.popleft()
+        cursor = self._cursors[page_type]
+        while cursor:
+            page_id = cursor.popleft()
+            bound = self._bounds.get(page_type)
+            if bound is not None and page_id > bound:
+                del self._bounds[page_type]
+                self._misses[page_type] = max(self._misses[page_type], self.dead_run)
+            if not self.sparse(page_type):
+                return page_id
+            # In a dead stretch only every `stride`-th ID is probed
+            self._since_probe[page_type] += 1
+            if self._since_probe[page_type] >= self.stride:
+                self._since_probe[page_type] = 0
+                return page_id
+            self._gap[page_type].append(page_id)
+        return None
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        while True:
+            yielded = False
+            for page_type in self._cursors:
+                page_id = self._next(page_type)
+                if page_id is not None:
+                    yielded = True
+                    yield page_type, page_id
+            if not yielded:
+                return
+
+    def report(self, page_type: str, page_id: int, live: bool):
+        """Feed back whether (page_type, page_id) turned out to exist"""
+        gap = self._gap[page_type]
+        if live:
+            if self.sparse(page_type):
+                # The dead stretch ended somewhere before this hit: fetch
+                # everything passed over since, then scan densely again
+                self._backfill[page_type].extend(gap)
+                gap.clear()
+            self._misses[page_type] = 0
+            self._since_probe[page_type] = 0
+        else:
+            self._misses[page_type] += 1
+            if gap and page_id > gap[0]:
+                # IDs passed over before a dead probe stay skipped
+                self.skipped[page_type].extend(i for i in gap if i < page_id)
+                gap[:] = [i for i in gap if i >= page_id]
+
+    def finish(self) -> Dict[str, List[int]]:
+        """Return every ID skipped without being fetched, per category"""
+        for page_type, gap in self._gap.items():
+            self.skipped[page_type].extend(gap)
+            gap.clear()
+        return self.skipped
+
+
+class Frontier:
+    """Calendar pages found through links on scraped pages
+
+    Links are deduplicated against everything already scheduled this run and
+    against the crawl state (`is_done(page_type, ids)` returns the IDs that
+    need no fetch). schedule() puts queued links ahead of the sequential work
+    list, so pages reached through real links are fetched before blind
+    probing gets to them.
+    """
+
+    def __init__(self, is_done: Callable[[str, List[int]], set],
+                 in_scope: Callable[[str, int], bool]):
+        self.is_done = is_done
+        self.in_scope = in_scope
+        self.queue = deque()
+        self.seen = set()
+        self.fetched = set()
+        # Linked pages the crawl state says need no fetch; kept apart from
+        # `seen` so the same page still goes out if the work list has it
+        self.done = set()
+        self.harvested = 0
+
+    def add(self, links: Iterable[Tuple[str, int]]):
+        """Queue linked (page_type, id) pairs that are new and in scope"""
+        by_type = {}
+        for key in dict.fromkeys(links):
+            if key not in self.seen and key not in self.done and self.in_scope(*key):
+                by_type.setdefault(key[0], []).append(key[1])
+        for page_type, ids in by_type.items():
+            done = self.is_done(page_type, ids)
+            for page_id in ids:
+                if page_id in done:
+                    self.done.add((page_type, page_id))
+                else:
+                    self.seen.add((page_type, page_id))
+                    self.queue.append((page_type, page_id))
+                    self.harvested += 1
+
+    def mark_fetched(self, page_type: str, page_id: int):
+        """Record a page fetched by any route, so a queued link to it is dropped"""
+        self.seen.add((page_type, page_id))
+        self.fetched.add((page_type, page_id))
+
+    def has_work(self) -> bool:
+        return bool(self.queue)
+
+    def _drain(self) -> Iterator[Tuple[str, int]]:
+        while self.queue:
+            key = self.queue.popleft()
+            if key not in self.fetched:
+                yield key
+
+    def schedule(self, sequential: Iterable[Tuple[str, int]]) -> Iterator[Tuple[str, int]]:
+        """Yield queued links first, then the sequential work not already reached by a link"""
+        for key in sequential:
+            yield from self._drain()
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            yield key
+        yield from self._drain()
@@ -0,0 +1,569 @@
+"""
+Fast field extraction on lxml
+
+Produces the same `data` dict as extract_fields in bench/reference.py (the
+BeautifulSoup reference implementation), but parses with libxml2 and answers every selector
+from an index built in a single walk over the tree. The only sub-tree walks
+left are over each promo block and each artist link, which are small.
+
+Fields are filled by a registry of field groups (FIELD_GROUPS). Each group
+declares the columns it fills and the trigger selectors it needs on the
+page. A run can ask for only some columns
+(field_groups(['title', 'date', 'artist_*'])), and then only the groups
+filling those columns run.
+"""
+import fnmatch
+import json
+import re
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from lxml import etree
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+LOCATION_WORDS = ('MoMA', 'Museum', 'Gallery', 'Floor')
+
+ARTIST_SKIP_PHRASES = ['view all', 'see more', 'back to', 'learn more', 'read more']
+
+# Compiled once per process. BeautifulSoup's get_text() skips the contents of
+# script/style/template tags and comments; text() nodes already exclude
+# comments, the predicate handles the rest.
+_TEXT_NODES = etree.XPath(
+    './/text()[not(ancestor::script or ancestor::style or ancestor::template)]',
+    smart_strings=False
+)
+
+_UTF8_PARSER = etree.HTMLParser(encoding='utf-8')
+
+# (key, selector, attribute) looked up inside each promo block; selectors are
+# either a tag name or a .class
+PROMO_FIELDS = [
+    ('title', '.promo__title', None),
+    ('description', '.promo__description', None),
+    ('link', 'a', 'href'),
+    ('category', '.promo__category', None),
+    ('date', '.promo__date', None),
+    ('author', '.promo__author', None),
+    ('image', 'img', 'src'),
+]
+PROMO_SELECTORS = {selector for _, selector, _ in PROMO_FIELDS}
+
+# Links to other calendar pages, absolute or site-relative; sub-pages such as
+# /calendar/exhibitions/5123/installation_images count as the page itself
+CALENDAR_LINK = re.compile(
+    r'^(?:https?://(?:www\.)?moma\.org)?/calendar/(film|galleries|exhibitions)/(\d+)(?:[/?#]|$)'
+)
+
+ARTIST_TITLE_CLASS = 'artist-term--in-list__title__text'
+ARTIST_INFO_CLASS = 'artist-term--in-list__info__text'
+ARTIST_COUNT_CLASS = 'artist-term--in-list__count__text'
+
+# Field group trigger of the form tag[attribute*=substring]
+_ATTR_TRIGGER = re.compile(r'^(\w+)\[([\w-]+)\*=([^\]]+)\]$')
+
+
+def text_of(element) -> str:
+    """Equivalent of BeautifulSoup's get_text(strip=True)"""
+    return ''.join(text.strip() for text in _TEXT_NODES(element))
+
+
+def classes_of(element) -> set:
+    value = element.get('class')
+    return set(value.split()) if value else set()
+
+
+def parse_html(content: bytes):
+    """Parse raw response bytes into an lxml root element"""
+    try:
+        content.decode('utf-8')
+        parser = _UTF8_PARSER
+    except UnicodeDecodeError:
+        # Same detection BeautifulSoup uses: declared charset, then sniffing
+        from bs4.dammit import UnicodeDammit
+        encoding = UnicodeDammit(content, is_html=True).original_encoding or 'windows-1252'
+        parser = etree.HTMLParser(encoding=encoding)
+    root = etree.fromstring(content, parser)
+    return root if root is not None else etree.Element('html')
+
+
+class PageIndex:
+    """Elements of a page grouped by tag and by class, in document order"""
+
+    def __init__(self, root):
+        self.root = root
+        self.by_tag = defaultdict(list)
+        self.by_class = defaultdict(list)
+        # tag_with_attr results; field group triggers and extraction ask the same
+        self._with_attr = {}
+        for element in root.iter():
+            tag = element.tag
+            if not isinstance(tag, str):
+                # Comments and processing instructions
+                continue
+            self.by_tag[tag].append(element)
+            value = element.get('class')
+            if value:
+                for name in set(value.split()):
+                    self.by_class[name].append(element)
+
+    def tag(self, name: str) -> List:
+        return self.by_tag.get(name, [])
+
+    def cls(self, name: str) -> List:
+        return self.by_class.get(name, [])
+
+    def first_tag(self, name: str):
+        elements = self.by_tag.get(name)
+        return elements[0] if elements else None
+
+    def first_cls(self, name: str):
+        elements = self.by_class.get(name)
+        return elements[0] if elements else None
+
+    def meta(self, attribute: str, value: str):
+        """First <meta> whose `attribute` equals `value`"""
+        for element in self.tag('meta'):
+            if element.get(attribute) == value:
+                return element
+        return None
+
+    def tag_with_attr(self, name: str, attribute: str, substring: str) -> List:
+        """Elements matching the CSS selector name[attribute*="substring"]"""
+        key = (name, attribute, substring)
+        elements = self._with_attr.get(key)
+        if elements is None:
+            elements = [e for e in self.tag(name) if substring in (e.get(attribute) or '')]
+            self._with_attr[key] = elements
+        return elements
+
+    def has(self, selector: str) -> bool:
+        """Whether a 'tag', '.class' or 'tag[attribute*=substring]' selector matches"""
+        if selector[0] == '.':
+            return bool(self.by_class.get(selector[1:]))
+        match = _ATTR_TRIGGER.match(selector)
+        if match:
+            return bool(self.tag_with_attr(*match.groups()))
+        return bool(self.by_tag.get(selector))
+
+    def texts(self, class_name: str) -> List[str]:
+        return [text_of(e) for e in self.cls(class_name)]
+
+    def first_text(self, class_name: str) -> str:
+        element = self.first_cls(class_name)
+        return text_of(element) if element is not None else ''
+
+
+def _looks_like_date(text: str) -> bool:
+    return any(month in text for month in MONTHS) or \
+        (',' in text and any(char.isdigit() for char in text))
+
+
+def _extract_promo(promo) -> Dict[str, str]:
+    """Collect every promo sub-field in one walk over the promo's descendants"""
+    found = {}
+    for element in promo.iterdescendants():
+        tag = element.tag
+        if not isinstance(tag, str):
+            continue
+        for selector in (tag, *('.' + name for name in classes_of(element))):
+            if selector in PROMO_SELECTORS and selector not in found:
+                found[selector] = element
+        if len(found) == len(PROMO_SELECTORS):
+            break
+
+    promo_dict = {}
+    for key, selector, attribute in PROMO_FIELDS:
+        element = found.get(selector)
+        if element is None:
+            promo_dict[key] = ''
+        elif attribute:
+            promo_dict[key] = (element.get(attribute) or '').strip()
+        else:
+            promo_dict[key] = text_of(element)
+    return promo_dict
+
+
+def _artist_spans(link) -> Dict[str, object]:
+    """First title/info/count span under an artist link"""
+    spans = {}
+    for element in link.iterdescendants('span'):
+        for name in classes_of(element):
+            if name in (ARTIST_TITLE_CLASS, ARTIST_INFO_CLASS, ARTIST_COUNT_CLASS):
+                spans.setdefault(name, element)
+    return spans
+
+
+def empty_record(url: str, page_type: str) -> Dict:
+    """A row with every output field set to its empty value"""
+    return {
+        'url': url,
+        'title': '',
+        'date': '',
+        'location': '',
+        'type': page_type,
+        'artist_name': '',
+        'no_artists': 0,
+        'artist_bio': '',
+        'artist_link': '',
+        'artist_image': '',
+        'artist_no_works': '',
+        'sponsor_text': '',
+        'no_sponsor_paragraphs': 0,
+        'promo_link': '',
+        'no_promos': 0,
+        'promo_link_data': '',
+        'promo_image': '',
+        'promo_category': '',
+        'promo_title': '',
+        'promo_description': '',
+        'promo_date': '',
+        'promo_author': '',
+        'video': '',
+        'no_videos': 0,
+        'no_pubs': 0,
+        'event_catch_all': '',
+        'no_events': 0,
+        'description': '',
+        'credits': '',
+        'location_tag': '',
+        'location_donor': '',
+        'location_selbst': '',
+        'no_locations': 0,
+        'miscellaneous_third_uneven': '',
+        'works_online_links': '',
+        'no_works_online': 0,
+        'works_online_text': ''
+    }
+
+
+def extract(content: bytes, url: str, page_type: str,
+            groups: Optional[Sequence['FieldGroup']] = None) -> Dict:
+    """Parse raw HTML and return the same fields as the reference extract_fields"""
+    return extract_from_index(PageIndex(parse_html(content)), url, page_type, groups=groups)
+
+
+def extract_page(content: bytes, url: str, page_type: str, timings: Optional[Dict] = None,
+                 groups: Optional[Sequence['FieldGroup']] = None) -> Tuple[Dict, List[Tuple[str, int]]]:
+    """Like extract(), also returning the calendar pages this one links to
+
+    If a `timings` dict is given, it is filled with the seconds spent
+    parsing ('parse') and in each field group ('fields': {group: seconds}).
+    """
+    if timings is None:
+        page = PageIndex(parse_html(content))
+        return extract_from_index(page, url, page_type, groups=groups), calendar_links(page)
+    started = time.perf_counter()
+    page = PageIndex(parse_html(content))
+    timings['parse'] = time.perf_counter() - started
+    timings['fields'] = {}
+    data = extract_from_index(page, url, page_type, timings['fields'], groups)
+    return data, calendar_links(page)
+
+
+def calendar_links(page: PageIndex) -> List[Tuple[str, int]]:
+    """(page_type, id) of every calendar page linked from `page`, in document order"""
+    links = {}
+    for link in page.tag('a'):
+        match = CALENDAR_LINK.match(link.get('href') or '')
+        if match:
+            links.setdefault((match.group(1), int(match.group(2))), None)
+    return list(links)
+
+
+def _title(page: PageIndex, data: Dict):
+    """First h1, falling back to <title>"""
+    title = page.first_tag('h1')
+    if title is None:
+        title = page.first_tag('title')
+    data['title'] = text_of(title) if title is not None else ''
+
+
+def _date(page: PageIndex, data: Dict):
+    """First p.balance-text that looks like a date, else the meta description"""
+    for p in page.cls('balance-text'):
+        if p.tag != 'p':
+            continue
+        text = text_of(p)
+        if _looks_like_date(text):
+            data['date'] = text
+            return
+    meta_description = page.meta('name', 'description')
+    if meta_description is not None:
+        content = meta_description.get('content') or ''
+        parts = content.split('.')
+        if len(parts) > 1:
+            date_part = parts[1].strip()
+            if any(month in date_part for month in MONTHS):
+                data['date'] = date_part
+
+
+def _location(page: PageIndex, data: Dict):
+    """Short p.typography mentioning a location word"""
+    for p in page.cls('typography'):
+        if p.tag != 'p':
+            continue
+        text = text_of(p)
+        if len(text) < 50 and any(word in text for word in LOCATION_WORDS):
+            data['location'] = text
+            return
+
+
+def _artists(page: PageIndex, data: Dict):
+    """Artist links, deduplicated by name in document order"""
+    seen = set()
+    names, links, bios, works = [], [], [], []
+    for link in page.tag('a'):
+        href = link.get('href')
+        if href is None or '/artists/' not in href or href == '/artists/':
+            continue
+        spans = _artist_spans(link)
+        title_span = spans.get(ARTIST_TITLE_CLASS)
+        if title_span is not None:
+            name = text_of(title_span)
+            info_span = spans.get(ARTIST_INFO_CLASS)
+            count_span = spans.get(ARTIST_COUNT_CLASS)
+            bio = text_of(info_span) if info_span is not None else ''
+            works_info = text_of(count_span) if count_span is not None else ''
+        else:
+            name = text_of(link)
+            if not name or name.lower() == 'artists' or len(name) >= 200:
+                continue
+            if any(phrase in name.lower() for phrase in ARTIST_SKIP_PHRASES):
+                continue
+            bio = works_info = ''
+        if name in seen:
+            continue
+        seen.add(name)
+        names.append(name)
+        links.append(href)
+        bios.append(bio)
+        works.append(works_info)
+
+    data['artist_name'] = '|'.join(names)
+    data['artist_link'] = '|'.join(links)
+    data['no_artists'] = len(names)
+    if any(bios):
+        data['artist_bio'] = '|'.join(bios)
+    if any(works):
+        data['artist_no_works'] = '|'.join(works)
+
+
+def _description(page: PageIndex, data: Dict):
+    """Meta tags first, then article paragraphs"""
+    description = page.meta('name', 'description')
+    if description is None:
+        description = page.meta('property', 'og:description')
+    if description is not None:
+        data['description'] = description.get('content') or ''
+    else:
+        article = page.first_tag('article')
+        if article is not None:
+            texts = (text_of(p) for p in article.iterdescendants('p'))
+            data['description'] = ' '.join(text for text in texts if text)
+
+
+def _artist_bio(page: PageIndex, data: Dict):
+    """Detailed bio, appended to the per-artist bios from _artists"""
+    bio_element = page.first_cls('artist-bio')
+    if bio_element is None:
+        bio_element = page.first_cls('bio')
+    if bio_element is not None:
+        detailed_bio = text_of(bio_element)
+        if data['artist_bio']:
+            data['artist_bio'] = data['artist_bio'] + ' | ' + detailed_bio
+        else:
+            data['artist_bio'] = detailed_bio
+
+
+def _image(page: PageIndex, data: Dict):
+    og_image = page.meta('property', 'og:image')
+    if og_image is not None:
+        data['artist_image'] = og_image.get('content') or ''
+
+
+def _credits(page: PageIndex, data: Dict):
+    data['credits'] = page.first_text('credits') or page.first_text('event-detail__credits')
+
+
+def _sponsors(page: PageIndex, data: Dict):
+    sponsors = page.texts('sponsor') or page.texts('event-detail__sponsor')
+    data['sponsor_text'] = '|'.join(sponsors)
+    data['no_sponsor_paragraphs'] = len(sponsors)
+
+
+def _promos(page: PageIndex, data: Dict):
+    promos = page.cls('promo') or page.cls('related-content')
+    data['no_promos'] = len(promos)
+    if promos:
+        promo_data = [_extract_promo(promo) for promo in promos]
+        data['promo_title'] = '|'.join(p['title'] for p in promo_data)
+        data['promo_description'] = '|'.join(p['description'] for p in promo_data)
+        data['promo_link'] = '|'.join(p['link'] for p in promo_data)
+        data['promo_category'] = '|'.join(p['category'] for p in promo_data)
+        data['promo_date'] = '|'.join(p['date'] for p in promo_data)
+        data['promo_author'] = '|'.join(p['author'] for p in promo_data)
+        data['promo_image'] = '|'.join(p['image'] for p in promo_data)
+        data['promo_link_data'] = json.dumps(promo_data)
+
+
+def _videos(page: PageIndex, data: Dict):
+    videos = page.tag('video') or page.tag_with_attr('iframe', 'src', 'youtube') or \
+        page.tag_with_attr('iframe', 'src', 'vimeo')
+    data['no_videos'] = len(videos)
+    data['video'] = '|'.join(src for src in (v.get('src') for v in videos) if src)
+
+
+def _publications(page: PageIndex, data: Dict):
+    data['no_pubs'] = len(page.cls('publication')) or \
+        len(page.tag_with_attr('a', 'href', '/publications/'))
+
+
+def _events(page: PageIndex, data: Dict):
+    events = page.texts('event') or page.texts('related-event')
+    data['event_catch_all'] = '|'.join(events)
+    data['no_events'] = len(events)
+
+
+def _locations(page: PageIndex, data: Dict):
+    location_tags = page.texts('location-tag')
+    data['location_tag'] = '|'.join(location_tags)
+    data['no_locations'] = len(location_tags)
+    data['location_donor'] = page.first_text('location-donor')
+    data['location_selbst'] = page.first_text('location-selbst')
+
+
+def _works_online(page: PageIndex, data: Dict):
+    """Works online (for galleries/exhibitions)"""
+    works_online = page.cls('work-online') or page.tag_with_attr('a', 'href', '/collection/works/')
+    data['no_works_online'] = len(works_online)
+    data['works_online_links'] = '|'.join(href for href in (w.get('href') for w in works_online) if href)
+    data['works_online_text'] = '|'.join(text_of(w) for w in works_online)
+
+
+class FieldGroup(NamedTuple):
+    """One entry of the extractor registry
+
+    `extract(page, data)` fills the `fields` columns of the record, and only
+    runs if one of `triggers` ('tag', '.class' or 'tag[attribute*=substring]',
+    see PageIndex.has) is on the page; when none is, the columns keep their
+    empty values, which is what the group would have written anyway. A
+    trigger should be no broader than what the group actually looks for.
+    """
+    name: str
+    extract: Callable[[PageIndex, Dict], None]
+    fields: Tuple[str, ...]
+    triggers: Tuple[str, ...] = ()
+
+    def applies_to(self, page: PageIndex) -> bool:
+        return not self.triggers or any(page.has(trigger) for trigger in self.triggers)
+
+
+PROMO_COLUMNS = ('no_promos', 'promo_title', 'promo_description', 'promo_link', 'promo_category',
+                 'promo_date', 'promo_author', 'promo_image', 'promo_link_data')
+
+# Field groups in the order they run. _artist_bio appends to what _artists
+# wrote, so both list artist_bio and the order matters.
+FIELD_GROUPS = [
+    FieldGroup('title', _title, ('title',), triggers=('h1', 'title')),
+    FieldGroup('date', _date, ('date',), triggers=('.balance-text', 'meta[name*=description]')),
+    FieldGroup('location', _location, ('location',), triggers=('.typography',)),
+    FieldGroup('artists', _artists,
+               ('artist_name', 'artist_link', 'no_artists', 'artist_bio', 'artist_no_works'),
+               triggers=('a[href*=/artists/]',)),
+    FieldGroup('description', _description, ('description',),
+               triggers=('meta[name*=description]', 'meta[property*=og:description]', 'article')),
+    FieldGroup('artist_bio', _artist_bio, ('artist_bio',), triggers=('.artist-bio', '.bio')),
+    FieldGroup('image', _image, ('artist_image',), triggers=('meta[property*=og:image]',)),
+    FieldGroup('credits', _credits, ('credits',), triggers=('.credits', '.event-detail__credits')),
+    FieldGroup('sponsors', _sponsors, ('sponsor_text', 'no_sponsor_paragraphs'),
+               triggers=('.sponsor', '.event-detail__sponsor')),
+    FieldGroup('promos', _promos, PROMO_COLUMNS, triggers=('.promo', '.related-content')),
+    FieldGroup('videos', _videos, ('video', 'no_videos'),
+               triggers=('video', 'iframe[src*=youtube]', 'iframe[src*=vimeo]')),
+    FieldGroup('publications', _publications, ('no_pubs',),
+               triggers=('.publication', 'a[href*=/publications/]')),
+    FieldGroup('events', _events, ('event_catch_all', 'no_events'), triggers=('.event', '.related-event')),
+    FieldGroup('locations', _locations, ('location_tag', 'no_locations', 'location_donor', 'location_selbst'),
+               triggers=('.location-tag', '.location-donor', '.location-selbst')),
+    FieldGroup('works_online', _works_online, ('no_works_online', 'works_online_links', 'works_online_text'),
+               triggers=('.work-online', 'a[href*=/collection/works/]')),
+]
+
+# Filled from the request itself, whatever groups run
+BASE_FIELDS = ('url', 'type')
+
+
+def register_field_group(group: FieldGroup, after: Optional[str] = None):
+    """Add a field group to the registry, or replace the one with its name
+
+    A new group runs after the group named `after`, or last. Its columns
+    may be new ones; they are written after the standard columns (see
+    all_fields()). A group meant for some categories only can check
+    data['type'], which is filled before any group runs.
+    """
+    names = [existing.name for existing in FIELD_GROUPS]
+    if group.name in names:
+        FIELD_GROUPS[names.index(group.name)] = group
+    elif after is not None:
+        FIELD_GROUPS.insert(names.index(after) + 1, group)
+    else:
+        FIELD_GROUPS.append(group)
+
+
+def all_fields() -> List[str]:
+    """Every output column: the standard ones, then any added by registered groups"""
+    fields = list(empty_record('', ''))
+    for group in FIELD_GROUPS:
+        fields.extend(field for field in group.fields if field not in fields)
+    return fields
+
+
+def select_fields(patterns: Optional[Iterable[str]] = None) -> List[str]:
+    """Columns matching shell-style `patterns` (e.g. 'artist_*'), in column order
+
+    url and type are always included. Raises ValueError for a pattern that
+    matches no column.
+    """
+    fields = all_fields()
+    if patterns is None:
+        return fields
+    selected = set(BASE_FIELDS)
+    for pattern in patterns:
+        matches = fnmatch.filter(fields, pattern.strip())
+        if not matches:
+            raise ValueError(f"No output field matches {pattern!r}")
+        selected.update(matches)
+    return [field for field in fields if field in selected]
+
+
+def field_groups(patterns: Optional[Iterable[str]] = None) -> Tuple[FieldGroup, ...]:
+    """The registered groups needed to fill the columns matching `patterns` (all when None)"""
+    if patterns is None:
+        return tuple(FIELD_GROUPS)
+    wanted = set(select_fields(patterns))
+    return tuple(group for group in FIELD_GROUPS if wanted.intersection(group.fields))
+
+
+def extract_from_index(page: PageIndex, url: str, page_type: str,
+                       timings: Optional[Dict[str, float]] = None,
+                       groups: Optional[Sequence[FieldGroup]] = None) -> Dict:
+    """Run the field groups (all registered ones by default) over `page`
+
+    Each group's seconds go into `timings` if given.
+    """
+    data = empty_record(url, page_type)
+    groups = FIELD_GROUPS if groups is None else groups
+    if timings is None:
+        for group in groups:
+            if group.applies_to(page):
+                group.extract(page, data)
+        return data
+    for group in groups:
+        started = time.perf_counter()
+        if group.applies_to(page):
+            group.extract(page, data)
+        timings[group.name] = time.perf_counter() - started
+    return data
@@ -0,0 +1,98 @@
+"""
+Validator cache for HTTP conditional requests
+
+Remembers the ETag, Last-Modified and content hash of every page fetched, so
+refresh crawls can send If-None-Match / If-Modified-Since and skip parsing
+and rewriting pages that have not changed. Entries are evicted least recently
+used first once the cache grows past `max_entries`.
+
+Writes only become durable on commit(). scrape_all stores validators for the
+rows it has recorded and commits them at its checkpoints, after the CSV and
+the crawl state, so a crash never leaves validators for a row that was
+rolled back (a rerun would get a 304 and never write it again).
+"""
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS validators (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS validators_last_used ON validators (last_used);
+"""
+
+
+class HTTPCache:
+    """Thread-safe, size-bounded store of per-URL HTTP validators"""
+
+    def __init__(self, path: str = 'http_cache.sqlite', max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Shared by all fetch workers; every access goes through the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def lookup(self, url: str) -> Optional[Tuple[Optional[str], Optional[str], Optional[str]]]:
+        """Return (etag, last_modified, content_hash) for `url`, or None"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT etag, last_modified, content_hash FROM validators WHERE url = ?', (url,)
+            ).fetchone()
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Request headers that let the server answer 304 Not Modified"""
+        entry = self.lookup(url)
+        headers = {}
+        if entry:
+            etag, last_modified, _ = entry
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def store(self, url: str, headers: Dict, content_hash: Optional[str]):
+        """Remember the validators of a 200 response"""
+        self._write(
+            'INSERT OR REPLACE INTO validators (url, etag, last_modified, content_hash, last_used) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (url, headers.get('ETag'), headers.get('Last-Modified'), content_hash, time.time())
+        )
+
+    def touch(self, url: str):
+        """Mark an entry as recently used (e.g. after a 304)"""
+        self._write('UPDATE validators SET last_used = ? WHERE url = ?', (time.time(), url))
+
+    def _write(self, query: str, params: Tuple):
+        with self._lock:
+            self.conn.execute(query, params)
+
+    def _evict(self):
+        """Drop least recently used entries down to 90% of max_entries"""
+        count = self.conn.execute('SELECT COUNT(*) FROM validators').fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                'DELETE FROM validators WHERE url IN '
+                '(SELECT url FROM validators ORDER BY last_used LIMIT ?)',
+                (count - int(self.max_entries * 0.9),)
+            )
+
+    def commit(self):
+        with self._lock:
+            self._evict()
+            self.conn.commit()
+
+    def close(self):
+        self.commit()
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,227 @@
+"""
+Run metrics: per-page timings, running histograms and rates
+
+Every completed page is recorded with its fetch latency, size, HTTP status,
+parse time, per-field-group extraction time and write time. Requests that
+met a Cloudflare challenge are timed apart from the others, so solving one
+does not show up as network latency. Aggregates
+(counters, latency histograms, pages/sec, 404 ratio, ETA) are kept in memory
+and can be exported as:
+
+- a JSON-lines stream, one object per page (`jsonl_path`)
+- a Prometheus text-format file, rewritten at every checkpoint, suitable for
+  node_exporter's textfile collector (`prometheus_path`)
+- a Prometheus scrape endpoint on `port` (serve())
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+# Upper bounds in seconds; requests are tens to hundreds of milliseconds,
+# parsing and writing well under that
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram, as Prometheus exposes it"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (inf if past the last)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def render(self, name: str) -> str:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum {self.sum:.6f}')
+        lines.append(f'{name}_count {self.count}')
+        return '\n'.join(lines)
+
+
+class Metrics:
+    """Thread-safe collector for one crawl run
+
+    `total` is the number of pages the run expects to complete, for the ETA.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None,
+                 total: int = 0):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.total = total
+        self.started = time.monotonic()
+        self.completed = 0
+        self.bytes = 0
+        self.statuses = {}
+        self.outcomes = {}
+        self.fetch = Histogram(LATENCY_BUCKETS)
+        self.challenge = Histogram(LATENCY_BUCKETS)
+        self.parse = Histogram(STAGE_BUCKETS)
+        self.write = Histogram(STAGE_BUCKETS)
+        self.field_seconds = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self._server = None
+
+    def record(self, page_type: str, page_id: int, url: str, status: Optional[int], outcome: str,
+               size: int = 0, fetch_s: float = 0.0, parse_s: Optional[float] = None,
+               write_s: Optional[float] = None, fields: Optional[Dict[str, float]] = None,
+               challenge: bool = False):
+        """Record one completed page
+
+        `parse_s` is the HTML parse time and `fields` the seconds per field
+        group; the parse histogram gets their sum. With `challenge`, the
+        request's time goes to the challenge histogram instead of the fetch one.
+        """
+        with self._lock:
+            self.completed += 1
+            self.bytes += size
+            status_key = str(status) if status is not None else 'none'
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            (self.challenge if challenge else self.fetch).observe(fetch_s)
+            if parse_s is not None:
+                self.parse.observe(parse_s + sum((fields or {}).values()))
+            if write_s is not None:
+                self.write.observe(write_s)
+            for group, seconds in (fields or {}).items():
+                self.field_seconds[group] = self.field_seconds.get(group, 0.0) + seconds
+
+            if self._jsonl:
+                entry = {'ts': round(time.time(), 3), 'type': page_type, 'id': page_id, 'url': url,
+                         'status': status, 'outcome': outcome, 'bytes': size,
+                         'fetch_ms': round(fetch_s * 1000, 3)}
+                if challenge:
+                    entry['challenge'] = True
+                if parse_s is not None:
+                    entry['parse_ms'] = round(parse_s * 1000, 3)
+                if write_s is not None:
+                    entry['write_ms'] = round(write_s * 1000, 3)
+                if fields:
+                    entry['fields_ms'] = {group: round(seconds * 1000, 3) for group, seconds in fields.items()}
+                self._jsonl.write(json.dumps(entry) + '\n')
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def rates(self) -> Dict[str, float]:
+        """pages/sec, 404 ratio and ETA (seconds, 0 when unknown) so far"""
+        elapsed = time.monotonic() - self.started
+        pages_per_sec = self.completed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.completed)
+        return {
+            'elapsed': elapsed,
+            'pages_per_sec': pages_per_sec,
+            'not_found_ratio': self.statuses.get('404', 0) / self.completed if self.completed else 0.0,
+            'eta': remaining / pages_per_sec if pages_per_sec else 0.0,
+        }
+
+    def progress_line(self) -> str:
+        rates = self.rates()
+        eta = time.strftime('%H:%M:%S', time.gmtime(rates['eta'])) if rates['eta'] else '--:--:--'
+        return (f"{self.completed}/{self.total or '?'} pages, {rates['pages_per_sec']:.1f}/s, "
+                f"404s {rates['not_found_ratio']:.0%}, fetch p50 {self.fetch.quantile(0.5) * 1000:.0f}ms "
+                f"p95 {self.fetch.quantile(0.95) * 1000:.0f}ms, ETA {eta}")
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            rates = self.rates()
+            out = [
+                '# HELP moma_pages_total Pages completed, by outcome',
+                '# TYPE moma_pages_total counter',
+            ]
+            out += [f'moma_pages_total{{outcome="{k}"}} {v}' for k, v in sorted(self.outcomes.items())]
+            out += ['# HELP moma_responses_total Responses, by HTTP status',
+                    '# TYPE moma_responses_total counter']
+            out += [f'moma_responses_total{{status="{k}"}} {v}' for k, v in sorted(self.statuses.items())]
+            out += ['# HELP moma_response_bytes_total Response body bytes received',
+                    '# TYPE moma_response_bytes_total counter',
+                    f'moma_response_bytes_total {self.bytes}']
+            for name, histogram, help_text in (
+                    ('moma_fetch_seconds', self.fetch, 'Request latency, without Cloudflare challenges'),
+                    ('moma_challenge_seconds', self.challenge, 'Time in requests that met a Cloudflare challenge'),
+                    ('moma_parse_seconds', self.parse, 'HTML parse and extraction time'),
+                    ('moma_write_seconds', self.write, 'Time writing a row to the outputs')):
+                out += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram', histogram.render(name)]
+            out += ['# HELP moma_field_seconds_total Extraction time, by field group',
+                    '# TYPE moma_field_seconds_total counter']
+            out += [f'moma_field_seconds_total{{group="{k}"}} {v:.6f}'
+                    for k, v in sorted(self.field_seconds.items())]
+            gauges = dict(self.gauges, pages_per_second=rates['pages_per_sec'],
+                          not_found_ratio=rates['not_found_ratio'], eta_seconds=rates['eta'])
+            for name, value in sorted(gauges.items()):
+                out += [f'# TYPE moma_{name} gauge', f'moma_{name} {value:.6g}']
+            return '\n'.join(out) + '\n'
+
+    def flush(self):
+        """Flush the JSON-lines stream and rewrite the Prometheus file"""
+        if self._jsonl:
+            with self._lock:
+                self._jsonl.flush()
+        if self.prometheus_path:
+            # Write-then-rename, so a collector never reads a half-written file
+            tmp_path = self.prometheus_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, self.prometheus_path)
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """Expose render() over HTTP for a Prometheus server to scrape"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.flush()
+        if self._jsonl:
+            self._jsonl.close()
+            self._jsonl = None
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,389 @@
+"""
+Local stand-in for moma.org, and a load-test harness that crawls it
+
+The mock site serves /calendar/{film,galleries,exhibitions}/{id} with
+configurable sparse-ID 404s, latency distributions, 429/503 bursts, random
+errors and slow bodies. Pages come from a directory of saved pages when one
+matches (<page_type>_<id>.html), otherwise from the synthetic generator in
+bench/make_corpus.py. Responses carry an ETag and honour If-None-Match.
+
+    python mock_server.py serve --port 8000
+    python mock_server.py loadtest --concurrency 1 4 16 --end 500
+
+`loadtest` runs scrape_all's full loop (state, CSV sink, checkpoints) in a
+scratch directory once per concurrency level and reports end-to-end
+throughput, request latency percentiles and checkpoint overhead.
+"""
+import argparse
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from bench.make_corpus import page as synthetic_page
+
+PAGE_PATH = re.compile(r'^/calendar/(film|galleries|exhibitions)/(\d+)/?(?:\?.*)?$')
+
+
+class MockSite:
+    """Decides what the stand-in server answers for each calendar page
+
+    An ID is live when it is at most `max_ids[page_type]`, outside every
+    (page_type, low, high) in `dead_ranges`, and passes a deterministic
+    coin flip with probability `density`. Latency is log-normal around
+    `latency_ms` with shape `latency_sigma` (0 gives a fixed delay).
+    For the first `burst_length` seconds of every `burst_every` seconds all
+    requests get `burst_status` with a Retry-After of `retry_after`; outside
+    bursts a fraction `error_rate` gets a 503. With `max_rps`, requests
+    beyond that many in the last second get a 429, as from a site that
+    throttles clients going too fast. A fraction `slow_body_rate` of pages
+    trickle their body out over `slow_body_ms`.
+    """
+
+    def __init__(self, max_ids: Optional[Dict[str, int]] = None, density: float = 0.5,
+                 dead_ranges: List[Tuple[str, int, int]] = (), seed: int = 0,
+                 latency_ms: float = 20.0, latency_sigma: float = 0.0,
+                 error_rate: float = 0.0, burst_every: float = 0.0, burst_length: float = 0.0,
+                 burst_status: int = 429, retry_after: int = 1, max_rps: Optional[float] = None,
+                 slow_body_rate: float = 0.0, slow_body_ms: float = 500.0,
+                 corpus_dir: Optional[str] = None):
+        self.max_ids = max_ids or {'film': 1000, 'galleries': 300, 'exhibitions': 1000}
+        self.density = density
+        self.dead_ranges = list(dead_ranges)
+        self.seed = seed
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.burst_status = burst_status
+        self.retry_after = retry_after
+        self.max_rps = max_rps
+        self.slow_body_rate = slow_body_rate
+        self.slow_body_ms = slow_body_ms
+        self.corpus_dir = corpus_dir
+        self.started = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.status_counts = {}
+        self._recent = deque()
+
+    def _coin(self, *key) -> float:
+        """Deterministic value in [0, 1) for a key, stable across runs"""
+        digest = hashlib.blake2b(repr((self.seed,) + key).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') / 2 ** 64
+
+    def is_live(self, page_type: str, page_id: int) -> bool:
+        if page_id < 1 or page_id > self.max_ids.get(page_type, 0):
+            return False
+        for dead_type, low, high in self.dead_ranges:
+            if dead_type == page_type and low <= page_id <= high:
+                return False
+        return self._coin('live', page_type, page_id) < self.density
+
+    def in_burst(self) -> bool:
+        if self.burst_every <= 0 or self.burst_length <= 0:
+            return False
+        return (time.monotonic() - self.started) % self.burst_every < self.burst_length
+
+    def over_capacity(self) -> bool:
+        """Count this request against `max_rps`; True if it is one too many"""
+        if not self.max_rps:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            recent = self._recent
+            while recent and recent[0] <= now - 1.0:
+                recent.popleft()
+            if len(recent) >= self.max_rps:
+                return True
+            recent.append(now)
+            return False
+
+    def latency(self) -> float:
+        """Seconds to wait before answering"""
+        if self.latency_ms <= 0:
+            return 0.0
+        with self._lock:
+            if self.latency_sigma <= 0:
+                return self.latency_ms / 1000
+            return self._random.lognormvariate(math.log(self.latency_ms), self.latency_sigma) / 1000
+
+    def random_error(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def is_slow(self, page_type: str, page_id: int) -> bool:
+        return self._coin('slow', page_type, page_id) < self.slow_body_rate
+
+    @functools.lru_cache(maxsize=4096)
+    def body(self, page_type: str, page_id: int) -> bytes:
+        """Saved page if the corpus has one, else a synthetic page sized by ID"""
+        if self.corpus_dir:
+            path = os.path.join(self.corpus_dir, f'{page_type}_{page_id}.html')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return f.read()
+        size = self._coin('size', page_type, page_id)
+        heavy = size > 0.97
+        artists = int(size * 30) + (300 if heavy else 0)
+        promos = int(size * 10) + (60 if heavy else 0)
+        return synthetic_page(page_type, page_id, artists, promos, filler=int(size * 60)).encode('utf-8')
+
+    def count(self, status: int):
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real site; every response sets Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without TCP_NODELAY the
+    # client's delayed ACK adds ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        site = self.server.site
+        time.sleep(site.latency())
+
+        match = PAGE_PATH.match(self.path)
+        if site.in_burst():
+            self.send_status(site.burst_status, {'Retry-After': str(site.retry_after)})
+            return
+        if site.over_capacity():
+            self.send_status(429, {'Retry-After': str(site.retry_after)})
+            return
+        if site.random_error():
+            self.send_status(503)
+            return
+        if not match or not site.is_live(match.group(1), int(match.group(2))):
+            self.send_status(404)
+            return
+
+        page_type, page_id = match.group(1), int(match.group(2))
+        body = site.body(page_type, page_id)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_status(304, {'ETag': etag})
+            return
+
+        site.count(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        if site.is_slow(page_type, page_id):
+            chunks = 10
+            step = -(-len(body) // chunks)
+            for offset in range(0, len(body), step):
+                self.wfile.write(body[offset:offset + step])
+                self.wfile.flush()
+                time.sleep(site.slow_body_ms / 1000 / chunks)
+        else:
+            self.wfile.write(body)
+
+    def send_status(self, status: int, headers: Optional[Dict[str, str]] = None):
+        """Answer with an empty-bodied status"""
+        self.server.site.count(status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def start_server(site: MockSite, host: str = '127.0.0.1', port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve `site` on a background thread; returns the server and its base URL"""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.site = site
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def load_test(site: MockSite, concurrencies: List[int] = (1, 4, 16), start: int = 1,
+              end: int = 500, rate: Optional[float] = None, parse_workers: int = 0,
+              discover: bool = False, max_retries: int = 3, adaptive_rate: bool = False,
+              quiet: bool = True) -> List[Dict]:
+    """Crawl the mock site once per concurrency level and measure the whole loop
+
+    Every run starts from an empty scratch directory, so each one does the
+    same work. Request latency is timed around fetch_raw on the worker
+    threads; checkpoint time is what CrawlRun spent fsyncing and committing.
+    """
+    from moma_scraper import MoMAScraper
+
+    class TimedScraper(MoMAScraper):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies = []
+
+        def fetch_raw(self, url: str, conditional: bool = False):
+            started = time.perf_counter()
+            result = super().fetch_raw(url, conditional)
+            self.latencies.append(time.perf_counter() - started)
+            return result
+
+    server, base_url = start_server(site)
+    cwd = os.getcwd()
+    reports = []
+    try:
+        for concurrency in concurrencies:
+            site.status_counts = {}
+            scraper = TimedScraper(base_url=base_url)
+            with tempfile.TemporaryDirectory() as scratch:
+                os.chdir(scratch)
+                output = io.StringIO() if quiet else None
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+                    run = scraper.scrape_all(start=start, end=end, delay=0, concurrency=concurrency,
+                                             rate=rate, parse_workers=parse_workers,
+                                             discover=discover, max_retries=max_retries,
+                                             adaptive_rate=adaptive_rate)
+                elapsed = time.perf_counter() - started
+                os.chdir(cwd)
+            latencies = scraper.latencies
+            reports.append({
+                'concurrency': concurrency,
+                'elapsed_s': elapsed,
+                'requests': len(latencies),
+                'requests_per_sec': len(latencies) / elapsed,
+                'pages_written': run.new_pages_found,
+                'pages_per_sec': run.new_pages_found / elapsed,
+                'failed': run.pages_failed,
+                'retries': run.pages_retried,
+                'final_rate': run.controller.rate if run.controller else None,
+                'latency_ms': {
+                    'p50': percentile(latencies, 0.50) * 1000,
+                    'p95': percentile(latencies, 0.95) * 1000,
+                    'p99': percentile(latencies, 0.99) * 1000,
+                    'max': max(latencies, default=0.0) * 1000,
+                },
+                'checkpoints': run.checkpoints,
+                'checkpoint_s': run.checkpoint_seconds,
+                'checkpoint_share': run.checkpoint_seconds / elapsed,
+                'server_statuses': dict(site.status_counts),
+            })
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        server.server_close()
+    return reports
+
+
+def print_report(reports: List[Dict]):
+    print(f"{'workers':>7}{'req/s':>9}{'pages/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'retries':>8}{'failed':>8}{'ckpt ms':>9}{'ckpt %':>8}")
+    for r in reports:
+        latency = r['latency_ms']
+        print(f"{r['concurrency']:>7}{r['requests_per_sec']:>9.1f}{r['pages_per_sec']:>9.1f}"
+              f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+              f"{r['retries']:>8}{r['failed']:>8}{r['checkpoint_s'] * 1000:>9.1f}"
+              f"{r['checkpoint_share']:>8.2%}")
+        if r['final_rate'] is not None:
+            print(f"{'':>7}adaptive rate settled at {r['final_rate']:.1f} requests/sec")
+
+
+def parse_dead_range(value: str) -> Tuple[str, int, int]:
+    """'film:80-160' -> ('film', 80, 160)"""
+    page_type, _, ids = value.partition(':')
+    low, _, high = ids.partition('-')
+    return page_type, int(low), int(high or low)
+
+
+def add_site_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--max-id', nargs='*', default=[], metavar='TYPE=N',
+                        help='Highest live ID per category, e.g. film=1000')
+    parser.add_argument('--density', type=float, default=0.5, help='Fraction of IDs that exist')
+    parser.add_argument('--dead', nargs='*', type=parse_dead_range, default=[], metavar='TYPE:LOW-HIGH',
+                        help='ID ranges that are all 404, e.g. film:80-160')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for which IDs exist')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Median response latency')
+    parser.add_argument('--latency-sigma', type=float, default=0.0,
+                        help='Log-normal latency shape; 0 for a fixed latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of random 503s')
+    parser.add_argument('--burst-every', type=float, default=0.0, help='Seconds between throttling bursts')
+    parser.add_argument('--burst-length', type=float, default=0.0, help='Seconds each burst lasts')
+    parser.add_argument('--burst-status', type=int, default=429, help='Status sent during bursts')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After sent with 429/503s')
+    parser.add_argument('--max-rps', type=float, default=None,
+                        help='Answer 429 to requests beyond this rate')
+    parser.add_argument('--slow-body-rate', type=float, default=0.0, help='Fraction of pages sent slowly')
+    parser.add_argument('--slow-body-ms', type=float, default=500.0, help='Time to trickle a slow body')
+    parser.add_argument('--corpus', default=None, help='Directory of saved <type>_<id>.html pages')
+
+
+def site_from_args(args) -> MockSite:
+    max_ids = None
+    if args.max_id:
+        max_ids = {page_type: int(n) for page_type, n in (item.split('=') for item in args.max_id)}
+    return MockSite(max_ids=max_ids, density=args.density, dead_ranges=args.dead, seed=args.seed,
+                    latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                    error_rate=args.error_rate, burst_every=args.burst_every,
+                    burst_length=args.burst_length, burst_status=args.burst_status,
+                    retry_after=args.retry_after, max_rps=args.max_rps, slow_body_rate=args.slow_body_rate,
+                    slow_body_ms=args.slow_body_ms, corpus_dir=args.corpus)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local mock MoMA calendar server')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subcommands.add_parser('serve', help='Run the mock server in the foreground')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    add_site_arguments(serve_parser)
+
+    load_parser = subcommands.add_parser('loadtest', help='Crawl the mock server and report throughput')
+    load_parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+    load_parser.add_argument('--start', type=int, default=1)
+    load_parser.add_argument('--end', type=int, default=500)
+    load_parser.add_argument('--rate', type=float, default=None, help='Request rate cap (default: none)')
+    load_parser.add_argument('--parse-workers', type=int, default=0)
+    load_parser.add_argument('--discover', action='store_true')
+    load_parser.add_argument('--max-retries', type=int, default=3, help='In-run retries per page')
+    load_parser.add_argument('--adaptive', action='store_true', help='Let the crawler tune its own rate')
+    load_parser.add_argument('--output', default=None, help='Also write the report as JSON here')
+    load_parser.add_argument('--verbose', action='store_true', help="Show the crawler's own output")
+    add_site_arguments(load_parser)
+    args = parser.parse_args()
+
+    site = site_from_args(args)
+    if args.command == 'serve':
+        server, base_url = start_server(site, args.host, args.port)
+        print(f"Serving mock calendar pages on {base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    elif args.command == 'loadtest':
+        reports = load_test(site, args.concurrency, args.start, args.end, args.rate,
+                            args.parse_workers, args.discover, args.max_retries, args.adaptive,
+                            quiet=not args.verbose)
+        print_report(reports)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(reports, f, indent=2)
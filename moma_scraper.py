@@ -1,457 +1,963 @@
-import cloudscraper
-from bs4 import BeautifulSoup
 import csv
+import functools
+import logging
+import os
+import threading
 import time
-from typing import Dict, Optional
-import json
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import extractor
+from archive import HTMLArchive
+from changes import ChangeLog, changed_fields, current_rows, due_pages, event_end, fingerprint
+from http_cache import HTTPCache
+from metrics import Metrics
+from crawl_state import (CrawlState, STATUS_ERROR, STATUS_NOT_FOUND, STATUS_OK,
+                         STATUS_RETRY_AFTER, STATUS_SKIPPED, done_statuses)
+from discovery import DiscoveryScheduler, Frontier, estimate_upper_bound
+from normalize import EventIndex
+from pipeline import parse_pool, parse_worker, run_pipeline
+from records import PageRecord
+from rate_limit import AIMDController, RetryQueue, TokenBucket, is_retryable
+from shards import shard_of, shard_path, validate_shard
+from sinks import (FIELDNAMES, CSVSink, OutputSink, ParquetSink, checkpoint_digest, compact_csv,
+                   matches_checkpoint)
+import transport
+
+# Per-page messages are logged at INFO; nothing is configured by default, so
+# a crawl only prints its start, progress and summary
+log = logging.getLogger('moma_scraper')
+
+BASE_URL = 'https://www.moma.org'
+PAGE_TYPES = ['film', 'galleries', 'exhibitions']
+
+
+def url_patterns(base_url: str = BASE_URL) -> List[Tuple[str, str]]:
+    """(page_type, URL template) for every category, on `base_url`"""
+    return [(page_type, f'{base_url}/calendar/{page_type}/{{}}') for page_type in PAGE_TYPES]
+
+
+URL_PATTERNS = url_patterns()
+
+
+def parse_page_url(url: str, patterns: List[Tuple[str, str]] = URL_PATTERNS) -> Optional[Tuple[str, int]]:
+    """Return (page_type, id) for a calendar URL, or None if it isn't one"""
+    for page_type, url_pattern in patterns:
+        prefix = url_pattern.format('')
+        if url.startswith(prefix):
+            try:
+                return page_type, int(url[len(prefix):].strip('/'))
+            except ValueError:
+                return None
+    return None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Convert a Retry-After header (seconds or HTTP date) to a delay in seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class FetchResult(NamedTuple):
+    """Raw outcome of one request; status_code is None when the request itself failed
+
+    `not_modified` is set when a conditional request got a 304, or the body's
+    fingerprint (see changes.py) is the same as last time; the page then
+    needs no re-parse or re-write.
+    `elapsed` is the request's wall-clock time in seconds, and `challenge`
+    is set when it met a Cloudflare challenge (solved or not), so that time
+    is not counted as network latency.
+    """
+    url: str
+    status_code: Optional[int]
+    content: bytes = b''
+    headers: Optional[Dict] = None
+    error: str = ''
+    content_hash: Optional[str] = None
+    not_modified: bool = False
+    elapsed: float = 0.0
+    challenge: bool = False
+
 
 class MoMAScraper:
-    def __init__(self):
-        # Use cloudscraper instead of requests to bypass Cloudflare
-        self.session = cloudscraper.create_scraper(
-            browser={
-                'browser': 'chrome',
-                'platform': 'windows',
-                'mobile': False
-            }
-        )
-
-    def fetch_page(self, url: str) -> Optional[BeautifulSoup]:
-        """Fetch a page and return BeautifulSoup object, or None if page doesn't exist"""
+    def __init__(self, http_cache: Optional[str] = None, base_url: str = BASE_URL,
+                 pool_size: int = transport.DEFAULT_POOL_SIZE, cookie_path: Optional[str] = None):
+        # Another base_url points the crawler at a stand-in server (see mock_server.py)
+        self.base_url = base_url.rstrip('/')
+        self.url_patterns = url_patterns(self.base_url)
+        self.pool_size = pool_size
+
+        # Validators for conditional requests (see http_cache.py); off unless a path is given
+        self.http_cache = HTTPCache(http_cache) if http_cache else None
+        # Last known fingerprints of the pages a scheduled refresh re-checks
+        self.fingerprints = {}
+
+        self.cookie_path = cookie_path
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The HTTP session, created on first use
+
+        Use cloudscraper instead of requests to bypass Cloudflare. One
+        pooled keep-alive session is shared by all fetch workers; with
+        `cookie_path` its Cloudflare cookies are kept between runs.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = transport.create_session(self.pool_size, self.cookie_path)
+        return self._session
+
+    def save_cookies(self):
+        """Persist the session's cookies to `cookie_path`, if one was given"""
+        if self.cookie_path and self._session is not None:
+            transport.save_cookies(self._session, self.cookie_path)
+
+    def fetch_raw(self, url: str, conditional: bool = False) -> FetchResult:
+        """Fetch a page and return its status, body and headers
+
+        With `conditional` and an HTTP cache, the request carries the cached
+        validators. With `conditional`, the result is flagged `not_modified`
+        when the body's fingerprint matches the one in `fingerprints` or the
+        cache. The cache is not updated here; CrawlRun stores the validators
+        of the pages it records.
+        """
+        cache = self.http_cache
+        headers = cache.conditional_headers(url) if cache and conditional else {}
+        started = time.perf_counter()
         try:
-            response = self.session.get(url, timeout=30)
-            if response.status_code == 200:
-                return BeautifulSoup(response.content, 'html.parser')
-            elif response.status_code == 404:
-                print(f"Page not found: {url}")
-                return None
-            else:
-                print(f"Error {response.status_code} for {url}")
-                return None
+            response = self.session.get(url, timeout=30, headers=headers)
         except Exception as e:
-            print(f"Request failed for {url}: {str(e)}")
-            return None
+            log.info("Request failed for %s: %s", url, e)
+            return FetchResult(url, None, error=str(e), elapsed=time.perf_counter() - started)
+        elapsed = time.perf_counter() - started
+
+        if response.status_code == 304 and headers:
+            entry = cache.lookup(url)
+            if entry:
+                return FetchResult(url, 304, headers=response.headers, content_hash=entry[2],
+                                   not_modified=True, elapsed=elapsed)
+            # Evicted since the request was sent: nothing to compare the page with
+            log.info("Cache entry for %s is gone, fetching it again", url)
+            try:
+                response = self.session.get(url, timeout=30)
+            except Exception as e:
+                log.info("Request failed for %s: %s", url, e)
+                return FetchResult(url, None, error=str(e), elapsed=time.perf_counter() - started)
+            elapsed = time.perf_counter() - started
+
+        challenge = transport.is_challenge(response)
+        if response.status_code == 404:
+            log.debug("Page not found: %s", url)
+        elif response.status_code != 200:
+            log.info("Error %s for %s", response.status_code, url)
+            return FetchResult(url, response.status_code, response.content, response.headers,
+                               elapsed=elapsed, challenge=challenge)
+
+        content_hash = fingerprint(response.content) if response.status_code == 200 else None
+        not_modified = False
+        if conditional and response.status_code == 200:
+            # Servers without validators still let us skip unchanged bodies
+            previous = self.fingerprints.get(url)
+            if previous is None and cache:
+                entry = cache.lookup(url)
+                previous = entry[2] if entry else None
+            not_modified = previous == content_hash
+        return FetchResult(url, response.status_code, response.content, response.headers,
+                           content_hash=content_hash, not_modified=not_modified, elapsed=elapsed,
+                           challenge=challenge)
+
+    def fetch_page(self, url: str) -> Optional['BeautifulSoup']:
+        """Fetch a page and return BeautifulSoup object, or None if page doesn't exist"""
+        from bs4 import BeautifulSoup
 
-    def extract_text_safe(self, soup, selector: str, attribute: str = None) -> str:
-        """Safely extract text from a selector"""
+        result = self.fetch_raw(url)
+        if result.status_code != 200:
+            return None
+        return BeautifulSoup(result.content, 'lxml')
+
+    def scrape_page(self, url: str, page_type: str, fields: Optional[List[str]] = None) -> Dict:
+        """Scrape a single page and return structured data
+
+        With `fields` (e.g. ['title', 'date', 'artist_*']), only the field
+        groups filling those columns run; the other columns stay empty.
+        """
+        groups = extractor.field_groups(fields) if fields else None
+        return self.fetch_and_extract(url, page_type, groups=groups)[1]
+
+    def fetch_and_extract(self, url: str, page_type: str, conditional: bool = False,
+                          groups: Optional[Tuple[extractor.FieldGroup, ...]] = None
+                          ) -> Tuple[FetchResult, Optional[Dict], List[Tuple[str, int]], Dict]:
+        """Fetch a page and extract its fields, keeping the raw fetch outcome
+
+        Also returns the (page_type, id) of calendar pages the page links to,
+        and the parse / field group timings (see extractor.extract_page).
+        Unchanged pages (see fetch_raw) come back with no data and are not parsed.
+        `groups` limits the field groups that run (all registered by default).
+        """
+        result = self.fetch_raw(url, conditional)
+        if result.status_code != 200 or result.not_modified:
+            return result, None, [], {}
+        timings = {}
+        data, links = extractor.extract_page(result.content, url, page_type, timings, groups)
+        return result, data, links, timings
+
+    def fetch_concurrently(self, tasks: Iterable[Tuple[str, int, str]], concurrency: int = 1,
+                           limiter: Optional[TokenBucket] = None, conditional: bool = False,
+                           groups: Optional[Tuple[extractor.FieldGroup, ...]] = None,
+                           prefetch: Optional[int] = None
+                           ) -> Iterator[Tuple[str, int, FetchResult, Optional[Dict], List, Dict]]:
+        """Scrape (page_type, id, url) tasks on a bounded thread pool
+
+        Yields (page_type, id, fetch result, data, linked pages, timings) as
+        each page completes. At most `prefetch` pages (default `concurrency`)
+        are in flight or done and not yet consumed.
+        """
+        limiter = limiter or TokenBucket(None)
+        concurrency = max(1, concurrency)
+        prefetch = max(concurrency, prefetch or concurrency)
+
+        def run(page_type, n, url):
+            limiter.acquire()
+            return (page_type, n) + self.fetch_and_extract(url, page_type, conditional, groups)
+
+        pool = ThreadPoolExecutor(max_workers=concurrency)
         try:
-            element = soup.select_one(selector)
-            if element:
-                if attribute:
-                    return element.get(attribute, '').strip()
-                return element.get_text(strip=True)
-            return ''
-        except:
-            return ''
-
-    def extract_multiple(self, soup, selector: str) -> list:
-        """Extract multiple elements matching selector"""
+            in_flight = set()
+            for task in tasks:
+                # Keep at most `prefetch` requests outstanding
+                if len(in_flight) >= prefetch:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                in_flight.add(pool.submit(run, *task))
+
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # A consumer that stops early leaves queued requests unstarted
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def iter_pages(self, categories: Optional[Iterable[str]] = None, ids: Iterable[int] = range(1, 8001),
+                   delay: float = 0.5, concurrency: int = 1, rate: Optional[float] = None,
+                   prefetch: Optional[int] = None, parse_workers: int = 0,
+                   fields: Optional[List[str]] = None, raw: bool = False,
+                   cancel: Optional[threading.Event] = None) -> Iterator:
+        """Scrape pages lazily, yielding each row as soon as its page is done
+
+        Pages are requested for every ID in `ids` in each of `categories`
+        (default: all), in the same order as scrape_all, and yielded in the
+        order they complete. Nothing is written to disk and no crawl state is
+        kept; use scrape_all for resumable crawls.
+
+        `ids` is consumed lazily, so an unbounded iterator is fine. At most
+        `prefetch` pages (default `concurrency`) are fetched ahead of the
+        consumer, so memory stays flat however slowly rows are taken. Rate
+        and concurrency work as in scrape_all, and so do `parse_workers` and
+        `fields`.
+
+        By default only rows of existing pages are yielded. With `raw`, every
+        page yields a (FetchResult, row) pair, and the row is None for 404s
+        and failed requests.
+
+        Stop early by closing the generator (or breaking out of the loop), or
+        by setting `cancel` from another thread. No more requests are started.
+        Requests already in flight are waited for, and their results are
+        dropped.
+        """
+        url_for = dict(self.url_patterns)
+        categories = list(categories or url_for)
+        unknown = [page_type for page_type in categories if page_type not in url_for]
+        if unknown:
+            raise ValueError(f"Unknown categories: {', '.join(unknown)}")
+        groups = extractor.field_groups(fields) if fields else None
+        cancel = cancel or threading.Event()
+        if rate is None and delay > 0:
+            rate = 1.0 / delay
+        limiter = TokenBucket(rate)
+        transport.resize_pool(self.session, max(concurrency, self.pool_size))
+
+        def tasks():
+            for n in ids:
+                for page_type in categories:
+                    if cancel.is_set():
+                        return
+                    yield page_type, n, url_for[page_type].format(n)
+
+        if parse_workers > 0:
+            parse = functools.partial(parse_worker, groups=groups)
+            results = run_pipeline(self.fetch_raw, tasks(), concurrency, parse_workers, limiter,
+                                   queue_size=prefetch, parse=parse)
+        else:
+            results = self.fetch_concurrently(tasks(), concurrency, limiter, groups=groups,
+                                              prefetch=prefetch)
         try:
-            elements = soup.select(selector)
-            return [elem.get_text(strip=True) for elem in elements]
-        except:
-            return []
-
-    def count_elements(self, soup, selector: str) -> int:
-        """Count elements matching selector"""
+            for page_type, n, result, data, _, _ in results:
+                if cancel.is_set():
+                    return
+                if raw:
+                    yield result, data
+                elif data is not None:
+                    yield data
+        finally:
+            results.close()
+
+    async def aiter_pages(self, *args, **kwargs) -> AsyncIterator:
+        """Async counterpart of iter_pages, taking the same arguments
+
+        The scraping runs on a worker thread; each row is handed to the event
+        loop as it completes. Cancelling the consuming task, or closing the
+        generator, stops the scraping as iter_pages' `cancel` does.
+        """
+        import asyncio
+
+        cancel = kwargs.get('cancel') or threading.Event()
+        kwargs['cancel'] = cancel
+        pages = self.iter_pages(*args, **kwargs)
+        # One thread, so the generator is never resumed while it is still running
+        worker = ThreadPoolExecutor(max_workers=1)
+        done = object()
         try:
-            return len(soup.select(selector))
-        except:
-            return 0
-
-    def scrape_page(self, url: str, page_type: str) -> Dict:
-        """Scrape a single page and return structured data"""
-        soup = self.fetch_page(url)
-
-        if soup is None:
-            return None
-
-        data = {
-            'url': url,
-            'title': '',
-            'date': '',
-            'location': '',
-            'type': page_type,
-            'artist_name': '',
-            'no_artists': 0,
-            'artist_bio': '',
-            'artist_link': '',
-            'artist_image': '',
-            'artist_no_works': '',
-            'sponsor_text': '',
-            'no_sponsor_paragraphs': 0,
-            'promo_link': '',
-            'no_promos': 0,
-            'promo_link_data': '',
-            'promo_image': '',
-            'promo_category': '',
-            'promo_title': '',
-            'promo_description': '',
-            'promo_date': '',
-            'promo_author': '',
-            'video': '',
-            'no_videos': 0,
-            'no_pubs': 0,
-            'event_catch_all': '',
-            'no_events': 0,
-            'description': '',
-            'credits': '',
-            'location_tag': '',
-            'location_donor': '',
-            'location_selbst': '',
-            'no_locations': 0,
-            'miscellaneous_third_uneven': '',
-            'works_online_links': '',
-            'no_works_online': 0,
-            'works_online_text': ''
-        }
-
-        # Extract title
-        h1_tag = soup.find('h1')
-        if h1_tag:
-            data['title'] = h1_tag.get_text(strip=True)
-        else:
-            title_tag = soup.find('title')
-            data['title'] = title_tag.get_text(strip=True) if title_tag else ''
-
-        # Extract date - look for p.balance-text.typography with date format
-        date_found = False
-        for p in soup.find_all('p', class_='balance-text'):
-            text = p.get_text(strip=True)
-            # Check if it looks like a date (contains month names or numbers with commas/dashes)
-            if any(month in text for month in ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-                                                 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']) or \
-               (',' in text and any(char.isdigit() for char in text)):
-                data['date'] = text
-                date_found = True
-                break
-
-        if not date_found:
-            # Fallback to meta tag
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc:
-                content = meta_desc.get('content', '')
-                # Try to extract date from description (format: "Exhibition. Nov 15, 2006–Mar 26, 2007.")
-                if '.' in content:
-                    parts = content.split('.')
-                    if len(parts) > 1:
-                        date_part = parts[1].strip()
-                        if any(month in date_part for month in ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-                                                                  'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']):
-                            data['date'] = date_part
-
-        # Extract location - look for short p.typography elements containing location words
-        for p in soup.find_all('p', class_='typography'):
-            text = p.get_text(strip=True)
-            if len(text) < 50 and ('MoMA' in text or 'Museum' in text or 'Gallery' in text or 'Floor' in text):
-                data['location'] = text
-                break
-
-        # Extract artists - look for artist links with proper structure
-        artist_links = []
-        artist_names = []
-        artist_bios = []
-        artist_works_info = []
-
-        for link in soup.find_all('a', href=True):
-            href = link.get('href', '')
-            if '/artists/' in href and href != '/artists/':
-                # Try to find artist name in the structured span
-                name_span = link.find('span', class_='artist-term--in-list__title__text')
-                if name_span:
-                    artist_name = name_span.get_text(strip=True)
-
-                    # Get bio info
-                    bio_span = link.find('span', class_='artist-term--in-list__info__text')
-                    bio = bio_span.get_text(strip=True) if bio_span else ''
-
-                    # Get works count info
-                    count_span = link.find('span', class_='artist-term--in-list__count__text')
-                    works_info = count_span.get_text(strip=True) if count_span else ''
-
-                    artist_names.append(artist_name)
-                    artist_links.append(href)
-                    artist_bios.append(bio)
-                    artist_works_info.append(works_info)
+            while True:
+                page = await asyncio.wrap_future(worker.submit(next, pages, done))
+                if page is done:
+                    break
+                yield page
+        finally:
+            cancel.set()
+            await asyncio.wrap_future(worker.submit(pages.close))
+            worker.shutdown(wait=False)
+
+    def scrape_all(self, start: int = 1, end: int = 8000, delay: float = 0.5,
+                   concurrency: int = 1, rate: Optional[float] = None,
+                   recheck_missing: bool = False, state_path: str = 'crawl_state.sqlite',
+                   parse_workers: int = 0, archive_dir: Optional[str] = None,
+                   refresh: bool = False, discover: bool = False,
+                   follow_links: bool = True, follow_beyond_end: bool = False,
+                   parquet_dir: Optional[str] = None, max_retries: int = 3,
+                   adaptive_rate: bool = False, max_rate: float = 20.0,
+                   metrics_path: Optional[str] = None, prometheus_path: Optional[str] = None,
+                   metrics_port: Optional[int] = None, verbose: bool = False,
+                   csv_path: str = 'main.csv', shard: Optional[Tuple[int, int]] = None,
+                   refresh_due: bool = False, changelog_path: str = 'changes.jsonl',
+                   fields: Optional[List[str]] = None, index_path: Optional[str] = None):
+        """Scrape all pages from start to end and save to CSV, skipping already-scraped URLs
+
+        Up to `concurrency` requests run at once on a shared session, whose
+        connection pool is grown to match if needed. `rate` caps
+        the total requests per second across all workers; when omitted it is
+        derived from `delay` so existing callers keep the same politeness budget.
+
+        Progress is tracked in a SQLite crawl state (`state_path`), so resuming
+        is one indexed query and known 404s are skipped unless `recheck_missing`.
+
+        With `parse_workers` > 0, pages are parsed in a pool of that many
+        processes instead of on the fetching threads (see pipeline.py).
+
+        With `archive_dir`, every page body is also kept compressed in an
+        HTMLArchive so it can be re-extracted later without re-crawling.
+
+        With `refresh`, pages already scraped are fetched again. When the
+        scraper has an HTTP cache these are conditional requests, and pages
+        that come back unchanged are neither parsed nor re-written. A changed
+        page is appended again, and the last row for a URL is the current one.
+
+        With `refresh_due`, only the scraped pages due a re-check are fetched
+        again, on a schedule set by how recently their event ran (see
+        changes.py), ahead of the pages not yet scraped. Pages whose
+        normalized fingerprint is unchanged are not parsed. Changed pages are
+        appended only if an extracted field differs, and `changelog_path`
+        gets a JSON line per changed or removed page listing the fields that
+        changed.
+
+        With `discover`, each category's live ID range is estimated first and
+        long runs of 404s are probed sparsely instead of one by one (see
+        discovery.py). IDs passed over are recorded as skipped and re-probed
+        on a later run.
+
+        With `follow_links`, links to other calendar pages found on scraped
+        pages are fetched ahead of the sequential scan; `follow_beyond_end`
+        lets them reach IDs above `end`.
+
+        With `parquet_dir`, new rows are also written as typed Parquet row
+        groups (needs pyarrow). main.csv stays the source of truth; rebuild
+        the Parquet copy with sinks.export_parquet() after an interrupted run.
+
+        Transient failures (no response, 429, 5xx) are retried within the run
+        up to `max_retries` times, after an exponential backoff with jitter or
+        the server's Retry-After, whichever is longer. Pages still failing are
+        recorded and retried on the next run.
+
+        With `adaptive_rate`, the request rate starts at `rate` and is tuned
+        while crawling (see rate_limit.AIMDController): raised step by step
+        while responses stay fast and error-free, up to `max_rate`, and cut
+        back as soon as the site throttles.
+
+        Per-page fetch latency, size, status, parse, field group and write
+        times are collected in a Metrics object (see metrics.py). With
+        `metrics_path` they are appended there as JSON lines; `prometheus_path`
+        gets a Prometheus text file rewritten at each checkpoint, and
+        `metrics_port` serves the same text over HTTP. The console only gets a
+        progress line every 10 seconds; `verbose` logs every page as well.
+
+        Rows go to `csv_path`. With `shard` = (index, count), only the pages
+        shards.shard_of() assigns to that shard are crawled (links and
+        discovery probes included), and the CSV and crawl state paths get a
+        .shard-<index>-of-<count> suffix so workers never share files.
+        Combine the shards afterwards with shards.merge_shards().
+
+        With `fields` (e.g. ['title', 'date', 'artist_*']), only the field
+        groups filling those columns run, and the CSV has just those columns
+        plus url and type. Give such a run its own `csv_path` and
+        `state_path`: the pages it marks done have none of the other columns.
+        Not available with `parquet_dir`, whose schema has every column.
+
+        With `index_path`, every new row is also indexed in a SQLite
+        normalize.EventIndex: parsed start/end dates per page, one row per
+        artist and the page-artist links, so lookups by artist or date range
+        need no CSV scan. Rebuild it with normalize.build_index() after an
+        interrupted run or a merge.
+
+        Returns the run's CrawlRun, whose counters summarize what happened.
+        """
+        if verbose:
+            logging.basicConfig(level=logging.INFO, format='%(message)s')
+        page_types = [page_type for page_type, _ in self.url_patterns]
+        url_for = dict(self.url_patterns)
+        groups = extractor.field_groups(fields)
+        columns = extractor.select_fields(fields) if fields else None
+        if fields and parquet_dir:
+            raise ValueError("fields cannot be combined with parquet_dir")
+        if fields and shard:
+            # Shards are merged into the full schema and their pages marked done
+            raise ValueError("fields cannot be combined with shard")
+        in_shard = None
+        if shard:
+            validate_shard(*shard)
+            csv_path = shard_path(csv_path, *shard)
+            state_path = shard_path(state_path, *shard)
+            index_path = index_path and shard_path(index_path, *shard)
+            in_shard = lambda page_type, n: shard_of(page_type, n, shard[1]) == shard[0]
+            print(f"Crawling shard {shard[0]} of {shard[1]} into {csv_path}")
+
+        def indexed(rows):
+            """(page_type, id, url, event_end) for the state, of rows with a calendar URL"""
+            for row in rows:
+                parsed = parse_page_url(row['url'], self.url_patterns)
+                if parsed:
+                    yield parsed + (row['url'], event_end(row.get('date')))
+
+        state = CrawlState(state_path)
+        sink = run = archive = metrics = changelog = parsers = None
+        outputs = []
+        try:
+            archive = HTMLArchive(archive_dir) if archive_dir else None
+            csv_offset, csv_digest = state.csv_checkpoint()
+            fresh = not os.path.exists(csv_path)
+            sink = CSVSink(csv_path, fieldnames=columns)
+
+            if csv_offset is not None and not fresh and matches_checkpoint(csv_path, csv_offset, csv_digest):
+                # Rows appended after the last committed checkpoint were written
+                # but not recorded yet: keep the complete ones and record them,
+                # so the CSV and the crawl state agree without re-reading it all
+                sink.open(checkpoint=csv_offset)
+                tail = sink.rows_after(csv_offset)
+                if tail:
+                    print(f"Recording {len(tail)} rows written to {csv_path} after the last checkpoint")
+                    state.import_scraped(indexed(tail), keep_fetched=True)
+                if sink.offset != csv_offset:
+                    state.set_csv_checkpoint(sink.offset, sink.digest())
+                    state.commit()
+            else:
+                sink.open()
+                # First run with a crawl state, or the CSV is not the one the
+                # state's checkpoint refers to (rewritten, merged, edited):
+                # index the URLs in it once instead of truncating it
+                state.forget_scraped()
+                if not fresh:
+                    if csv_offset is not None:
+                        print(f"{csv_path} changed since the last run, re-indexing it")
+                    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+                        state.import_scraped(indexed(csv.DictReader(f)))
                 else:
-                    # Fallback: just get the text if no structured span found
-                    text = link.get_text(strip=True)
-                    # Exclude generic "Artists" links and very long descriptions
-                    if text and text.lower() != 'artists' and len(text) < 200:
-                        # Try to be smart about what looks like an artist name vs description
-                        # If it doesn't have common non-name phrases, include it
-                        if not any(phrase in text.lower() for phrase in
-                                 ['view all', 'see more', 'back to', 'learn more', 'read more']):
-                            artist_names.append(text)
-                            artist_links.append(href)
-                            artist_bios.append('')
-                            artist_works_info.append('')
-
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_artists = []
-        unique_links = []
-        unique_bios = []
-        unique_works = []
-
-        for name, link, bio, works in zip(artist_names, artist_links, artist_bios, artist_works_info):
-            if name not in seen:
-                seen.add(name)
-                unique_artists.append(name)
-                unique_links.append(link)
-                unique_bios.append(bio)
-                unique_works.append(works)
-
-        data['artist_name'] = '|'.join(unique_artists) if unique_artists else ''
-        data['artist_link'] = '|'.join(unique_links) if unique_links else ''
-        data['no_artists'] = len(unique_artists)
-
-        # Store bio and works info
-        if unique_bios and any(unique_bios):
-            data['artist_bio'] = '|'.join(unique_bios)
-        if unique_works and any(unique_works):
-            data['artist_no_works'] = '|'.join(unique_works)
-
-        # Extract description - prefer meta tags as they have clean text
-        meta_desc = soup.find('meta', attrs={'name': 'description'}) or \
-                   soup.find('meta', attrs={'property': 'og:description'})
-        if meta_desc:
-            data['description'] = meta_desc.get('content', '')
-        else:
-            # Fallback to article content
-            article = soup.find('article')
-            if article:
-                paragraphs = article.find_all('p')
-                data['description'] = ' '.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
-
-        # Extract additional artist bio if available (more detailed than the list bio)
-        bio_elem = soup.find(class_='artist-bio') or soup.find(class_='bio')
-        if bio_elem:
-            detailed_bio = bio_elem.get_text(strip=True)
-            # If we already have bio from artist list, append; otherwise use this
-            if data['artist_bio']:
-                data['artist_bio'] = data['artist_bio'] + ' | ' + detailed_bio
+                    print(f"{csv_path} not found, starting fresh")
+                state.set_csv_checkpoint(sink.offset, sink.digest())
+                state.commit()
+
+            # Print statistics about what's already scraped
+            counts = state.counts()
+            print("\n=== Already Scraped ===")
+            for page_type in page_types:
+                type_counts = counts.get(page_type, {})
+                print(f"  {page_type}: {type_counts.get(STATUS_OK, 0)} pages "
+                      f"({type_counts.get(STATUS_NOT_FOUND, 0)} known 404s)")
+
+            total_already_scraped = sum(c.get(STATUS_OK, 0) for c in counts.values())
+            print(f"  TOTAL: {total_already_scraped} pages already in {csv_path}")
+
+            # Calculate what needs to be scraped
+            total_to_check = (end - start + 1) * len(page_types)
+            pending = list(state.pending(page_types, start, end, recheck_missing, refresh))
+            previous = None
+            self.fingerprints = {}
+            if refresh_due and not refresh and not fresh:
+                if state.event_ends_missing():
+                    # Crawl states from before event dates were recorded
+                    print(f"  Reading event dates from {csv_path} for the refresh schedule")
+                    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+                        state.set_event_ends((page_type, n, end_ts) for page_type, n, _, end_ts
+                                             in indexed(csv.DictReader(f)))
+                    state.commit()
+                # Scheduled from the crawl state; only the due pages' rows are read
+                due = due_pages(((n, page_type, url, content_hash), fetched_at, end_ts)
+                                for page_type, n, url, fetched_at, content_hash, end_ts
+                                in state.scraped_pages() if start <= n <= end)
+                previous = current_rows(csv_path, (url for _, _, url, _ in due))
+                self.fingerprints = {url: content_hash for _, _, url, content_hash in due}
+                print(f"  {len(due)} of {total_already_scraped} scraped pages are due a re-check")
+                pending = [(n, page_type) for n, page_type, _, _ in due] + pending
+            if in_shard:
+                total_to_check = sum(in_shard(page_type, n)
+                                     for n in range(start, end + 1) for page_type in page_types)
+                pending = [(n, page_type) for n, page_type in pending if in_shard(page_type, n)]
+
+            print(f"\n=== To Process ===")
+            print(f"  ID range: {start} to {end}")
+            print(f"  Total URLs to check: {total_to_check}")
+            print(f"  Already done in this range: {total_to_check - len(pending)}")
+            print(f"  Remaining to scrape: {len(pending)}")
+            print()
+
+            # The fixed per-request sleep becomes a global rate shared by all workers
+            if rate is None and delay > 0:
+                rate = 1.0 / delay
+            limiter = TokenBucket(rate)
+            controller = AIMDController(limiter, max_rate=max_rate) if adaptive_rate else None
+            retries = RetryQueue(max_retries) if max_retries > 0 else None
+
+            # A pooled keep-alive connection for every worker, and any Cloudflare
+            # challenge solved once up front rather than by each worker at once
+            transport.resize_pool(self.session, max(concurrency, self.pool_size))
+            warm_up_seconds = None
+            if concurrency > 1 and pending and 'cf_clearance' not in self.session.cookies:
+                warm_up_seconds = transport.warm_up(self.session, self.base_url + '/calendar')
+
+            frontier = None
+            if follow_links:
+                done = done_statuses(recheck_missing, refresh)
+                frontier = Frontier(
+                    lambda page_type, ids: {n for n, status in state.statuses(page_type, ids).items()
+                                            if status in done},
+                    lambda page_type, n: (start <= n and (follow_beyond_end or n <= end)
+                                          and (in_shard is None or in_shard(page_type, n)))
+                )
+
+            outputs = [ParquetSink(parquet_dir).open()] if parquet_dir else []
+            if index_path:
+                outputs.append(EventIndex(index_path).open())
+            metrics = Metrics(metrics_path, prometheus_path, total=len(pending))
+            if metrics_port:
+                metrics.serve(metrics_port)
+            if warm_up_seconds is not None:
+                metrics.set_gauge('warm_up_seconds', warm_up_seconds)
+            changelog = ChangeLog(changelog_path) if previous is not None else None
+            run = CrawlRun(sink, state, archive, self.http_cache, frontier,
+                           already_done=total_to_check - len(pending), outputs=outputs,
+                           retries=retries, controller=controller, metrics=metrics,
+                           previous=previous, changelog=changelog)
+
+            conditional = refresh or refresh_due
+
+            def fetch_all(tasks):
+                nonlocal parsers
+                if parse_workers > 0:
+                    # One parser pool for every batch, retry round and probe of the run
+                    if parsers is None:
+                        parsers = parse_pool(parse_workers)
+                    fetch = functools.partial(self.fetch_raw, conditional=conditional)
+                    parse = functools.partial(parse_worker, groups=groups)
+                    return run_pipeline(fetch, tasks, concurrency, parse_workers, limiter, parse=parse,
+                                        parsers=parsers)
+                return self.fetch_concurrently(tasks, concurrency, limiter, conditional, groups)
+
+            if discover:
+                self._discover(run, fetch_all, pending, start, end, shard)
             else:
-                data['artist_bio'] = detailed_bio
-
-        # Extract artist image
-        og_image = soup.find('meta', property='og:image')
-        if og_image:
-            data['artist_image'] = og_image.get('content', '')
-
-        # Extract credits
-        data['credits'] = self.extract_text_safe(soup, '.credits') or \
-                         self.extract_text_safe(soup, '.event-detail__credits')
-
-        # Extract sponsor information
-        sponsors = self.extract_multiple(soup, '.sponsor') or \
-                  self.extract_multiple(soup, '.event-detail__sponsor')
-        data['sponsor_text'] = '|'.join(sponsors) if sponsors else ''
-        data['no_sponsor_paragraphs'] = len(sponsors)
-
-        # Extract promos
-        promos = soup.select('.promo') or soup.select('.related-content')
-        data['no_promos'] = len(promos)
-
-        if promos:
-            promo_data = []
-            for promo in promos:
-                promo_dict = {
-                    'title': self.extract_text_safe(promo, '.promo__title'),
-                    'description': self.extract_text_safe(promo, '.promo__description'),
-                    'link': self.extract_text_safe(promo, 'a', 'href'),
-                    'category': self.extract_text_safe(promo, '.promo__category'),
-                    'date': self.extract_text_safe(promo, '.promo__date'),
-                    'author': self.extract_text_safe(promo, '.promo__author'),
-                    'image': self.extract_text_safe(promo, 'img', 'src')
-                }
-                promo_data.append(promo_dict)
-
-            if promo_data:
-                data['promo_title'] = '|'.join([p['title'] for p in promo_data])
-                data['promo_description'] = '|'.join([p['description'] for p in promo_data])
-                data['promo_link'] = '|'.join([p['link'] for p in promo_data])
-                data['promo_category'] = '|'.join([p['category'] for p in promo_data])
-                data['promo_date'] = '|'.join([p['date'] for p in promo_data])
-                data['promo_author'] = '|'.join([p['author'] for p in promo_data])
-                data['promo_image'] = '|'.join([p['image'] for p in promo_data])
-                data['promo_link_data'] = json.dumps(promo_data)
-
-        # Extract videos
-        videos = soup.select('video') or soup.select('iframe[src*="youtube"]') or \
-                soup.select('iframe[src*="vimeo"]')
-        data['no_videos'] = len(videos)
-        video_urls = []
-        for video in videos:
-            src = video.get('src', '')
-            if src:
-                video_urls.append(src)
-        data['video'] = '|'.join(video_urls)
-
-        # Extract publications
-        data['no_pubs'] = self.count_elements(soup, '.publication') or \
-                         self.count_elements(soup, 'a[href*="/publications/"]')
-
-        # Extract events
-        events = self.extract_multiple(soup, '.event') or \
-                self.extract_multiple(soup, '.related-event')
-        data['event_catch_all'] = '|'.join(events) if events else ''
-        data['no_events'] = len(events)
-
-        # Extract location details
-        location_tags = self.extract_multiple(soup, '.location-tag')
-        data['location_tag'] = '|'.join(location_tags) if location_tags else ''
-        data['no_locations'] = len(location_tags)
-
-        data['location_donor'] = self.extract_text_safe(soup, '.location-donor')
-        data['location_selbst'] = self.extract_text_safe(soup, '.location-selbst')
-
-        # Extract works online (for galleries/exhibitions)
-        works_online = soup.select('.work-online') or soup.select('a[href*="/collection/works/"]')
-        data['no_works_online'] = len(works_online)
-        works_online_links = [w.get('href', '') for w in works_online if w.get('href')]
-        data['works_online_links'] = '|'.join(works_online_links)
-        works_online_texts = [w.get_text(strip=True) for w in works_online]
-        data['works_online_text'] = '|'.join(works_online_texts)
-
-        return data
-
-    def scrape_all(self, start: int = 1, end: int = 8000, delay: float = 0.5):
-        """Scrape all pages from start to end and save to CSV, skipping already-scraped URLs"""
-
-        url_patterns = [
-            ('film', 'https://www.moma.org/calendar/film/{}'),
-            ('galleries', 'https://www.moma.org/calendar/galleries/{}'),
-            ('exhibitions', 'https://www.moma.org/calendar/exhibitions/{}')
-        ]
-
-        # Read existing data if main.csv exists
-        existing_data = []
-        existing_urls = set()
-        try:
-            with open('main.csv', 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                existing_data = list(reader)
-                existing_urls = {row['url'] for row in existing_data}
-                print(f"Loaded {len(existing_data)} existing rows from main.csv")
-        except FileNotFoundError:
-            print("main.csv not found, starting fresh")
-
-        # Parse existing URLs to determine which IDs are already scraped
-        scraped_ids = {'film': set(), 'galleries': set(), 'exhibitions': set()}
-        for url in existing_urls:
-            for page_type, url_pattern in url_patterns:
-                pattern_base = url_pattern.format('')
-                if pattern_base[:-2] in url:  # Remove the '{}' part
-                    try:
-                        # Extract ID from URL
-                        id_num = int(url.split('/')[-1])
-                        scraped_ids[page_type].add(id_num)
-                    except (ValueError, IndexError):
-                        pass
-
-        # Print statistics about what's already scraped
-        print("\n=== Already Scraped ===")
-        for page_type in ['film', 'galleries', 'exhibitions']:
-            count = len(scraped_ids[page_type])
-            print(f"  {page_type}: {count} pages")
-
-        total_already_scraped = sum(len(ids) for ids in scraped_ids.values())
-        print(f"  TOTAL: {total_already_scraped} pages already in main.csv")
-
-        # Calculate what needs to be scraped
-        total_to_check = (end - start + 1) * 3  # 3 categories
-        total_already_in_range = 0
-        for page_type in ['film', 'galleries', 'exhibitions']:
-            total_already_in_range += len([id for id in scraped_ids[page_type] if start <= id <= end])
-
-        print(f"\n=== To Process ===")
-        print(f"  ID range: {start} to {end}")
-        print(f"  Total URLs to check: {total_to_check}")
-        print(f"  Already scraped in this range: {total_already_in_range}")
-        print(f"  Remaining to scrape: {total_to_check - total_already_in_range}")
-        print()
-
-        results = existing_data.copy()
-        new_pages_scraped = 0
-        new_pages_found = 0
-        pages_skipped_existing = 0
-        pages_not_found = 0
-
-        for n in range(start, end + 1):
-            print(f"\n--- Processing ID: {n} ---")
-
-            for page_type, url_pattern in url_patterns:
-                url = url_pattern.format(n)
-
-                # Check if already scraped
-                if n in scraped_ids[page_type]:
-                    pages_skipped_existing += 1
-                    print(f"⊘ Already scraped {page_type}/{n} - skipping")
-                    continue
-
-                print(f"Scraping {page_type}/{n}...")
-
-                data = self.scrape_page(url, page_type)
-
-                if data:
-                    results.append(data)
-                    new_pages_scraped += 1
-                    new_pages_found += 1
-                    print(f"✓ Successfully scraped {page_type}/{n} (NEW #{new_pages_found})")
+                keys = ((page_type, n) for n, page_type in pending)
+                # Links harvested and retries deferred near the end can outlive
+                # the sequential list
+                while True:
+                    if frontier:
+                        keys = frontier.schedule(keys)
+                    if retries is not None:
+                        keys = retries.interleave(keys)
+                    tasks = ((page_type, n, url_for[page_type].format(n)) for page_type, n in keys)
+                    for item in fetch_all(tasks):
+                        run.handle(*item)
+                    if not run.has_more_work():
+                        break
+                    if not (frontier and frontier.has_work()):
+                        retries.wait()
+                    keys = ()
+            total_in_csv = state.counts()
+        finally:
+            # Also on errors and Ctrl+C: make what was written durable, and
+            # release the crawl state so a retry in this process can open it
+            try:
+                if parsers is not None:
+                    parsers.shutdown(wait=True, cancel_futures=True)
+                if run is not None:
+                    run.close()
                 else:
-                    pages_not_found += 1
-                    print(f"✗ Page not found {page_type}/{n}")
-
-                # Be respectful with requests
-                time.sleep(delay)
-
-            # Save progress every 10 IDs
-            if n % 10 == 0:
-                self.save_to_csv(results)
-                print(f"\n=== Progress saved ===")
-                print(f"  New pages scraped: {new_pages_found}")
-                print(f"  Already existed: {pages_skipped_existing}")
-                print(f"  Not found (404): {pages_not_found}")
-                print(f"  Total in CSV: {len(results)}")
-
-        # Final save
-        self.save_to_csv(results)
+                    for resource in [sink, *outputs, archive, changelog, metrics]:
+                        if resource is not None:
+                            resource.close()
+                self.save_cookies()
+            finally:
+                state.close()
+        if (refresh or refresh_due) and sink.rows_written:
+            # Refreshed pages were appended after their old rows
+            self._compact(csv_path, state_path)
         print(f"\n{'='*60}")
         print(f"=== SCRAPING COMPLETE ===")
         print(f"{'='*60}")
-        print(f"  New pages successfully scraped: {new_pages_found}")
-        print(f"  Pages already existed: {pages_skipped_existing}")
-        print(f"  Pages not found (404): {pages_not_found}")
-        print(f"  Total pages now in main.csv: {len(results)}")
+        run.print_summary(final=True)
+        print(f"  Total pages now in {csv_path}: {sum(c.get(STATUS_OK, 0) for c in total_in_csv.values())}")
         print(f"{'='*60}")
+        return run
+
+    def _compact(self, csv_path: str, state_path: str):
+        """Drop superseded rows from the CSV and point the crawl state's checkpoint at the result
+
+        A crash between the two leaves a CSV that no longer matches the
+        checkpoint, which the next run re-indexes.
+        """
+        dropped = compact_csv(csv_path)
+        if not dropped:
+            return
+        state = CrawlState(state_path)
+        try:
+            size = os.path.getsize(csv_path)
+            state.set_csv_checkpoint(size, checkpoint_digest(csv_path, size))
+            state.commit()
+        finally:
+            state.close()
+        print(f"Compacted {csv_path}: dropped {dropped} superseded rows")
+
+    def _discover(self, run: 'CrawlRun', fetch_all, pending: List[Tuple[int, str]],
+                  start: int, end: int, shard: Optional[Tuple[int, int]] = None):
+        """Crawl `pending` adaptively: find each category's live range, then skip dead stretches
+
+        A shard only probes its own IDs, so its probe windows are widened to
+        hold about as many of them as an unsharded window. The estimated ends
+        are kept in the crawl state and never lowered by a later estimate. IDs
+        past them are recorded as skipped; once due again (they were past the
+        end last time too), they are scanned sparsely rather than skipped.
+        """
+        state = run.state
+        url_for = dict(self.url_patterns)
+
+        probed = set()
+
+        def probe(page_type, ids):
+            if shard:
+                ids = [n for n in ids if shard_of(page_type, n, shard[1]) == shard[0]]
+            known = state.statuses(page_type, ids)
+            live = {n: status == STATUS_OK for n, status in known.items()}
+            tasks = [(page_type, n, url_for[page_type].format(n)) for n in ids if n not in known]
+            for item in fetch_all(tasks):
+                probed.add((item[0], item[1]))
+                live[item[1]] = bool(run.handle(*item))
+            return live
+
+        print("=== Discovering live ID ranges ===")
+        by_type = {page_type: [] for page_type, _ in self.url_patterns}
+        bounds = {}
+        for page_type in by_type:
+            low = max(start - 1, state.max_id(page_type) or 0)
+            bound = estimate_upper_bound(
+                lambda ids, page_type=page_type: probe(page_type, ids), low, end,
+                window=5 * (shard[1] if shard else 1))
+            bounds[page_type] = max(bound, state.discovery_bound(page_type) or 0)
+            state.set_discovery_bound(page_type, bounds[page_type])
+            print(f"  {page_type}: live IDs end around {bounds[page_type]}")
+
+        pending = [(n, page_type) for n, page_type in pending if (page_type, n) not in probed]
+        beyond = {page_type: [] for page_type in by_type}
+        for n, page_type in pending:
+            (by_type if n <= bounds[page_type] else beyond)[page_type].append(n)
+        skipped = 0
+        for page_type, ids in beyond.items():
+            statuses = state.statuses(page_type, ids)
+            for n in ids:
+                if statuses.get(n) == STATUS_SKIPPED:
+                    # Skipped past the end before and due a re-probe
+                    by_type[page_type].append(n)
+                else:
+                    state.record(page_type, n, url_for[page_type].format(n), STATUS_SKIPPED)
+                    skipped += 1
+        run.pages_skipped += skipped
+        rescanned = sum(len(ids) for ids in beyond.values()) - skipped
+        print(f"  Not probing {skipped} IDs past the estimated ends")
+        if rescanned:
+            print(f"  Re-probing {rescanned} IDs skipped past them before, sparsely")
+        print()
+
+        scheduler = DiscoveryScheduler(by_type, bounds=bounds)
+        frontier = run.frontier
+        while scheduler.has_work() or run.has_more_work():
+            keys = frontier.schedule(scheduler) if frontier else scheduler
+            if run.retries is not None:
+                keys = run.retries.interleave(keys)
+                if not scheduler.has_work() and not (frontier and frontier.has_work()):
+                    run.retries.wait()
+            tasks = ((page_type, n, url_for[page_type].format(n)) for page_type, n in keys)
+            for item in fetch_all(tasks):
+                live = run.handle(*item)
+                if live is not None:
+                    scheduler.report(item[0], item[1], live)
+
+        for page_type, ids in scheduler.finish().items():
+            # A link may have reached an ID the scan passed over
+            ids = [n for n in ids if not (frontier and (page_type, n) in frontier.fetched)]
+            for n in ids:
+                state.record(page_type, n, url_for[page_type].format(n), STATUS_SKIPPED)
+            run.pages_skipped += len(ids)
+
 
     def save_to_csv(self, data: list):
-        """Save data to CSV file"""
+        """Save data to CSV file, replacing its contents (scrape_all appends through CSVSink instead)"""
         if not data:
             print("No data to save")
             return
 
-        fieldnames = [
-            'url', 'title', 'date', 'location', 'type', 'artist_name', 'no_artists',
-            'artist_bio', 'artist_link', 'artist_image', 'artist_no_works',
-            'sponsor_text', 'no_sponsor_paragraphs', 'promo_link', 'no_promos',
-            'promo_link_data', 'promo_image', 'promo_category', 'promo_title',
-            'promo_description', 'promo_date', 'promo_author', 'video', 'no_videos',
-            'no_pubs', 'event_catch_all', 'no_events', 'description', 'credits',
-            'location_tag', 'location_donor', 'location_selbst', 'no_locations',
-            'miscellaneous_third_uneven', 'works_online_links', 'no_works_online',
-            'works_online_text'
-        ]
-
         with open('main.csv', 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
             writer.writeheader()
             writer.writerows(data)
 
         print(f"Saved {len(data)} rows to main.csv")
 
 
+
+class CrawlRun:
+    """Book-keeping for one scrape_all run: writes rows, records state, checkpoints"""
+
+    def __init__(self, sink: CSVSink, state: CrawlState, archive: Optional[HTMLArchive] = None,
+                 http_cache: Optional[HTTPCache] = None, frontier: Optional[Frontier] = None,
+                 already_done: int = 0, checkpoint_every: int = 10 * len(URL_PATTERNS),
+                 outputs: Iterable[OutputSink] = (), retries: Optional[RetryQueue] = None,
+                 controller: Optional[AIMDController] = None, metrics: Optional[Metrics] = None,
+                 progress_every: float = 10.0, previous: Optional[Dict[str, PageRecord]] = None,
+                 changelog: Optional[ChangeLog] = None):
+        self.sink = sink
+        # Current rows of the pages a scheduled refresh re-checks, by URL
+        self.previous = previous
+        self.changelog = changelog
+        self.metrics = metrics or Metrics()
+        # Seconds between progress lines
+        self.progress_every = progress_every
+        self._last_progress = time.monotonic()
+        self.retries = retries
+        self.controller = controller
+        # Secondary backends (e.g. Parquet) that get every new row as well
+        self.outputs = list(outputs)
+        self.state = state
+        self.archive = archive
+        self.http_cache = http_cache
+        self.frontier = frontier
+        # Save progress roughly every 10 IDs worth of requests
+        self.checkpoint_every = checkpoint_every
+        self.completed = 0
+        self.already_done = already_done
+        self.new_pages_found = 0
+        self.pages_not_found = 0
+        self.pages_failed = 0
+        self.pages_unchanged = 0
+        self.pages_skipped = 0
+        self.pages_retried = 0
+        self.pages_changed = 0
+        self.checkpoints = 0
+        self.checkpoint_seconds = 0.0
+
+    def handle(self, page_type: str, n: int, result: FetchResult, data: Optional[Dict],
+               links: Iterable[Tuple[str, int]] = (), timings: Optional[Dict] = None) -> Optional[bool]:
+        """Write and record one fetched page; returns whether it exists (None if unknown)
+
+        Calendar pages it links to are queued on the frontier, if there is one.
+        Transient failures go on the retry queue, if there is one. A page with
+        a previous row is only re-written if a field changed, and the change
+        goes to the changelog.
+        """
+        state = self.state
+        live = None
+        write_s = None
+        retry_after = parse_retry_after((result.headers or {}).get('Retry-After'))
+        if self.controller:
+            self.controller.observe(result.status_code, result.elapsed, retry_after)
+        if self.frontier:
+            self.frontier.mark_fetched(page_type, n)
+        if result.not_modified:
+            state.record(page_type, n, result.url, STATUS_OK, result.status_code, result.content_hash)
+            self.pages_unchanged += 1
+            live = True
+            outcome = 'unchanged'
+            log.info("= Unchanged %s/%s", page_type, n)
+        elif data and self.previous and result.url in self.previous and \
+                not changed_fields(self.previous[result.url], data, self.sink.fieldnames):
+            # Only markup the extraction ignores changed; the archive keeps the new body
+            if self.archive:
+                self.archive.put(result.url, page_type, n, result.content)
+            state.record(page_type, n, result.url, STATUS_OK, 200, result.content_hash,
+                         event_end=event_end(data.get('date')))
+            self.pages_unchanged += 1
+            live = True
+            outcome = 'unchanged'
+            log.info("= Unchanged %s/%s (markup only)", page_type, n)
+        elif data:
+            started = time.perf_counter()
+            self.sink.write(data)
+            for output in self.outputs:
+                output.write(data)
+            if self.archive:
+                self.archive.put(result.url, page_type, n, result.content)
+            write_s = time.perf_counter() - started
+            state.record(page_type, n, result.url, STATUS_OK, 200, result.content_hash,
+                         event_end=event_end(data.get('date')))
+            live = True
+            if self.previous and result.url in self.previous:
+                fields = changed_fields(self.previous.pop(result.url), data, self.sink.fieldnames)
+                self.changelog.write(page_type, n, result.url, 'modified', fields)
+                self.pages_changed += 1
+                outcome = 'changed'
+                log.info("Δ Changed %s/%s: %s", page_type, n, ', '.join(fields))
+            else:
+                self.new_pages_found += 1
+                outcome = 'new'
+                log.info("✓ Successfully scraped %s/%s (NEW #%d)", page_type, n, self.new_pages_found)
+            if self.frontier:
+                self.frontier.add(links)
+        elif result.status_code == 404:
+            if self.previous and result.url in self.previous:
+                del self.previous[result.url]
+                self.changelog.write(page_type, n, result.url, 'removed')
+                log.info("Δ Removed %s/%s", page_type, n)
+            state.record(page_type, n, result.url, STATUS_NOT_FOUND, 404)
+            self.pages_not_found += 1
+            live = False
+            outcome = 'not_found'
+            log.info("✗ Page not found %s/%s", page_type, n)
+        else:
+            # Recorded even when retried below, so a crash leaves it pending
+            if retry_after is not None:
+                state.record(page_type, n, result.url, STATUS_RETRY_AFTER, result.status_code,
+                             retry_after=time.time() + retry_after)
+            else:
+                state.record(page_type, n, result.url, STATUS_ERROR, result.status_code)
+            if self.retries is not None and is_retryable(result.status_code) and \
+                    self.retries.defer((page_type, n), retry_after):
+                self.pages_retried += 1
+                outcome = 'retry'
+                log.info("✗ Failed to fetch %s/%s, retrying later in this run", page_type, n)
+            else:
+                self.pages_failed += 1
+                outcome = 'failed'
+                log.info("✗ Failed to fetch %s/%s, will retry on next run", page_type, n)
+
+        if live and self.http_cache:
+            # Only for recorded rows, committed with them at the next checkpoint
+            if result.status_code == 304:
+                self.http_cache.touch(result.url)
+            else:
+                self.http_cache.store(result.url, result.headers or {}, result.content_hash)
+
+        timings = timings or {}
+        self.metrics.record(page_type, n, result.url, result.status_code, outcome,
+                            len(result.content or b''), result.elapsed, timings.get('parse'),
+                            write_s, timings.get('fields'), challenge=result.challenge)
+        self.completed += 1
+        if self.completed % self.checkpoint_every == 0:
+            self.checkpoint()
+            if time.monotonic() - self._last_progress >= self.progress_every:
+                self._last_progress = time.monotonic()
+                print(f"  {self.metrics.progress_line()}")
+        return live
+
+    def has_more_work(self) -> bool:
+        """Whether followed links or deferred retries are still waiting"""
+        return bool((self.frontier and self.frontier.has_work()) or self.retries)
+
+    def print_summary(self, final: bool = False):
+        if final:
+            print(f"  New pages successfully scraped: {self.new_pages_found}")
+            print(f"  Pages already done: {self.already_done}")
+            print(f"  Pages not found (404): {self.pages_not_found}")
+            print(f"  Pages failed (will retry): {self.pages_failed}")
+        else:
+            print(f"  New pages scraped: {self.new_pages_found}")
+            print(f"  Already done: {self.already_done}")
+            print(f"  Not found (404): {self.pages_not_found}")
+            print(f"  Failed (will retry): {self.pages_failed}")
+        if self.pages_unchanged:
+            print(f"  Unchanged: {self.pages_unchanged}")
+        if self.changelog:
+            print(f"  Changed: {self.pages_changed} (changelog: {self.changelog.path})")
+        if self.pages_skipped:
+            print(f"  Skipped by discovery: {self.pages_skipped}")
+        if self.pages_retried:
+            print(f"  Retries scheduled: {self.pages_retried}")
+        if self.controller:
+            print(f"  Request rate: {self.controller.rate:.1f}/s")
+        if self.frontier and self.frontier.harvested:
+            print(f"  Queued from links: {self.frontier.harvested}")
+
+    def checkpoint(self):
+        """Make new rows durable, then commit the crawl state and HTTP cache that refer to them"""
+        started = time.perf_counter()
+        self.sink.checkpoint()
+        for output in self.outputs:
+            output.checkpoint()
+        if self.archive:
+            self.archive.commit()
+        if self.changelog:
+            self.changelog.flush()
+        self.state.set_csv_checkpoint(self.sink.offset, self.sink.digest())
+        self.state.commit()
+        # Last: a crash before this only costs unconditional requests, while
+        # validators committed ahead of their rows would hide them for good
+        if self.http_cache:
+            self.http_cache.commit()
+        self.checkpoints += 1
+        self.checkpoint_seconds += time.perf_counter() - started
+        if self.controller:
+            self.metrics.set_gauge('request_rate', self.controller.rate)
+        self.metrics.set_gauge('checkpoint_seconds_total', self.checkpoint_seconds)
+        self.metrics.flush()
+
+    def close(self):
+        self.checkpoint()
+        self.sink.close()
+        for output in self.outputs:
+            output.close()
+        if self.archive:
+            self.archive.close()
+        if self.changelog:
+            self.changelog.close()
+        self.metrics.close()
+
 if __name__ == '__main__':
     scraper = MoMAScraper()
 
@@ -459,5 +965,9 @@ if __name__ == '__main__':
     # - start: starting ID number (default: 1)
     # - end: ending ID number (default: 8000)
     # - delay: delay between requests in seconds (default: 0.5)
+    # - concurrency: number of requests in flight at once (default: 1)
+    # - rate: max requests per second across all workers (default: 1 / delay)
+    # - parquet_dir: also write typed Parquet output there (needs pyarrow)
+    # - index_path: also index dates and artists in SQLite there (see normalize.py)
 
     scraper.scrape_all(start=0, end=8000, delay=0.1)
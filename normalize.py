@@ -0,0 +1,258 @@
+"""
+Normalized, indexed side tables for dates and artists
+
+main.csv keeps `date` as the free text found on the page and artists as
+pipe-joined columns, so a question like "all events for artist X" means
+re-splitting every row. An EventIndex is a SQLite database next to the CSV
+with the same data normalized once, as rows are written:
+
+- events: one row per page, with its date parsed to ISO start/end dates
+- artists: one row per /artists/<id>, deduplicated across pages
+- event_artists: which artists appear on which page, in page order
+
+scrape_all(index_path=...) fills it during the crawl; build_index() rebuilds
+it from a CSV (e.g. after a shard merge or a re-extraction).
+
+    python normalize.py build --csv main.csv --index main_index.sqlite
+    python normalize.py artist 2142
+    python normalize.py month 2019-10
+"""
+import argparse
+import calendar
+import csv
+import datetime
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from sinks import OutputSink, split_list
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    url TEXT PRIMARY KEY,
+    page_type TEXT NOT NULL,
+    id INTEGER,
+    title TEXT,
+    date_text TEXT,
+    start_date TEXT,
+    end_date TEXT
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (start_date);
+CREATE INDEX IF NOT EXISTS events_end ON events (end_date);
+CREATE TABLE IF NOT EXISTS artists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    link TEXT NOT NULL,
+    bio TEXT
+);
+CREATE INDEX IF NOT EXISTS artists_name ON artists (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS event_artists (
+    artist_id INTEGER NOT NULL,
+    event_url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (artist_id, event_url)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS event_artists_event ON event_artists (event_url);
+"""
+
+_MONTHS = {month: i for i, month in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+# Full or abbreviated month names only, so 'Mayor 5' or 'Decade 3' is not a date
+_DATE = re.compile(r'\b(Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?|'
+                   r'Sept?(?:ember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\b\.?\s+(\d{1,2})'
+                   r'(?:,\s*(\d{4}))?', re.IGNORECASE)
+# 'Through Mar 5, 2020' gives an end but no start
+_OPEN_START = re.compile(r'^\s*(?:through|until|thru)\b', re.IGNORECASE)
+_ARTIST_ID = re.compile(r'/artists/(\d+)')
+_PAGE_ID = re.compile(r'/(\d+)/?(?:[?#]|$)')
+
+
+def date_range(date_text: str) -> Tuple[Optional[datetime.date], Optional[datetime.date]]:
+    """(first day, last day) of the dates in a scraped `date` field
+
+    Handles 'Oct 3, 2019–Feb 1, 2020', 'Oct 3–Dec 5, 2019' (a date missing its
+    year takes the next year given, or the one before if that would put it
+    after the next date) and single dates. (None, None) if no date parses.
+    """
+    dates = []
+    year = None
+    for month, day, match_year in reversed(_DATE.findall(date_text or '')):
+        year = int(match_year) if match_year else year
+        if year is None:
+            continue
+        try:
+            parsed = datetime.date(year, _MONTHS[month[:3].lower()], int(day))
+        except ValueError:
+            continue
+        if dates and not match_year and parsed > dates[-1]:
+            # 'Dec 5–Jan 10, 2020' runs from December 2019
+            try:
+                parsed = parsed.replace(year=parsed.year - 1)
+            except ValueError:
+                continue
+            year = parsed.year
+        dates.append(parsed)
+    if not dates:
+        return None, None
+    start = None if _OPEN_START.match(date_text) and len(dates) == 1 else dates[-1]
+    return start, dates[0]
+
+
+def artist_id(link: str) -> Optional[int]:
+    """The numeric ID in an /artists/<id> link, None for other links"""
+    match = _ARTIST_ID.search(link or '')
+    return int(match.group(1)) if match else None
+
+
+def _isoformat(date: Optional[datetime.date]) -> Optional[str]:
+    return date.isoformat() if date else None
+
+
+def _dicts(cursor) -> List[Dict]:
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+class EventIndex(OutputSink):
+    """SQLite database of parsed event dates and the artists on each page
+
+    As an output sink it takes the same rows as the CSV. A row for a URL
+    already indexed replaces it, so the last row for a URL is the current
+    one here as in the CSV.
+    """
+
+    def __init__(self, path: str = 'main_index.sqlite'):
+        self.path = path
+        self.rows_written = 0
+        self.conn = None
+
+    def open(self) -> 'EventIndex':
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        return self
+
+    def write(self, row: Dict):
+        """Index one scraped row"""
+        url = row['url']
+        start, end = date_range(row.get('date'))
+        page_id = _PAGE_ID.search(url)
+        self.conn.execute(
+            'INSERT OR REPLACE INTO events (url, page_type, id, title, date_text, start_date, end_date) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (url, row.get('type') or '', int(page_id.group(1)) if page_id else None,
+             row.get('title') or '', row.get('date') or '', _isoformat(start), _isoformat(end))
+        )
+        self.conn.execute('DELETE FROM event_artists WHERE event_url = ?', (url,))
+        self.rows_written += 1
+
+        count = row.get('no_artists')
+        count = None if count in (None, '') else count
+        names = split_list(row.get('artist_name'), count)
+        links = split_list(row.get('artist_link'), count)
+        # Bios are only written when some artist has one
+        bios = split_list(row.get('artist_bio'), count) if row.get('artist_bio') else []
+        if len(links) != len(names):
+            return
+        for position, (name, link) in enumerate(zip(names, links)):
+            key = artist_id(link)
+            if key is None:
+                continue
+            bio = bios[position] if len(bios) == len(names) else ''
+            self.conn.execute(
+                'INSERT INTO artists (id, name, link, bio) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET name = excluded.name, link = excluded.link, '
+                'bio = COALESCE(NULLIF(excluded.bio, \'\'), artists.bio)',
+                (key, name, link, bio)
+            )
+            self.conn.execute(
+                'INSERT OR IGNORE INTO event_artists (artist_id, event_url, position) VALUES (?, ?, ?)',
+                (key, url, position)
+            )
+
+    def checkpoint(self):
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def events_for_artist(self, artist: int) -> List[Dict]:
+        """Every indexed page listing an artist, by start date"""
+        cursor = self.conn.execute(
+            'SELECT e.url, e.page_type, e.id, e.title, e.start_date, e.end_date '
+            'FROM event_artists ea JOIN events e ON e.url = ea.event_url '
+            'WHERE ea.artist_id = ? ORDER BY e.start_date, e.url', (artist,))
+        return _dicts(cursor)
+
+    def find_artists(self, name: str) -> List[Dict]:
+        """Artists whose name matches exactly, ignoring case"""
+        cursor = self.conn.execute(
+            'SELECT a.id, a.name, a.link, a.bio, COUNT(ea.event_url) AS events '
+            'FROM artists a LEFT JOIN event_artists ea ON ea.artist_id = a.id '
+            'WHERE a.name = ? COLLATE NOCASE GROUP BY a.id', (name,))
+        return _dicts(cursor)
+
+    def open_between(self, first: datetime.date, last: datetime.date) -> List[Dict]:
+        """Every page whose dates overlap [first, last], by start date
+
+        Pages with only an end date ('Through ...') count as open until then.
+        """
+        cursor = self.conn.execute(
+            'SELECT url, page_type, id, title, start_date, end_date FROM events '
+            'WHERE end_date >= ? AND (start_date <= ? OR start_date IS NULL) '
+            'ORDER BY start_date, url', (first.isoformat(), last.isoformat()))
+        return _dicts(cursor)
+
+    def open_in_month(self, year: int, month: int) -> List[Dict]:
+        """Every page open at some point during a calendar month"""
+        last_day = calendar.monthrange(year, month)[1]
+        return self.open_between(datetime.date(year, month, 1), datetime.date(year, month, last_day))
+
+    def counts(self) -> Dict[str, int]:
+        return {table: self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('events', 'artists', 'event_artists')}
+
+
+def build_index(csv_path: str = 'main.csv', index_path: str = 'main_index.sqlite') -> Dict[str, int]:
+    """Index every row of a CSV, returning the table sizes"""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f, EventIndex(index_path) as index:
+        for row in csv.DictReader(f):
+            index.write(row)
+        index.checkpoint()
+        return index.counts()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Normalized date and artist index')
+    parser.add_argument('--index', default='main_index.sqlite', help='Index database')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    build_parser = subcommands.add_parser('build', help='(Re)build the index from a CSV')
+    build_parser.add_argument('--csv', default='main.csv', help='CSV file to index')
+    artist_parser = subcommands.add_parser('artist', help='Pages listing an artist')
+    artist_parser.add_argument('artist', help='Artist ID (as in /artists/<id>) or exact name')
+    month_parser = subcommands.add_parser('month', help='Pages open during a month')
+    month_parser.add_argument('month', help='YYYY-MM')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        counts = build_index(args.csv, args.index)
+        print(f"Indexed {counts['events']} pages, {counts['artists']} artists and "
+              f"{counts['event_artists']} page-artist links into {args.index}")
+    else:
+        with EventIndex(args.index) as index:
+            if args.command == 'artist':
+                ids = [int(args.artist)] if args.artist.isdigit() else \
+                    [artist['id'] for artist in index.find_artists(args.artist)]
+                events = [event for key in ids for event in index.events_for_artist(key)]
+            else:
+                year, month = (int(part) for part in args.month.split('-'))
+                events = index.open_in_month(year, month)
+        for event in events:
+            print(f"{event['start_date'] or '':10}  {event['end_date'] or '':10}  "
+                  f"{event['page_type']}/{event['id']}  {event['title']}")
+        print(f"{len(events)} pages")
@@ -0,0 +1,119 @@
+"""
+Pipelined crawl: fetcher threads -> parser processes -> single writer
+
+Fetching is I/O-bound and runs on a thread pool sharing one session. Parsing
+is CPU-bound and holds the GIL, so it runs in a ProcessPoolExecutor where it
+can use every core. The caller consumes results on its own thread and is the
+only writer. Both hand-offs are bounded, so a slow stage applies backpressure
+instead of buffering the whole crawl in memory.
+"""
+import multiprocessing
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import extractor
+from rate_limit import TokenBucket
+
+
+def parse_worker(content: bytes, url: str, page_type: str,
+                 groups: Optional[Sequence[extractor.FieldGroup]] = None
+                 ) -> Tuple[Dict, List[Tuple[str, int]], Dict]:
+    """Entry point run inside parser processes: (data, linked calendar pages, timings)
+
+    `groups` are the field groups to run (see extractor.field_groups); they
+    travel with each task, so groups registered in the parent process work
+    in the spawned workers too.
+    """
+    timings = {}
+    data, links = extractor.extract_page(content, url, page_type, timings, groups)
+    return data, links, timings
+
+
+def parse_pool(parse_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """A pool of `parse_workers` parser processes (one per core by default)
+
+    Workers are spawned, not forked: the fetcher threads already exist by
+    the time the pool starts its workers, and forking a threaded process is
+    unsafe. Spawning costs an interpreter start and the parser imports per
+    worker, so a crawl creates one pool and passes it to every run_pipeline.
+    """
+    return ProcessPoolExecutor(max_workers=parse_workers or multiprocessing.cpu_count(),
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+def run_pipeline(fetch: Callable, tasks: Iterable[Tuple[str, int, str]],
+                 concurrency: int = 4, parse_workers: Optional[int] = None,
+                 limiter: Optional[TokenBucket] = None, queue_size: Optional[int] = None,
+                 parse: Callable = parse_worker,
+                 parsers: Optional[ProcessPoolExecutor] = None) -> Iterator[Tuple]:
+    """Run (page_type, id, url) tasks through the fetch and parse stages
+
+    `fetch(url)` must return a FetchResult. Yields (page_type, id, fetch
+    result, data, links, timings) as pages complete; data is None for
+    anything but a 200, and for bodies the fetch flagged as not modified.
+    timings holds the parse and per-field-group seconds (see extract_page).
+    At most `concurrency` requests are in flight, and at most `queue_size`
+    fetched bodies wait for or sit in the parser pool before fetching pauses.
+    `parsers` is a pool from parse_pool() to use instead of starting one; it
+    is left running for the caller's next call.
+    """
+    limiter = limiter or TokenBucket(None)
+    concurrency = max(1, concurrency)
+    parse_workers = parse_workers or multiprocessing.cpu_count()
+    queue_size = queue_size or 2 * parse_workers
+    tasks = iter(tasks)
+
+    def fetch_task(page_type, n, url):
+        limiter.acquire()
+        return fetch(url)
+
+    own_parsers = parsers is None
+    if own_parsers:
+        parsers = parse_pool(parse_workers)
+    fetchers = ThreadPoolExecutor(max_workers=concurrency)
+    fetching = {}
+    parsing = {}
+    waiting = deque()
+    exhausted = False
+    try:
+        while True:
+            # Fetch stage: only start requests while the parse side has room
+            while not exhausted and len(fetching) < concurrency and \
+                    len(waiting) + len(parsing) < queue_size:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    break
+                fetching[fetchers.submit(fetch_task, *task)] = task
+
+            # Parse stage: hand waiting bodies to the pool, one per free slot
+            while waiting and len(parsing) < parse_workers:
+                (page_type, n, url), result = waiting.popleft()
+                future = parsers.submit(parse, result.content, url, page_type)
+                parsing[future] = (page_type, n, result)
+
+            if not fetching and not parsing:
+                if exhausted and not waiting:
+                    break
+                continue
+
+            done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetching:
+                    task = fetching.pop(future)
+                    result = future.result()
+                    if result.status_code == 200 and not result.not_modified:
+                        waiting.append((task, result))
+                    else:
+                        yield task[0], task[1], result, None, [], {}
+                else:
+                    page_type, n, result = parsing.pop(future)
+                    yield (page_type, n, result) + future.result()
+    finally:
+        fetchers.shutdown(wait=True, cancel_futures=True)
+        if own_parsers:
+            parsers.shutdown(wait=True, cancel_futures=True)
+        else:
+            for future in parsing:
+                future.cancel()
@@ -0,0 +1,204 @@
+"""
+Request rate limiting, retry backoff and adaptive rate control
+
+TokenBucket caps the request rate across all fetch workers. RetryQueue holds
+failed pages until their backoff (or the server's Retry-After) has elapsed,
+and AIMDController moves the bucket's rate towards the fastest the site
+tolerates: it adds to the rate while latency and errors stay healthy and
+multiplies it down as soon as the site throttles.
+"""
+import heapq
+import itertools
+import random
+import statistics
+import threading
+import time
+from typing import Hashable, Iterable, Iterator, List, Optional
+
+# Statuses worth retrying within a run; the rest are final or retried next run
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket that caps the global request rate"""
+
+    def __init__(self, rate: Optional[float], capacity: float = 1.0):
+        # rate is in requests per second; None or 0 disables limiting
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: Optional[float]):
+        """Change the refill rate, keeping tokens accrued so far"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def _refill(self, now: float):
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Hold every caller for `seconds`, e.g. while the server asks us to back off"""
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then consume them"""
+        if not self.rate and self._resume_at <= time.monotonic():
+            # Unlimited and not paused: no need for the lock
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            wait = self._resume_at - now
+            if self.rate:
+                self._refill(now)
+                # Tokens may go negative: the debt is a reservation that makes
+                # later callers queue behind this one instead of racing it
+                self._tokens -= tokens
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+def is_retryable(status_code: Optional[int]) -> bool:
+    """Whether a result is a transient failure: no response at all, throttling or a 5xx"""
+    return status_code is None or status_code in RETRYABLE_STATUSES
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for the `attempt`-th retry (from 0)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RetryQueue:
+    """Failed work items waiting for their backoff to elapse
+
+    defer() schedules a retry after max(backoff, Retry-After). Items that
+    used up `max_attempts`, or whose Retry-After exceeds `max_delay`, are
+    refused and left for the next run.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._heap = []
+        self._attempts = {}
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def defer(self, key: Hashable, retry_after: Optional[float] = None) -> bool:
+        """Schedule `key` for another attempt; False if it should not be retried this run"""
+        attempt = self._attempts.get(key, 0)
+        if attempt >= self.max_attempts or (retry_after or 0) > self.max_delay:
+            return False
+        self._attempts[key] = attempt + 1
+        delay = max(backoff_delay(attempt, self.base_delay, self.max_delay), retry_after or 0)
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), key))
+        return True
+
+    def ready(self) -> List[Hashable]:
+        """Pop every item whose delay has elapsed"""
+        now = time.monotonic()
+        items = []
+        while self._heap and self._heap[0][0] <= now:
+            items.append(heapq.heappop(self._heap)[2])
+        return items
+
+    def wait(self):
+        """Sleep until the next item is ready"""
+        if self._heap:
+            time.sleep(max(0.0, self._heap[0][0] - time.monotonic()))
+
+    def interleave(self, keys: Iterable[Hashable]) -> Iterator[Hashable]:
+        """Yield `keys`, slipping in retries as they become ready"""
+        for key in keys:
+            yield from self.ready()
+            yield key
+        yield from self.ready()
+
+
+class AIMDController:
+    """Adjusts a TokenBucket's rate from response statuses and latencies
+
+    Every `window` responses, the rate goes up by `increase` requests/sec if
+    the error rate stayed under `max_error_rate` and the 90th percentile
+    latency under `latency_factor` times the best window median seen so far.
+    Otherwise it is multiplied by `decrease`. An explicit throttle (a 429, or
+    a 503 with Retry-After) cuts the rate at once, at most once per window,
+    and its Retry-After pauses the bucket for that long (up to `max_pause`).
+    Other 5xx responses only count towards the window's error rate.
+    """
+
+    def __init__(self, limiter: TokenBucket, min_rate: float = 0.2, max_rate: float = 20.0,
+                 increase: float = 1.0, decrease: float = 0.5, window: int = 20,
+                 max_error_rate: float = 0.05, latency_factor: float = 3.0, max_pause: float = 60.0):
+        self.limiter = limiter
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.latency_factor = latency_factor
+        self.max_pause = max_pause
+        self.rate = min(max_rate, max(min_rate, limiter.rate or min_rate))
+        limiter.set_rate(self.rate)
+        self.baseline_latency = None
+        self.increases = 0
+        self.decreases = 0
+        self._latencies = []
+        self._errors = 0
+        self._since_decrease = window
+        self._lock = threading.Lock()
+
+    def _set_rate(self, rate: float):
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+        self.limiter.set_rate(self.rate)
+
+    def _back_off(self):
+        if self._since_decrease >= self.window:
+            self._set_rate(self.rate * self.decrease)
+            self.decreases += 1
+            self._since_decrease = 0
+
+    def observe(self, status_code: Optional[int], latency: float, retry_after: Optional[float] = None):
+        """Feed one response (status None for a failed request) into the controller"""
+        with self._lock:
+            self._since_decrease += 1
+            if status_code == 429 or (status_code == 503 and retry_after is not None):
+                self._back_off()
+                if retry_after:
+                    self.limiter.pause(min(retry_after, self.max_pause))
+            if status_code is None or status_code >= 500 or status_code == 429:
+                self._errors += 1
+            else:
+                self._latencies.append(latency)
+
+            if len(self._latencies) + self._errors < self.window:
+                return
+            error_rate = self._errors / (len(self._latencies) + self._errors)
+            healthy = error_rate <= self.max_error_rate
+            if self._latencies:
+                median = statistics.median(self._latencies)
+                if self.baseline_latency is None or median < self.baseline_latency:
+                    self.baseline_latency = median
+                p90 = sorted(self._latencies)[int(0.9 * (len(self._latencies) - 1))]
+                healthy = healthy and p90 <= self.latency_factor * self.baseline_latency
+            self._latencies = []
+            self._errors = 0
+            if healthy:
+                self._set_rate(self.rate + self.increase)
+                self.increases += 1
+            else:
+                self._back_off()
@@ -0,0 +1,108 @@
+"""
+Compact in-memory form of a scraped row
+
+A row as a dict costs a 37-slot hash table plus a string object per cell,
+and promo_link_data repeats every promo column as JSON. PageRecord keeps the
+same data in fixed slots: counts as small ints, repeated values (page type,
+locations, promos, ...) interned so all rows share one copy, and the
+promos stored once as tuples from which both promo_link_data
+and the pipe-joined promo columns are rebuilt. Use it wherever many rows are
+held at once (rows a refresh compares against, shard merges).
+
+to_row() gives back exactly the row it was built from, as the CSV writes it.
+"""
+import json
+import sys
+from typing import Dict, Optional, Tuple
+
+from sinks import COUNT_FIELDS, FIELDNAMES, PROMO_FIELDS
+
+# Short values shared by many rows
+INTERNED_FIELDS = {'type', 'date', 'location', 'location_tag', 'location_donor',
+                   'location_selbst', 'sponsor_text', 'credits'}
+PROMO_KEYS = tuple(PROMO_FIELDS.values())
+
+STORED_FIELDS = tuple(field for field in FIELDNAMES
+                      if field not in PROMO_FIELDS and field != 'promo_link_data')
+
+
+def _compact_count(value):
+    """Counts as ints when that reproduces the cell exactly"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit() and str(int(value)) == value:
+        return int(value)
+    return value
+
+
+def _compact_promos(row: Dict) -> Tuple[Tuple[Tuple[str, ...], ...], Optional[Dict[str, str]]]:
+    """(promos as tuples, None), or ((), raw cells) if they don't round-trip"""
+    raw = {field: row.get(field) or '' for field in PROMO_FIELDS}
+    raw['promo_link_data'] = row.get('promo_link_data') or ''
+    if not any(raw.values()):
+        return (), None
+    try:
+        parsed = json.loads(raw['promo_link_data'])
+        # The same promos (magazine features, related events) recur on many pages
+        promos = tuple(tuple(sys.intern(promo[key]) for key in PROMO_KEYS) for promo in parsed)
+    except (ValueError, TypeError, KeyError):
+        return (), raw
+    if _promo_cells(promos) != raw:
+        return (), raw
+    return promos, None
+
+
+def _promo_cells(promos: Tuple[Tuple[str, ...], ...]) -> Dict[str, str]:
+    """The promo columns and promo_link_data as the extractor writes them"""
+    if not promos:
+        return dict.fromkeys(list(PROMO_FIELDS) + ['promo_link_data'], '')
+    cells = {field: '|'.join(promo[i] for promo in promos) for i, field in enumerate(PROMO_FIELDS)}
+    cells['promo_link_data'] = json.dumps([dict(zip(PROMO_KEYS, promo)) for promo in promos])
+    return cells
+
+
+class PageRecord:
+    """One scraped page in fixed slots; see the module docstring"""
+
+    __slots__ = STORED_FIELDS + ('promos', 'promo_cells')
+
+    @classmethod
+    def from_row(cls, row: Dict) -> 'PageRecord':
+        """Build from a scraped row or one read back from the CSV"""
+        record = cls.__new__(cls)
+        for field in STORED_FIELDS:
+            value = row.get(field)
+            if value is None:
+                value = ''
+            elif field in COUNT_FIELDS:
+                value = _compact_count(value)
+            elif field in INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(record, field, value)
+        record.promos, record.promo_cells = _compact_promos(row)
+        return record
+
+    def to_row(self) -> Dict:
+        """The row as a dict in FIELDNAMES order, ready for CSVSink.write()"""
+        row = {field: getattr(self, field) for field in STORED_FIELDS}
+        row.update(self.promo_cells or _promo_cells(self.promos))
+        return {field: row[field] for field in FIELDNAMES}
+
+    def get(self, field: str, default=None):
+        """Look up one cell by column name, like dict.get on the row"""
+        if field in PROMO_FIELDS or field == 'promo_link_data':
+            return (self.promo_cells or _promo_cells(self.promos))[field]
+        return getattr(self, field, default)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PageRecord) and self.to_row() == other.to_row()
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def __repr__(self) -> str:
+        return f'PageRecord({self.url!r})'
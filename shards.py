@@ -0,0 +1,171 @@
+"""
+Sharded crawls: deterministic partitioning of the page space, and merging
+
+Several scraper processes (or machines) can share one crawl by each taking a
+shard (index, count) of the (page_type, id) space. A page's shard is a stable
+hash of its key, so every worker agrees on who owns what without talking to
+the others, and dense and sparse ID ranges are spread evenly. Each shard
+writes its own CSV and crawl state; `merge` combines them into the canonical
+main.csv and crawl_state.sqlite.
+
+    python shards.py crawl --index 0 --count 4 --start 1 --end 8000
+    python shards.py merge --count 4
+"""
+import argparse
+import csv
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from crawl_state import CrawlState
+from records import PageRecord
+from sinks import FIELDNAMES, CSVSink
+
+
+def shard_of(page_type: str, page_id: int, count: int) -> int:
+    """The shard in [0, count) that owns a page"""
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(f'{page_type}/{page_id}'.encode('ascii')) % count
+
+
+def validate_shard(index: int, count: int):
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {index} of {count}")
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """main.csv -> main.shard-0-of-4.csv"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.shard-{index}-of-{count}{ext}'
+
+
+def shard_paths(count: int, csv_path: str = 'main.csv',
+                state_path: str = 'crawl_state.sqlite') -> List[Tuple[str, str]]:
+    """(csv, state) paths of every shard of a `count`-way crawl"""
+    return [(shard_path(csv_path, i, count), shard_path(state_path, i, count)) for i in range(count)]
+
+
+def fetch_times(state_path: Optional[str]) -> Dict[str, float]:
+    """{url: fetched_at} of the scraped pages in a crawl state"""
+    if state_path is None:
+        return {}
+    state = CrawlState(state_path)
+    try:
+        return {url: fetched_at or 0.0 for url, (fetched_at, _) in state.scraped().items()}
+    finally:
+        state.close()
+
+
+def merge_shards(inputs: List[Tuple[str, Optional[str]]], output: str = 'main.csv',
+                 state_path: str = 'crawl_state.sqlite') -> Dict[str, int]:
+    """Merge (csv, state) pairs into one CSV and one crawl state
+
+    Rows are deduplicated by URL. When several inputs have a row for the same
+    URL, the one whose crawl state records the latest fetch wins; within one
+    CSV the last row for a URL is its current one (see refresh runs). If
+    `output` already exists it takes part in the merge as the oldest input,
+    so shards can be merged into an existing dataset (with `state_path` if
+    that exists too, otherwise as rows with no known fetch time).
+
+    Both outputs are written to temporary files and renamed into place, the
+    crawl state first. A merge interrupted before that leaves the previous
+    dataset intact; one interrupted between the two renames leaves the new
+    state next to the old CSV, whose bytes do not match the state's
+    checkpoint, so the next scrape_all re-indexes the CSV rather than cutting
+    it back to the merged offset.
+    """
+    if os.path.exists(output):
+        base = (output, state_path if os.path.exists(state_path) else None)
+        inputs = [base] + [pair for pair in inputs if pair[0] != output]
+    missing = [path for pair in inputs for path in pair if path and not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Missing shard files: {', '.join(missing)}")
+
+    # url -> (fetched_at, input position, row), rows held compactly
+    merged = {}
+    rows_read = 0
+    for position, (csv_path, input_state) in enumerate(inputs):
+        fetched = fetch_times(input_state)
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != FIELDNAMES:
+                # e.g. a crawl with `fields`: its blank columns would be merged as scraped
+                raise ValueError(f"{csv_path} does not have the full set of columns; refusing to merge it")
+            for row in reader:
+                rows_read += 1
+                key = (fetched.get(row['url'], 0.0), position)
+                if row['url'] not in merged or key >= merged[row['url']][:2]:
+                    merged[row['url']] = key + (PageRecord.from_row(row),)
+
+    tmp_csv = output + '.tmp'
+    tmp_state = state_path + '.tmp'
+    for path in (tmp_csv, tmp_state):
+        if os.path.exists(path):
+            os.remove(path)
+    sink = CSVSink(tmp_csv).open()
+    for _, _, record in sorted(merged.values(), key=lambda entry: entry[:2]):
+        sink.write(record.to_row())
+    offset = sink.offset
+    digest = sink.digest()
+    sink.close()
+
+    state = CrawlState(tmp_state)
+    for _, input_state in inputs:
+        if input_state:
+            state.merge(input_state)
+    state.set_csv_checkpoint(offset, digest)
+    state.commit()
+    state.close()
+
+    if os.path.exists(state_path):
+        # Closing the last connection folds the WAL into the database and
+        # deletes it, so no stale -wal file is applied to the merged state
+        CrawlState(state_path).close()
+    os.replace(tmp_state, state_path)
+    os.replace(tmp_csv, output)
+    return {'inputs': len(inputs), 'rows_read': rows_read, 'rows_written': len(merged)}
+
+
+def crawl_shard(index: int, count: int, **kwargs):
+    """Run scrape_all over one shard with its own CSV and crawl state"""
+    from moma_scraper import MoMAScraper
+
+    validate_shard(index, count)
+    return MoMAScraper().scrape_all(shard=(index, count), **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sharded crawl tools')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = subcommands.add_parser('crawl', help='Crawl one shard')
+    crawl_parser.add_argument('--index', type=int, required=True, help='This worker\'s shard, from 0')
+    crawl_parser.add_argument('--count', type=int, required=True, help='Number of shards')
+    crawl_parser.add_argument('--start', type=int, default=1, help='First ID')
+    crawl_parser.add_argument('--end', type=int, default=8000, help='Last ID')
+    crawl_parser.add_argument('--delay', type=float, default=0.5, help='Seconds between requests')
+    crawl_parser.add_argument('--concurrency', type=int, default=1, help='Concurrent requests')
+    crawl_parser.add_argument('--discover', action='store_true', help='Estimate live ID ranges first')
+
+    merge_parser = subcommands.add_parser('merge', help='Merge shard outputs into main.csv')
+    merge_parser.add_argument('--count', type=int, default=None,
+                              help='Number of shards (merges main.shard-*-of-COUNT.csv)')
+    merge_parser.add_argument('--inputs', nargs='*', default=None, metavar='CSV:STATE',
+                              help='Explicit csv:state pairs to merge instead')
+    merge_parser.add_argument('--output', default='main.csv', help='Merged CSV')
+    merge_parser.add_argument('--state', default='crawl_state.sqlite', help='Merged crawl state')
+    args = parser.parse_args()
+
+    if args.command == 'crawl':
+        crawl_shard(args.index, args.count, start=args.start, end=args.end, delay=args.delay,
+                    concurrency=args.concurrency, discover=args.discover)
+    elif args.command == 'merge':
+        if args.inputs:
+            pairs = [tuple(pair.rsplit(':', 1)) for pair in args.inputs]
+        elif args.count:
+            pairs = shard_paths(args.count)
+        else:
+            parser.error('merge needs --count or --inputs')
+        stats = merge_shards(pairs, args.output, args.state)
+        print(f"Merged {stats['rows_read']} rows from {stats['inputs']} inputs "
+              f"into {stats['rows_written']} rows in {args.output}")
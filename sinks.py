@@ -0,0 +1,395 @@
+"""
+Output sinks for scraped rows
+
+Every sink has the same small interface (open, write, checkpoint, close) so
+scrape_all can feed several backends at once. CSVSink writes main.csv;
+ParquetSink writes a typed, columnar copy for analytics.
+"""
+import abc
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+# Imported on first use by load_pyarrow(), so CSV-only runs don't pay for it
+pyarrow = None
+
+
+def load_pyarrow():
+    """Import pyarrow (and pyarrow.parquet) if not already done"""
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output needs the 'pyarrow' package") from None
+    return pyarrow
+
+FIELDNAMES = [
+    'url', 'title', 'date', 'location', 'type', 'artist_name', 'no_artists',
+    'artist_bio', 'artist_link', 'artist_image', 'artist_no_works',
+    'sponsor_text', 'no_sponsor_paragraphs', 'promo_link', 'no_promos',
+    'promo_link_data', 'promo_image', 'promo_category', 'promo_title',
+    'promo_description', 'promo_date', 'promo_author', 'video', 'no_videos',
+    'no_pubs', 'event_catch_all', 'no_events', 'description', 'credits',
+    'location_tag', 'location_donor', 'location_selbst', 'no_locations',
+    'miscellaneous_third_uneven', 'works_online_links', 'no_works_online',
+    'works_online_text'
+]
+
+
+def last_complete_record_offset(path: str, start: int = 0, chunk_size: int = 1 << 20) -> int:
+    """Return the byte offset just past the last complete CSV record in `path`
+
+    A record ends at a newline outside of quotes. Escaped quotes are doubled,
+    so quote parity tells whether a newline is inside a field. The file is
+    streamed in chunks, so memory stays flat regardless of its size. `start`
+    must be a record boundary; only the bytes after it are scanned.
+    """
+    offset = start
+    boundary = start
+    in_quotes = False
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            start = 0
+            while True:
+                quote = chunk.find(b'"', start)
+                newline = chunk.find(b'\n', start)
+                if newline == -1 and quote == -1:
+                    break
+                if quote != -1 and (newline == -1 or quote < newline):
+                    in_quotes = not in_quotes
+                    start = quote + 1
+                else:
+                    if not in_quotes:
+                        boundary = offset + newline + 1
+                    start = newline + 1
+            offset += len(chunk)
+    return boundary
+
+
+# How much of the file before a checkpoint offset identifies it (see checkpoint_digest)
+DIGEST_BYTES = 4096
+
+
+def checkpoint_digest(path: str, offset: int) -> str:
+    """Hash of the bytes just before `offset`, the end of the last checkpointed record
+
+    Stored with the offset, it tells whether the file is still the one the
+    offset was taken from: one rewritten since (save_to_csv, a shard merge, a
+    hand edit) almost surely has other bytes there, even if it grew.
+    """
+    start = max(0, offset - DIGEST_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def matches_checkpoint(path: str, offset: int, digest: Optional[str]) -> bool:
+    """Whether `path` still holds the file a checkpoint (offset, digest) was taken from
+
+    The offset must fall inside the file, on a record boundary, with the
+    same bytes before it. States written before digests were recorded have
+    none; for those only the first two are checked.
+    """
+    if offset > os.path.getsize(path):
+        return False
+    if offset > 0:
+        with open(path, 'rb') as f:
+            f.seek(offset - 1)
+            if f.read(1) != b'\n':
+                return False
+    return digest is None or checkpoint_digest(path, offset) == digest
+
+
+# Columns typed as integers in columnar output
+COUNT_FIELDS = [
+    'no_artists', 'no_sponsor_paragraphs', 'no_promos', 'no_videos', 'no_pubs',
+    'no_events', 'no_locations', 'no_works_online'
+]
+
+# Pipe-joined columns stored as list<string>, with the count column that says
+# how many items they hold (None when empty items are dropped on extraction)
+LIST_FIELDS = {
+    'artist_name': 'no_artists',
+    'artist_link': 'no_artists',
+    'artist_no_works': None,
+    'sponsor_text': 'no_sponsor_paragraphs',
+    'video': None,
+    'event_catch_all': 'no_events',
+    'location_tag': 'no_locations',
+    'works_online_links': None,
+    'works_online_text': 'no_works_online',
+}
+
+# Promo columns come from promo_link_data, which holds the exact per-promo values
+PROMO_FIELDS = {
+    'promo_title': 'title', 'promo_description': 'description', 'promo_link': 'link',
+    'promo_category': 'category', 'promo_date': 'date', 'promo_author': 'author',
+    'promo_image': 'image',
+}
+
+
+class OutputSink(abc.ABC):
+    """Interface shared by all output backends; subclasses implement write()"""
+
+    rows_written = 0
+
+    def open(self) -> 'OutputSink':
+        return self
+
+    @abc.abstractmethod
+    def write(self, row: Dict):
+        """Append one row"""
+
+    def checkpoint(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> 'OutputSink':
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CSVSink(OutputSink):
+    """Append-only CSV writer that only ever writes new rows
+
+    Rows are appended to the open file and flushed + fsynced every
+    `checkpoint_every` rows (or on an explicit checkpoint), so a checkpoint
+    costs only the rows written since the previous one. On open, a trailing
+    row left half-written by a crash is truncated away.
+    """
+
+    def __init__(self, path: str = 'main.csv', fieldnames: Optional[List[str]] = None,
+                 checkpoint_every: int = 30):
+        self.path = path
+        self.fieldnames = fieldnames or FIELDNAMES
+        self.checkpoint_every = checkpoint_every
+        self.rows_written = 0
+        self._pending = 0
+        self._file = None
+        self._writer = None
+
+    def open(self, checkpoint: int = 0) -> 'CSVSink':
+        """Open the file for appending, recovering a truncated trailing row
+
+        `checkpoint` is a byte offset known to be a record boundary (e.g. the
+        size at the last committed checkpoint); only the bytes after it are
+        scanned for the end of the last complete record.
+        """
+        needs_header = True
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            size = os.path.getsize(self.path)
+            boundary = last_complete_record_offset(self.path, min(checkpoint, size))
+            if boundary < size:
+                print(f"Recovering {self.path}: dropping a partial row of {size - boundary} bytes")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(boundary)
+            needs_header = boundary == 0
+
+        if not needs_header:
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                header = next(csv.reader(f), [])
+            if header != self.fieldnames:
+                raise ValueError(f"{self.path} has unexpected columns; refusing to append")
+
+        self._file = open(self.path, 'a', encoding='utf-8', newline='')
+        # A narrower column list (see extractor.select_fields) drops the rest
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames,
+                                      extrasaction='raise' if self.fieldnames == FIELDNAMES else 'ignore')
+        if needs_header:
+            self._writer.writeheader()
+            self.checkpoint()
+        return self
+
+    def write(self, row: Dict):
+        """Append one row, checkpointing when the interval is reached"""
+        self._writer.writerow(row)
+        self.rows_written += 1
+        self._pending += 1
+        if self._pending >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Flush buffered rows and fsync them to disk"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    @property
+    def offset(self) -> int:
+        """Byte size of the file as of the last write"""
+        return self._file.tell()
+
+    def rows_after(self, offset: int) -> List[Dict]:
+        """The complete rows written between `offset`, a record boundary, and the current offset"""
+        self._file.flush()
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            tail = f.read(self.offset - offset).decode('utf-8')
+        return list(csv.DictReader(io.StringIO(tail, newline=''), fieldnames=self.fieldnames))
+
+    def digest(self) -> str:
+        """checkpoint_digest() of the file at its current offset"""
+        self._file.flush()
+        return checkpoint_digest(self.path, self.offset)
+
+    def close(self):
+        if self._file is not None:
+            self.checkpoint()
+            self._file.close()
+            self._file = None
+
+
+def compact_csv(path: str) -> int:
+    """Rewrite a CSV with one row per URL, returning how many rows were dropped
+
+    Refresh runs append a page's new row after its old one. Each URL keeps
+    its first position and takes its last row, so the file stays in crawl
+    order. Only the rows of URLs that appear more than once are held in
+    memory, as PageRecords unless the file has columns of its own. The result
+    is written to a temporary file and renamed into place.
+    """
+    from records import PageRecord
+
+    seen = set()
+    latest = {}
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        as_record = set(reader.fieldnames or ()) <= set(FIELDNAMES)
+        for row in reader:
+            if row['url'] in seen:
+                latest[row['url']] = PageRecord.from_row(row) if as_record else row
+            seen.add(row['url'])
+    if not latest:
+        return 0
+
+    dropped = 0
+    tmp_path = path + '.tmp'
+    with open(path, 'r', encoding='utf-8', newline='') as f, \
+            open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+        reader = csv.DictReader(f)
+        # A narrowed CSV (see extractor.select_fields) has only some of a record's columns
+        writer = csv.DictWriter(out, fieldnames=reader.fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        written = set()
+        for row in reader:
+            url = row['url']
+            if url in written:
+                dropped += 1
+                continue
+            if url in latest:
+                row = latest[url].to_row() if as_record else latest[url]
+                written.add(url)
+            writer.writerow(row)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+    return dropped
+
+
+def split_list(value, count=None) -> List[str]:
+    """Turn a pipe-joined cell back into a list, using its count column when known"""
+    value = value or ''
+    if count is not None:
+        return value.split('|') if int(count or 0) > 0 else []
+    return value.split('|') if value else []
+
+
+def columnar_row(row: Dict) -> Dict:
+    """Convert a scraped row (or one read back from main.csv) to typed columns"""
+    typed = dict(row)
+    for field in COUNT_FIELDS:
+        typed[field] = int(row.get(field) or 0)
+    for field, count_field in LIST_FIELDS.items():
+        typed[field] = split_list(row.get(field), typed[count_field] if count_field else None)
+    promos = json.loads(row['promo_link_data']) if row.get('promo_link_data') else []
+    for field, key in PROMO_FIELDS.items():
+        typed[field] = [promo[key] for promo in promos]
+    typed['promo_link_data'] = promos
+    return typed
+
+
+def parquet_schema():
+    load_pyarrow()
+    promo = pyarrow.struct([(key, pyarrow.string()) for key in PROMO_FIELDS.values()])
+    fields = []
+    for name in FIELDNAMES:
+        if name in COUNT_FIELDS:
+            fields.append((name, pyarrow.int32()))
+        elif name in LIST_FIELDS or name in PROMO_FIELDS:
+            fields.append((name, pyarrow.list_(pyarrow.string())))
+        elif name == 'promo_link_data':
+            fields.append((name, pyarrow.list_(promo)))
+        else:
+            fields.append((name, pyarrow.string()))
+    return pyarrow.schema(fields)
+
+
+class ParquetSink(OutputSink):
+    """Columnar output: one Parquet part file per run under `path`
+
+    Counts are int32 columns and multi-value fields are list<string> (promo
+    details a list of structs), so loads can prune columns and skip string
+    re-parsing. Rows are buffered and written as a row group every
+    `row_group_size` rows. Parquet files cannot be appended to, so each run
+    adds a new part file; read the directory as one dataset. A part is only
+    readable once closed. If a run is killed, rebuild the copy from main.csv
+    with export_parquet().
+    """
+
+    def __init__(self, path: str = 'main.parquet', row_group_size: int = 5000):
+        load_pyarrow()
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = parquet_schema()
+        self.rows_written = 0
+        self._buffer = []
+        self._writer = None
+
+    def open(self) -> 'ParquetSink':
+        os.makedirs(self.path, exist_ok=True)
+        part = os.path.join(self.path, f'part-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.parquet')
+        self._writer = pyarrow.parquet.ParquetWriter(part, self.schema, compression='zstd')
+        return self
+
+    def write(self, row: Dict):
+        self._buffer.append(columnar_row(row))
+        self.rows_written += 1
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            table = pyarrow.Table.from_pylist(self._buffer, schema=self.schema)
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+            self._buffer = []
+
+    def close(self):
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+
+def export_parquet(csv_path: str = 'main.csv', path: str = 'main.parquet') -> int:
+    """Rebuild the Parquet copy from main.csv, streaming it row by row"""
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            if name.endswith('.parquet'):
+                os.remove(os.path.join(path, name))
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f, ParquetSink(path) as sink:
+        for row in csv.DictReader(f):
+            sink.write(row)
+    return sink.rows_written
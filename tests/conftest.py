@@ -0,0 +1,44 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockSite, start_server  # noqa: E402
+from moma_scraper import MoMAScraper  # noqa: E402
+
+MAX_IDS = {'film': 20, 'galleries': 10, 'exhibitions': 20}
+
+
+def read_rows(path='main.csv'):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture
+def site():
+    """A local mock calendar site; yields (MockSite, base URL)"""
+    mock = MockSite(max_ids=dict(MAX_IDS), latency_ms=0)
+    server, url = start_server(mock)
+    yield mock, url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so main.csv and crawl_state.sqlite land there"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def crawl(site, workdir):
+    """scrape_all over the mock site in `workdir`: crawl(scraper=None, **options)"""
+    def crawl(scraper=None, **kwargs):
+        options = dict(start=1, end=20, delay=0, follow_links=False)
+        options.update(kwargs)
+        return (scraper or MoMAScraper(base_url=site[1])).scrape_all(**options)
+    return crawl
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import archive
+from archive import HTMLArchive, reextract
+from conftest import read_rows
+
+
+def blobs(root):
+    return [name for _, _, names in os.walk(os.path.join(root, 'objects')) for name in names]
+
+
+def test_put_and_get_deduplicate_by_content(tmp_path):
+    store = HTMLArchive(str(tmp_path / 'archive'), codec='gzip')
+    store.put('https://www.moma.org/calendar/film/1', 'film', 1, b'<html>same</html>')
+    store.put('https://www.moma.org/calendar/film/2', 'film', 2, b'<html>same</html>')
+    assert store.get('https://www.moma.org/calendar/film/2') == b'<html>same</html>'
+    assert store.get('https://www.moma.org/calendar/film/3') is None
+    assert len(blobs(store.root)) == 1
+    store.close()
+
+
+def test_entries_follow_crawl_order(tmp_path):
+    store = HTMLArchive(str(tmp_path / 'archive'), codec='gzip')
+    for page_type, n in [('exhibitions', 1), ('galleries', 2), ('film', 2), ('exhibitions', 2), ('film', 1)]:
+        store.put(f'https://www.moma.org/calendar/{page_type}/{n}', page_type, n, page_type.encode())
+    assert [(page_type, n) for _, page_type, n, _, _ in store.entries()] == [
+        ('film', 1), ('exhibitions', 1), ('film', 2), ('galleries', 2), ('exhibitions', 2)]
+    assert [page_type for _, page_type, _, _, _ in store.entries(['exhibitions', 'film'])] == [
+        'exhibitions', 'film', 'exhibitions', 'film']
+    store.close()
+
+
+def test_zstd_needs_the_optional_package(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'zstandard', None)
+    assert HTMLArchive(str(tmp_path / 'gz')).codec == 'gzip'
+    with pytest.raises(ValueError):
+        HTMLArchive(str(tmp_path / 'zst'), codec='zstd')
+
+
+def test_zstd_round_trip(tmp_path):
+    pytest.importorskip('zstandard')
+    store = HTMLArchive(str(tmp_path / 'archive'))
+    assert store.codec == 'zstd'
+    store.put('https://www.moma.org/calendar/film/1', 'film', 1, b'<html>page</html>')
+    assert store.get('https://www.moma.org/calendar/film/1') == b'<html>page</html>'
+    store.close()
+
+
+def test_reextract_reproduces_the_crawled_csv(crawl):
+    crawl(archive_dir='archive')
+    rows = read_rows()
+    assert rows
+    assert reextract('archive', 'reextracted.csv', workers=2) == len(rows)
+    assert read_rows('reextracted.csv') == rows
@@ -0,0 +1,103 @@
+import csv
+import sqlite3
+
+from archive import HTMLArchive
+from changes import DAY, due_pages
+from conftest import read_rows
+from crawl_state import CrawlState
+from mock_server import MockSite
+from moma_scraper import CrawlRun, FetchResult
+from records import PageRecord
+from sinks import CSVSink, compact_csv
+
+
+def test_due_pages_most_overdue_first():
+    now = 1000 * DAY
+    pages = [
+        ('running', now - 2 * DAY, now + DAY),      # 2 days since a daily check
+        ('fresh', now - 3600, now + DAY),          # checked an hour ago
+        ('undated', now - 45 * DAY, None),          # 1.5 intervals of 30 days
+        ('never', None, None),
+    ]
+    assert due_pages(pages, now) == ['never', 'running', 'undated']
+
+
+def test_refresh_due_is_scheduled_from_the_state(site, crawl):
+    _, url = site
+    first = crawl()
+    conn = sqlite3.connect('crawl_state.sqlite')
+    with conn:
+        assert conn.execute('SELECT COUNT(*) FROM pages WHERE status = ? AND event_end IS NOT NULL',
+                            ('ok',)).fetchone()[0] == first.new_pages_found
+        stale = [row[0] for row in conn.execute(
+            "SELECT url FROM pages WHERE status = 'ok' ORDER BY page_type, id LIMIT 5")]
+        conn.executemany('UPDATE pages SET fetched_at = 0 WHERE url = ?', ((u,) for u in stale))
+    conn.close()
+
+    run = crawl(refresh_due=True)
+    assert run.pages_unchanged == len(stale)
+    assert run.new_pages_found == 0
+
+
+def test_old_states_get_event_ends_from_the_csv(crawl):
+    crawl()
+    conn = sqlite3.connect('crawl_state.sqlite')
+    with conn:
+        # As written before event_end was recorded
+        conn.execute('ALTER TABLE pages DROP COLUMN event_end')
+    conn.close()
+    state = CrawlState('crawl_state.sqlite')
+    assert state.event_ends_missing()
+    state.close()
+
+    crawl(refresh_due=True)
+    state = CrawlState('crawl_state.sqlite')
+    assert not state.event_ends_missing()
+    assert all(end is not None for *_, end in state.scraped_pages())
+    state.close()
+
+
+def test_markup_only_change_is_archived(workdir):
+    sink = CSVSink('main.csv').open()
+    state = CrawlState('crawl_state.sqlite')
+    archive = HTMLArchive('archive')
+    page = 'https://www.moma.org/calendar/film/1'
+    row = {'url': page, 'type': 'film', 'title': 'A film', 'date': 'Oct 3, 2019'}
+    run = CrawlRun(sink, state, archive, previous={page: PageRecord.from_row(row)})
+    result = FetchResult(page, 200, b'<html>new markup</html>', {}, content_hash='new',
+                         elapsed=0.1)
+    assert run.handle('film', 1, result, dict(row))
+    assert run.pages_unchanged == 1
+    assert archive.get(page) == b'<html>new markup</html>'
+    run.close()
+    state.close()
+
+
+def test_refresh_keeps_one_row_per_url(site, crawl):
+    mock, url = site
+    crawl()
+    before = read_rows()
+    page = before[0]['url']
+    page_type, page_id = page.rsplit('/', 2)[1:]
+    body = mock.body(page_type, int(page_id))
+    mock.body = lambda t, n: body.replace(b'number', b'renamed') if (t, n) == (page_type, int(page_id)) \
+        else MockSite.body(mock, t, n)
+
+    run = crawl(refresh=True)
+    assert run.new_pages_found
+    after = read_rows()
+    assert [row['url'] for row in after] == [row['url'] for row in before]
+    assert after[0]['title'] != before[0]['title']
+    assert after[1:] == before[1:]
+    assert crawl().new_pages_found == 0
+
+
+def test_compact_csv_keeps_first_position_and_last_row(workdir):
+    rows = [{'url': 'a', 'title': '1'}, {'url': 'b', 'title': '1'}, {'url': 'a', 'title': '2'}]
+    with open('narrow.csv', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['url', 'title'])
+        writer.writeheader()
+        writer.writerows(rows)
+    assert compact_csv('narrow.csv') == 1
+    assert read_rows('narrow.csv') == [{'url': 'a', 'title': '2'}, {'url': 'b', 'title': '1'}]
+    assert compact_csv('narrow.csv') == 0
@@ -0,0 +1,111 @@
+import sqlite3
+
+from crawl_state import CrawlState
+from discovery import DiscoveryScheduler, Frontier, estimate_upper_bound
+
+
+def frontier(done=(), scope=range(1, 101)):
+    return Frontier(lambda page_type, ids: {n for n in ids if (page_type, n) in done},
+                    lambda page_type, n: n in scope)
+
+
+def test_links_go_ahead_of_sequential_work():
+    links = frontier()
+    sequential = iter([('film', 1), ('film', 2), ('film', 3)])
+    order = []
+    for key in links.schedule(sequential):
+        order.append(key)
+        links.mark_fetched(*key)
+        if key == ('film', 1):
+            links.add([('film', 50), ('galleries', 3)])
+    assert order == [('film', 1), ('film', 50), ('galleries', 3), ('film', 2), ('film', 3)]
+    assert links.harvested == 2
+
+
+def test_links_are_deduplicated_and_scoped():
+    links = frontier(done={('film', 7)})
+    links.add([('film', 5), ('film', 5), ('film', 7), ('film', 500)])
+    assert list(links.queue) == [('film', 5)]
+    links.add([('film', 5)])
+    assert links.harvested == 1
+
+
+def test_linked_page_is_not_fetched_twice():
+    links = frontier()
+    links.add([('film', 2)])
+    order = list(links.schedule(iter([('film', 1), ('film', 2), ('film', 3)])))
+    assert order.count(('film', 2)) == 1
+
+
+def test_queued_link_fetched_by_another_route_is_dropped():
+    links = frontier()
+    links.add([('film', 9)])
+    links.mark_fetched('film', 9)
+    assert list(links.schedule(iter([]))) == []
+
+
+def test_scheduler_skips_dead_stretch_and_backfills_on_a_hit():
+    live = {1, 2} | set(range(200, 231))
+    scheduler = DiscoveryScheduler({'film': range(1, 301)}, dead_run=10, stride=10)
+    fetched = []
+    while scheduler.has_work():
+        for page_type, n in scheduler:
+            fetched.append(n)
+            scheduler.report(page_type, n, n in live)
+    skipped = scheduler.finish()['film']
+    assert live <= set(fetched)
+    assert len(fetched) < 200
+    assert set(fetched) | set(skipped) == set(range(1, 301))
+
+
+def test_upper_bound_brackets_the_live_range():
+    live_ids = set(range(1, 700))
+    bound = estimate_upper_bound(lambda ids: {n: n in live_ids for n in ids}, 0, 8000, margin=0)
+    assert 699 <= bound <= 710
+
+
+def test_scheduler_scans_past_the_bound_sparsely():
+    live = set(range(1, 51)) | {80}
+    scheduler = DiscoveryScheduler({'film': range(1, 101)}, dead_run=10, stride=10, bounds={'film': 50})
+    fetched = []
+    while scheduler.has_work():
+        for page_type, n in scheduler:
+            fetched.append(n)
+            scheduler.report(page_type, n, n in live)
+    skipped = scheduler.finish()['film']
+    assert set(range(1, 51)) | {80} <= set(fetched)
+    assert 55 in skipped and 55 not in fetched
+
+
+def test_wide_windows_find_a_range_narrow_ones_miss():
+    live_ids = set(range(1, 100)) | set(range(2060, 2200))
+    probe = lambda ids: {n: n in live_ids for n in ids}  # noqa: E731
+    assert estimate_upper_bound(probe, 0, 4000, spread=10 ** 6) < 2060
+    assert estimate_upper_bound(probe, 0, 4000) >= 2199
+
+
+def test_ids_past_a_low_bound_are_skipped_then_reprobed(site, crawl):
+    mock, _ = site
+    # A live stretch far past a dead one, which the first estimate misses
+    mock.max_ids['film'] = 400
+    mock.dead_ranges = [('film', 40, 299)]
+    late = {n for n in range(300, 401) if mock.is_live('film', n)}
+
+    crawl(end=400, discover=True)
+    state = CrawlState('crawl_state.sqlite')
+    bound = state.discovery_bound('film')
+    assert bound < 300
+    assert set(state.statuses('film', sorted(late)).values()) == {'skipped'}
+    state.close()
+
+    conn = sqlite3.connect('crawl_state.sqlite')
+    with conn:
+        conn.execute("UPDATE pages SET fetched_at = 0 WHERE status = 'skipped'")
+    conn.close()
+    crawl(end=400, discover=True)
+    state = CrawlState('crawl_state.sqlite')
+    statuses = state.statuses('film', sorted(late))
+    assert state.discovery_bound('film') >= bound
+    state.close()
+    assert set(statuses.values()) <= {'ok', 'skipped'}
+    assert list(statuses.values()).count('ok') > len(late) // 2
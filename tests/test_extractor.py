@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip('bs4')
+from bs4 import BeautifulSoup  # noqa: E402
+
+import extractor  # noqa: E402
+from bench.reference import extract_fields  # noqa: E402
+from benchmark import load_corpus  # noqa: E402
+
+CORPUS = load_corpus()
+IDS = [f"{page_type}_{url.rsplit('/', 1)[1]}" for page_type, url, _ in CORPUS]
+
+
+@pytest.mark.parametrize('page_type,url,content', CORPUS, ids=IDS)
+def test_lxml_extractor_matches_reference(page_type, url, content):
+    expected = extract_fields(BeautifulSoup(content, 'lxml'), url, page_type)
+    assert extractor.extract(content, url, page_type) == expected
+
+
+def test_triggers_skip_groups_whose_elements_are_missing():
+    content = (b'<html><head><meta name="viewport" content="width=device-width"></head><body>'
+               b'<h1>Title</h1><a href="/calendar">Calendar</a><iframe src="https://maps.example"></iframe>'
+               b'<a href="/artists/12">Name</a></body></html>')
+    page = extractor.PageIndex(extractor.parse_html(content))
+    applied = {group.name for group in extractor.FIELD_GROUPS if group.applies_to(page)}
+    assert applied == {'title', 'artists'}
+
+
+@pytest.mark.parametrize('fields', [['title', 'date'], ['artist_*'], ['promo_*', 'video']])
+def test_selected_fields_match_full_extraction(fields):
+    columns = extractor.select_fields(fields)
+    groups = extractor.field_groups(fields)
+    for page_type, url, content in CORPUS:
+        full = extractor.extract(content, url, page_type)
+        selected = extractor.extract(content, url, page_type, groups=groups)
+        assert {column: selected[column] for column in columns} == {column: full[column] for column in columns}
@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+from crawl_state import STATUS_OK
+from moma_scraper import CrawlRun, MoMAScraper
+
+
+def committed(path, query):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute(query)}
+    finally:
+        conn.close()
+
+
+def test_fetch_does_not_store_validators(site, workdir):
+    scraper = MoMAScraper(base_url=site[1], http_cache='cache.sqlite')
+    result = scraper.fetch_raw(site[1] + '/calendar/film/1')
+    assert result.status_code == 200
+    assert scraper.http_cache.lookup(result.url) is None
+
+
+def test_refresh_after_crawl_is_unchanged(site, crawl):
+    scraper = MoMAScraper(base_url=site[1], http_cache='cache.sqlite')
+    first = crawl(scraper)
+    run = crawl(scraper, refresh=True)
+    assert run.pages_unchanged == first.new_pages_found
+    assert run.new_pages_found == 0
+
+
+def test_validators_are_only_committed_for_recorded_rows(site, monkeypatch, crawl):
+    scraper = MoMAScraper(base_url=site[1], http_cache='cache.sqlite')
+    handle = CrawlRun.handle
+
+    def crash_after_a_checkpoint(run, *args):
+        # Past the first checkpoint (every 30 pages), with rows written since
+        if run.completed == 40:
+            raise KeyboardInterrupt
+        return handle(run, *args)
+
+    monkeypatch.setattr(CrawlRun, 'handle', crash_after_a_checkpoint)
+    with pytest.raises(KeyboardInterrupt):
+        crawl(scraper, end=40)
+
+    cached = committed('cache.sqlite', 'SELECT url FROM validators')
+    recorded = committed('crawl_state.sqlite', f"SELECT url FROM pages WHERE status = '{STATUS_OK}'")
+    assert cached
+    assert cached <= recorded
+
+
+def test_304_for_an_evicted_entry_fetches_the_page(site, monkeypatch, crawl):
+    scraper = MoMAScraper(base_url=site[1], http_cache='cache.sqlite')
+    crawl(scraper)
+    cache = scraper.http_cache
+    url = cache.conn.execute('SELECT url FROM validators LIMIT 1').fetchone()[0]
+    conditional_headers = cache.conditional_headers
+
+    def evicted_after_sending(url):
+        headers = conditional_headers(url)
+        cache.conn.execute('DELETE FROM validators WHERE url = ?', (url,))
+        return headers
+
+    monkeypatch.setattr(cache, 'conditional_headers', evicted_after_sending)
+    result = scraper.fetch_raw(url, conditional=True)
+    assert result.status_code == 200
+    assert result.content
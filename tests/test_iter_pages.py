@@ -0,0 +1,68 @@
+import asyncio
+import itertools
+import time
+
+from moma_scraper import MoMAScraper
+
+
+def requests_made(mock):
+    return sum(mock.status_counts.values())
+
+
+def test_prefetch_bounds_requests_ahead_of_the_consumer(site):
+    mock, url = site
+    pages = MoMAScraper(base_url=url).iter_pages(['film'], ids=itertools.count(1), delay=0,
+                                                 concurrency=2, prefetch=3, raw=True)
+    consumed = 0
+    for _ in pages:
+        consumed += 1
+        if consumed == 5:
+            break
+        # A slow consumer: the scraper must not run ahead of it
+        time.sleep(0.1)
+        assert requests_made(mock) <= consumed + 3
+    pages.close()
+
+
+def test_closing_early_stops_new_requests(site):
+    mock, url = site
+    pages = MoMAScraper(base_url=url).iter_pages(['film'], ids=itertools.count(1), delay=0,
+                                                 concurrency=2, raw=True)
+    for taken, _ in enumerate(pages, 1):
+        if taken == 3:
+            break
+    pages.close()
+    made = requests_made(mock)
+    assert made <= 3 + 2
+    time.sleep(0.2)
+    assert requests_made(mock) == made
+
+
+def test_cancelling_the_consuming_task_stops_the_scraping(site):
+    mock, url = site
+
+    async def main():
+        first = asyncio.Event()
+        rows = []
+
+        async def consume():
+            # An explicit cancel=None is accepted, as by iter_pages
+            async for row in MoMAScraper(base_url=url).aiter_pages(
+                    ['film'], ids=itertools.count(1), delay=0, raw=True, cancel=None):
+                rows.append(row)
+                first.set()
+
+        task = asyncio.create_task(consume())
+        await first.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return rows
+
+    rows = asyncio.run(main())
+    made = requests_made(mock)
+    assert rows
+    time.sleep(0.2)
+    assert requests_made(mock) == made
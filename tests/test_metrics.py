@@ -0,0 +1,35 @@
+import pytest
+import requests
+
+import transport
+from metrics import Metrics
+
+
+def response(status, headers=None, content=b'', history=()):
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers or {})
+    r._content = content
+    r.history = list(history)
+    return r
+
+
+def test_parse_histogram_includes_field_groups_and_challenges_are_kept_apart():
+    metrics = Metrics()
+    metrics.record('film', 1, 'u1', 200, 'new', fetch_s=0.2, parse_s=0.01, fields={'title': 0.02, 'date': 0.03})
+    metrics.record('film', 2, 'u2', 200, 'new', fetch_s=4.0, parse_s=0.01, challenge=True)
+    assert metrics.parse.sum == pytest.approx(0.07)
+    assert (metrics.fetch.count, metrics.fetch.sum) == (1, 0.2)
+    assert (metrics.challenge.count, metrics.challenge.sum) == (1, 4.0)
+    assert 'moma_challenge_seconds_count 1' in metrics.render()
+
+
+def test_challenge_responses_are_detected():
+    page = b'<script src="/cdn-cgi/challenge-platform/h/b/orchestrate/chl_page/v1"></script>'
+    challenge = response(403, {'Server': 'cloudflare'}, page)
+    assert transport.is_challenge(challenge)
+    assert transport.is_challenge(response(403, {'cf-mitigated': 'challenge'}))
+    # Solved by cloudscraper: only the history shows it
+    assert transport.is_challenge(response(200, content=b'<html></html>', history=[challenge]))
+    assert not transport.is_challenge(response(403, {'Server': 'cloudflare'}, b'Forbidden'))
+    assert not transport.is_challenge(response(200, content=page))
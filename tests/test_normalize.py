@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+
+from normalize import EventIndex, date_range
+
+D = datetime.date
+
+
+@pytest.mark.parametrize('text,expected', [
+    ('Oct 3, 2019–Feb 1, 2020', (D(2019, 10, 3), D(2020, 2, 1))),
+    ('Oct 3–Dec 5, 2019', (D(2019, 10, 3), D(2019, 12, 5))),
+    ('Dec 5–Jan 10, 2020', (D(2019, 12, 5), D(2020, 1, 10))),
+    ('September 3, 2019', (D(2019, 9, 3), D(2019, 9, 3))),
+    ('Sept. 3, 2019', (D(2019, 9, 3), D(2019, 9, 3))),
+    ('Through Mar 5, 2020', (None, D(2020, 3, 5))),
+    ('Feb 29, 2019', (None, None)),
+    ('Feb 29, 2020', (D(2020, 2, 29), D(2020, 2, 29))),
+    ('Mayor 5, 2019', (None, None)),
+    ('Decade 3, 2020', (None, None)),
+    ('', (None, None)),
+])
+def test_date_range(text, expected):
+    assert date_range(text) == expected
+
+
+def row(url, date, names='', links=''):
+    return {'url': url, 'type': 'exhibitions', 'title': url.rsplit('/', 1)[1], 'date': date,
+            'artist_name': names, 'artist_link': links, 'no_artists': len(names.split('|')) if names else 0}
+
+
+def test_event_index_replaces_rows_and_answers_lookups(tmp_path):
+    first = 'https://www.moma.org/calendar/exhibitions/1'
+    second = 'https://www.moma.org/calendar/exhibitions/2'
+    with EventIndex(str(tmp_path / 'index.sqlite')) as index:
+        index.write(row(first, 'Oct 3, 2019–Feb 1, 2020', 'Ann Lee|Bo Chan', '/artists/10|/artists/11'))
+        index.write(row(second, 'Through Mar 5, 2020', 'Bo Chan', '/artists/11'))
+        # A refreshed row replaces the page and its artist list
+        index.write(row(first, 'Oct 3, 2019–Nov 1, 2019', 'Ann Lee', '/artists/10'))
+        index.checkpoint()
+
+        assert index.counts() == {'events': 2, 'artists': 2, 'event_artists': 2}
+        assert [event['url'] for event in index.events_for_artist(10)] == [first]
+        assert [event['url'] for event in index.events_for_artist(11)] == [second]
+        assert [artist['id'] for artist in index.find_artists('bo chan')] == [11]
+        assert {event['url'] for event in index.open_in_month(2019, 10)} == {first, second}
+        assert [event['url'] for event in index.open_in_month(2020, 1)] == [second]
+        assert index.open_in_month(2020, 4) == []
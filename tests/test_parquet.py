@@ -0,0 +1,31 @@
+import pytest
+
+from conftest import read_rows
+from sinks import COUNT_FIELDS, LIST_FIELDS, PROMO_FIELDS, columnar_row, export_parquet
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.parquet  # noqa: E402
+
+
+def test_columnar_row_splits_lists_by_their_counts():
+    row = {'no_artists': '2', 'artist_name': 'Ann Lee|', 'artist_link': '/artists/1|/artists/2',
+           'no_promos': '0', 'promo_link_data': '', 'no_events': '', 'event_catch_all': ''}
+    typed = columnar_row(row)
+    assert typed['no_artists'] == 2 and typed['no_events'] == 0
+    assert typed['artist_name'] == ['Ann Lee', '']
+    assert typed['event_catch_all'] == [] and typed['promo_title'] == []
+
+
+def test_parquet_copy_is_typed_and_matches_the_csv(crawl):
+    crawl(parquet_dir='main.parquet')
+    rows = read_rows()
+    table = pyarrow.parquet.read_table('main.parquet')
+    assert table.num_rows == len(rows)
+    for field in COUNT_FIELDS:
+        assert table.schema.field(field).type == pyarrow.int32()
+    for field in list(LIST_FIELDS) + list(PROMO_FIELDS):
+        assert table.schema.field(field).type == pyarrow.list_(pyarrow.string())
+    assert sorted(table.column('url').to_pylist()) == sorted(row['url'] for row in rows)
+
+    assert export_parquet('main.csv', 'exported.parquet') == len(rows)
+    assert pyarrow.parquet.read_table('exported.parquet').num_rows == len(rows)
@@ -0,0 +1,20 @@
+import moma_scraper
+from conftest import read_rows
+from pipeline import parse_pool
+
+
+def test_one_parser_pool_per_crawl(monkeypatch, crawl):
+    pools = []
+
+    def counting_pool(parse_workers=None):
+        pools.append(parse_pool(parse_workers))
+        return pools[-1]
+
+    monkeypatch.setattr(moma_scraper, 'parse_pool', counting_pool)
+    # Discovery probes and the crawl after them are separate pipeline runs
+    run = crawl(parse_workers=2, discover=True, follow_links=True)
+    assert run.new_pages_found
+    assert len(pools) == 1
+
+    crawl(csv_path='threads.csv', state_path='threads.sqlite')
+    assert sorted(row['url'] for row in read_rows()) == sorted(row['url'] for row in read_rows('threads.csv'))
@@ -0,0 +1,82 @@
+import random
+import time
+from email.utils import formatdate
+
+import pytest
+
+from moma_scraper import parse_retry_after
+from rate_limit import AIMDController, RetryQueue, TokenBucket, backoff_delay
+
+
+class NoLock:
+    def __enter__(self):
+        raise AssertionError('the lock was taken')
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_unlimited_bucket_skips_the_lock_once_a_pause_is_over():
+    bucket = TokenBucket(None)
+    bucket.pause(0.05)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+    bucket._lock = NoLock()
+    bucket.acquire()
+
+
+def test_backoff_is_capped_and_jittered():
+    random.seed(1)
+    for attempt in range(12):
+        bound = min(60.0, 2 ** attempt)
+        delays = [backoff_delay(attempt, base=1.0, cap=60.0) for _ in range(200)]
+        assert all(0 <= delay <= bound for delay in delays)
+        # Full jitter spreads retries over the whole interval
+        assert min(delays) < bound * 0.1 and max(delays) > bound * 0.9
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('120', 120.0), ('0', 0.0), ('-5', 0.0), ('soon', None), ('', None), (None, None),
+])
+def test_retry_after_in_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_retry_after_as_http_date():
+    assert 25 <= parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_retry_queue_gives_up_after_max_attempts_and_long_retry_afters():
+    queue = RetryQueue(max_attempts=2, base_delay=0.0, max_delay=10.0)
+    assert queue.defer('a') and queue.defer('a')
+    assert not queue.defer('a')
+    assert not queue.defer('b', retry_after=11.0)
+    assert queue.ready() == ['a', 'a']
+    assert list(queue.interleave(['x'])) == ['x']
+
+
+def test_aimd_increases_when_healthy_and_halves_on_errors_and_slowdowns():
+    controller = AIMDController(TokenBucket(2.0), window=10, increase=1.0, decrease=0.5)
+    for _ in range(10):
+        controller.observe(200, 0.1)
+    assert controller.rate == 3.0
+
+    for status in [503, 200] * 5:
+        controller.observe(status, 0.1)
+    assert controller.rate == 1.5
+
+    # Latency well above the best window's median
+    for _ in range(10):
+        controller.observe(200, 1.0)
+    assert controller.rate == 0.75
+
+    # A 429 right after a cut does not cut again within the window
+    controller.observe(429, 0.1)
+    assert controller.rate == 0.75
+    for _ in range(10):
+        controller.observe(429, 0.1, retry_after=0.0)
+    assert controller.rate == 0.375
+    assert controller.limiter.rate == controller.rate
+    assert (controller.increases, controller.decreases) == (1, 3)
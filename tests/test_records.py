@@ -0,0 +1,68 @@
+import csv
+import io
+
+import pytest
+
+import extractor
+from benchmark import load_corpus
+from conftest import read_rows
+from records import PageRecord
+from sinks import FIELDNAMES
+
+
+def line(row):
+    """The CSV line CSVSink writes for a row"""
+    out = io.StringIO()
+    csv.DictWriter(out, fieldnames=FIELDNAMES).writerow(row)
+    return out.getvalue()
+
+
+def read_back(row):
+    """The row as DictReader returns it from the CSV: every cell a string"""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDNAMES)
+    writer.writeheader()
+    writer.writerow(row)
+    out.seek(0)
+    return next(csv.DictReader(out))
+
+
+def assert_round_trips(row):
+    assert line(PageRecord.from_row(row).to_row()) == line(row)
+    assert line(PageRecord.from_row(read_back(row)).to_row()) == line(row)
+
+
+def corpus_rows():
+    return [extractor.extract(content, url, page_type) for page_type, url, content in load_corpus()]
+
+
+def test_corpus_rows_round_trip():
+    rows = corpus_rows()
+    assert any(row['no_promos'] for row in rows)
+    for row in rows:
+        assert_round_trips(row)
+
+
+def test_crawled_rows_round_trip(crawl):
+    crawl()
+    rows = read_rows()
+    assert rows
+    for row in rows:
+        assert_round_trips(row)
+
+
+@pytest.mark.parametrize('edit', [
+    {'promo_title': 'Edited by hand'},
+    {'promo_link_data': 'not json'},
+    {'promo_link_data': '[]'},
+])
+def test_hand_edited_promo_cells_round_trip(edit):
+    row = next(row for row in corpus_rows() if row['no_promos'])
+    row = dict(row, **edit)
+    assert_round_trips(row)
+
+
+def test_empty_rows_round_trip():
+    empty = extractor.empty_record('https://www.moma.org/calendar/film/1', 'film')
+    assert_round_trips(empty)
+    assert_round_trips(dict.fromkeys(FIELDNAMES, ''))
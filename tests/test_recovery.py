@@ -0,0 +1,94 @@
+import csv
+
+import pytest
+
+from conftest import read_rows
+from moma_scraper import CrawlRun, MoMAScraper
+from sinks import FIELDNAMES
+
+
+def test_rerun_keeps_rows(crawl):
+    crawl()
+    rows = read_rows()
+    assert rows
+    run = crawl()
+    assert run.new_pages_found == 0
+    assert read_rows() == rows
+
+
+def test_partial_row_after_checkpoint_is_dropped(crawl):
+    crawl()
+    rows = read_rows()
+    with open('main.csv', 'a', encoding='utf-8') as f:
+        f.write('https://www.moma.org/calendar/film/999,"half a ro')
+    crawl()
+    assert read_rows() == rows
+
+
+def test_rewritten_larger_csv_is_reindexed_not_truncated(site, crawl):
+    _, url = site
+    scraper = MoMAScraper(base_url=url)
+    crawl(end=10)
+    rows = read_rows()
+    # Rewritten with more rows than the state's checkpoint covers
+    extra = crawl(start=11, end=20, csv_path='other.csv', state_path='other.sqlite')
+    assert extra.new_pages_found
+    scraper.save_to_csv(rows + read_rows('other.csv'))
+    rewritten = read_rows()
+    assert len(rewritten) > len(rows)
+
+    run = crawl(end=20)
+    assert run.new_pages_found == 0
+    assert read_rows() == rewritten
+
+
+def test_checkpoint_inside_a_record_is_reindexed(site, crawl):
+    _, url = site
+    crawl()
+    rows = read_rows()
+    # Same bytes, but a new first row shifts every record past the old offset
+    with open('main.csv', 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    header, body = text.split('\r\n', 1)
+    with open('main.csv', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerow(dict(rows[0], url=url + '/calendar/film/500', title='A title\nover two lines'))
+        f.write(body)
+    before = read_rows()
+    crawl()
+    assert read_rows() == before
+
+
+def test_rows_after_checkpoint_are_recorded(crawl):
+    crawl(end=10)
+    rows = read_rows()
+    # Rows that reached the file after the last checkpoint, as a crash would leave them
+    crawl(start=11, end=20, csv_path='other.csv', state_path='other.sqlite')
+    extra = read_rows('other.csv')
+    with open('main.csv', 'a', encoding='utf-8', newline='') as f:
+        csv.DictWriter(f, fieldnames=FIELDNAMES).writerows(extra)
+
+    run = crawl(end=20)
+    assert run.new_pages_found == 0
+    assert read_rows() == rows + extra
+
+
+def test_interrupted_run_can_be_retried_in_process(monkeypatch, crawl):
+    handle = CrawlRun.handle
+
+    def interrupt(run, *args):
+        if run.completed == 20:
+            raise KeyboardInterrupt
+        return handle(run, *args)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(CrawlRun, 'handle', interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            crawl()
+    written = read_rows()
+    assert written
+
+    run = crawl()
+    assert run.already_done >= len(written)
+    assert read_rows()[:len(written)] == written
@@ -0,0 +1,20 @@
+import transport
+
+
+def pool_settings(session):
+    return {prefix: (adapter.poolmanager.connection_pool_kw.get('maxsize'),
+                     adapter.poolmanager.connection_pool_kw.get('block'))
+            for prefix, adapter in session.adapters.items()}
+
+
+def test_resize_pool_mounts_blocking_pools_and_keeps_tls_settings():
+    session = transport.create_session(pool_size=4)
+    https = session.adapters['https://']
+    adapters = dict(session.adapters)
+    transport.resize_pool(session, 4)
+    assert dict(session.adapters) == adapters
+
+    transport.resize_pool(session, 16)
+    assert pool_settings(session) == {'https://': (16, True), 'http://': (16, True)}
+    assert type(session.adapters['https://']) is type(https)
+    assert session.adapters['https://'].ssl_context is https.ssl_context
@@ -0,0 +1,144 @@
+"""
+Pooled HTTP transport for the scraper's cloudscraper session
+
+All fetch workers share one session, so they share its connection pools and
+its cookie jar, including the Cloudflare clearance cookies cloudscraper gets
+when it solves a challenge. This module sizes the pools to the number of
+workers, so no worker opens (and then throws away) a connection of its own
+and pays for a fresh TLS handshake. It also negotiates every content encoding
+urllib3 can decode, and saves the clearance cookies between runs.
+"""
+import json
+import os
+import time
+import weakref
+from typing import Optional
+
+BROWSER = {
+    'browser': 'chrome',
+    'platform': 'windows',
+    'mobile': False
+}
+
+# Requests keep connections alive by default; idle ones are kept up to the
+# pool size, so one connection per worker survives between requests
+DEFAULT_POOL_SIZE = 10
+
+# Constructor arguments of cloudscraper's CipherSuiteAdapter, kept when an
+# adapter is replaced (plain requests adapters have none of them)
+TLS_OPTIONS = ('ssl_context', 'cipherSuite', 'ecdhCurve', 'server_hostname', 'source_address')
+
+# Pool size of the adapters resize_pool mounted
+_pool_sizes = weakref.WeakKeyDictionary()
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE, cookie_path: Optional[str] = None):
+    """Create a cloudscraper session with pools for `pool_size` concurrent workers
+
+    With `cookie_path`, cookies and the User-Agent they were issued to are
+    restored from a previous run (see save_cookies).
+    """
+    # Imported here so commands that never fetch don't pay for them
+    try:
+        # Imported before the session is created so cloudscraper allows brotli
+        import brotli
+    except ImportError:
+        pass
+    import cloudscraper
+    from urllib3.util.request import ACCEPT_ENCODING
+
+    session = cloudscraper.create_scraper(browser=BROWSER)
+    # gzip and deflate always; br/zstd when their decoders are installed
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING.replace(',', ', ')
+    session.headers['Connection'] = 'keep-alive'
+    resize_pool(session, pool_size)
+    if cookie_path:
+        load_cookies(session, cookie_path)
+    return session
+
+
+def resize_pool(session, pool_size: int):
+    """Let `pool_size` requests per host be open at once, each on a reused connection
+
+    The pools block when full: a worker waits for a free connection rather
+    than opening a throwaway one past the limit. Each adapter is replaced
+    by a new one of the same class, so cloudscraper's TLS cipher settings
+    carry over.
+    """
+    for prefix, adapter in list(session.adapters.items()):
+        if _pool_sizes.get(adapter) == pool_size:
+            continue
+        options = {name: getattr(adapter, name) for name in TLS_OPTIONS if hasattr(adapter, name)}
+        resized = type(adapter)(pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=pool_size, pool_block=True,
+                                max_retries=adapter.max_retries, **options)
+        _pool_sizes[resized] = pool_size
+        session.mount(prefix, resized)
+        adapter.close()
+
+
+def load_cookies(session, path: str) -> int:
+    """Restore cookies saved by save_cookies, skipping expired ones; returns how many"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        saved = json.load(f)
+    # Clearance cookies are only honoured for the User-Agent that earned them
+    if saved.get('user_agent'):
+        session.headers['User-Agent'] = saved['user_agent']
+    now = time.time()
+    loaded = 0
+    for cookie in saved.get('cookies', []):
+        if cookie.get('expires') and cookie['expires'] < now:
+            continue
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'],
+                            path=cookie['path'], expires=cookie.get('expires'),
+                            secure=cookie.get('secure', False))
+        loaded += 1
+    return loaded
+
+
+def save_cookies(session, path: str):
+    """Write the session's cookies and User-Agent to `path` as JSON"""
+    saved = {
+        'user_agent': session.headers.get('User-Agent'),
+        'cookies': [
+            {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path,
+             'expires': c.expires, 'secure': c.secure}
+            for c in session.cookies
+        ],
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(saved, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def warm_up(session, url: str) -> float:
+    """Make one request before the workers start, returning its seconds
+
+    If the site serves a Cloudflare challenge, cloudscraper solves it here,
+    once, and every worker then reuses the clearance cookie from the shared
+    jar instead of each solving the same challenge concurrently.
+    """
+    started = time.perf_counter()
+    try:
+        session.get(url, timeout=30)
+    except Exception as e:
+        print(f"Warm-up request to {url} failed: {str(e)}")
+    return time.perf_counter() - started
+
+
+def is_challenge(response) -> bool:
+    """Whether a response, or one before it, was a Cloudflare challenge
+
+    cloudscraper solves challenges inside session.get(), so a solved one
+    only shows in the response history.
+    """
+    for step in [*response.history, response]:
+        if step.headers.get('cf-mitigated') == 'challenge':
+            return True
+        if step.status_code in (403, 429, 503) and \
+                'cloudflare' in step.headers.get('Server', '').lower() and \
+                b'/cdn-cgi/challenge-platform/' in (step.content or b''):
+            return True
+    return False